@@ -0,0 +1,314 @@
+"""
+Benchmark suite for the converter: times parse_quake_map, generate_vmf_content and write_vmf on the
+bundled E1M1-E1M8 maps plus a synthetic map ten times the size of E1M1, then runs the whole
+convert_folder pipeline against a stub resourcecompiler so it also works on Linux.
+Results (wall time, faces per second, peak Python memory) are written to a JSON file and compared
+with a baseline file from an earlier run; stages that got slower than the tolerance are reported
+and make the script exit with 1.
+
+    python benchmark.py                      # run, write benchmark_results.json, compare with the baseline
+    python benchmark.py --update-baseline    # run and store the results as the new baseline
+"""
+import os
+import re
+import sys
+import time
+import glob
+import json
+import math
+import stat
+import argparse
+import platform
+import tempfile
+import contextlib
+import io
+import tracemalloc
+
+import numpy as np
+
+import vmapconverter
+from vmapconverter import parse_quake_map, generate_vmf_content, write_vmf, convert_folder
+
+BENCHMARK_VERSION = 1
+
+# Where results and the baseline go by default, next to this script.
+RESULTS_FILENAME = "benchmark_results.json"
+BASELINE_FILENAME = "benchmark_baseline.json"
+
+# A stage counts as a regression when it takes this much longer than in the baseline (0.15 = 15%).
+REGRESSION_TOLERANCE = 0.15
+
+# Copies of the source map tiled into the synthetic map.
+SYNTHETIC_COPIES = 10
+
+# Gap left between the tiled copies, in Quake units.
+SYNTHETIC_SPACING = 256
+
+STAGES = ("parse", "generate", "write")
+
+# Stand-in for resourcecompiler.exe: reads the whole VMF like the real one would, prints a few lines, succeeds
+_STUB_COMPILER_SOURCE = '''#!{python}
+import sys
+vmf_filepath = sys.argv[-1]
+with open(vmf_filepath, "rb") as f:
+    size = len(f.read())
+print("stub resourcecompiler: read %d bytes from %s" % (size, vmf_filepath))
+print("stub resourcecompiler: done")
+'''
+
+_PLANE_POINT_RE = re.compile(r'\(\s*(\S+)\s+(\S+)\s+(\S+)\s*\)')
+
+
+def _quiet(function, *args, **kwargs):
+    # The converter reports progress with print(); keep it out of the timings table
+    with contextlib.redirect_stdout(io.StringIO()):
+        return function(*args, **kwargs)
+
+
+def make_synthetic_map(source_map_filepath, output_filepath, copies=SYNTHETIC_COPIES, spacing=SYNTHETIC_SPACING):
+    """
+    Writes a map holding every brush of source_map_filepath copies times, tiled side by side in a
+    grid on the XY plane, all in a single worldspawn. Returns output_filepath.
+    Only the plane points are moved, which is all the converter's speed depends on.
+    """
+    geometry = _quiet(parse_quake_map, source_map_filepath)
+    points = np.frombuffer(geometry.planes, dtype=np.float64).reshape(-1, 3)
+    size = points.max(axis=0) - points.min(axis=0) + spacing
+    columns = math.ceil(math.sqrt(copies))
+
+    # Brush blocks are the second level of braces, inside an entity
+    brush_lines = []
+    depth = 0
+    with open(source_map_filepath, 'r') as f:
+        for line in f:
+            stripped = line.strip()
+            if stripped == '{':
+                depth += 1
+                if depth == 2:
+                    brush_lines.append('{')
+            elif stripped == '}':
+                if depth == 2:
+                    brush_lines.append('}')
+                depth -= 1
+            elif depth == 2 and stripped.startswith('('):
+                brush_lines.append(stripped)
+
+    with open(output_filepath, 'w') as f:
+        f.write('{\n"classname" "worldspawn"\n')
+        f.write(f'"wad" "{geometry.worldspawn.get("wad", "")}"\n')
+        for copy in range(copies):
+            offset = (size[0] * (copy % columns), size[1] * (copy // columns), 0.0)
+
+            def move(match):
+                return "( %s %s %s )" % tuple('%g' % (float(match.group(axis + 1)) + offset[axis]) for axis in range(3))
+
+            for line in brush_lines:
+                f.write((_PLANE_POINT_RE.sub(move, line, count=3) if line.startswith('(') else line) + '\n')
+        f.write('}\n')
+    return output_filepath
+
+
+def make_stub_compiler(folder):
+    """
+    Creates an executable stand-in for resourcecompiler.exe under folder, laid out like a game
+    install (game/bin/win64) so run_resource_compiler derives its usual content root. Returns its path.
+    The stub is a Python script started through its shebang line, so it needs a POSIX system.
+    """
+    bin_dir = os.path.join(folder, "game", "bin", "win64")
+    os.makedirs(bin_dir, exist_ok=True)
+    compiler_path = os.path.join(bin_dir, "resourcecompiler.exe")
+    with open(compiler_path, 'w') as f:
+        f.write(_STUB_COMPILER_SOURCE.format(python=sys.executable))
+    os.chmod(compiler_path, os.stat(compiler_path).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    return compiler_path
+
+
+def _best_time(function, repeat):
+    """Returns (best_seconds, last_result) over repeat calls of function()."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def _peak_memory(function):
+    """Returns the peak bytes of Python allocations while calling function()."""
+    tracemalloc.start()
+    try:
+        function()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def benchmark_map(map_filepath, output_folder, repeat=5):
+    """
+    Times the parse, generate and write stages on one map, keeping the best of repeat runs to smooth
+    out disk cache and scheduler noise; peak memory is measured in a separate run of each stage,
+    since tracing slows the timed runs down.
+    Returns a dict with the brush and face counts and per stage seconds, faces_per_second and peak_bytes.
+    """
+    vmf_filepath = os.path.join(output_folder, os.path.splitext(os.path.basename(map_filepath))[0] + ".vmf")
+    parse_seconds, geometry = _best_time(lambda: _quiet(parse_quake_map, map_filepath), repeat)
+    stages = {
+        "parse": (parse_seconds, lambda: _quiet(parse_quake_map, map_filepath)),
+        "generate": (None, lambda: generate_vmf_content(geometry)),
+        "write": (None, lambda: write_vmf(geometry, vmf_filepath)),
+    }
+    faces = geometry.face_count
+    result = {"brushes": len(geometry), "faces": faces, "stages": {}}
+    for stage in STAGES:
+        seconds, function = stages[stage]
+        if seconds is None:
+            seconds = _best_time(function, repeat)[0]
+        result["stages"][stage] = {
+            "seconds": seconds,
+            "faces_per_second": faces / seconds if seconds else 0.0,
+            "peak_bytes": _peak_memory(function),
+        }
+    return result
+
+
+def benchmark_pipeline(map_filepaths, work_folder, workers=1):
+    """
+    Runs convert_folder over copies of the given maps with a stub resourcecompiler and a cold build
+    cache. Returns a dict with the wall time, the number of maps converted and compiled, and the
+    summed per map VMF seconds.
+    """
+    input_folder = os.path.join(work_folder, "pipeline_input")
+    os.makedirs(input_folder, exist_ok=True)
+    for map_filepath in map_filepaths:
+        with open(map_filepath, 'rb') as source, open(os.path.join(input_folder, os.path.basename(map_filepath)), 'wb') as target:
+            target.write(source.read())
+    compiler_path = make_stub_compiler(os.path.join(work_folder, "stub"))
+    start = time.perf_counter()
+    results = convert_folder(input_folder, os.path.join(work_folder, "pipeline_output"), compiler_path,
+                             log=lambda message: None, workers=workers, force=True)
+    seconds = time.perf_counter() - start
+    return {
+        "seconds": seconds,
+        "workers": workers,
+        "maps": len(results),
+        "compiled": sum(1 for result in results if result.get("compiled")),
+        "vmf_seconds": sum(result["seconds"] for result in results),
+    }
+
+
+def run_suite(map_filepaths, repeat=5, workers=1, synthetic=True, pipeline=True, log=print):
+    """
+    Benchmarks every map (plus the synthetic one built from the first map) and the full pipeline.
+    Returns the results dict that gets written to JSON.
+    """
+    results = {
+        "benchmark_version": BENCHMARK_VERSION,
+        "converter_version": vmapconverter.CONVERTER_VERSION,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "repeat": repeat,
+        "maps": {},
+    }
+    with tempfile.TemporaryDirectory(prefix="vmapconverter_benchmark_") as work_folder:
+        all_map_filepaths = list(map_filepaths)
+        if synthetic and map_filepaths:
+            synthetic_filepath = os.path.join(work_folder, f"SYNTH{SYNTHETIC_COPIES}X.MAP")
+            all_map_filepaths.append(make_synthetic_map(map_filepaths[0], synthetic_filepath))
+
+        log(f"{'map':<14}{'faces':>8}" + "".join(f"{stage + ' ms':>12}{'faces/s':>11}{'MB':>7}" for stage in STAGES))
+        for map_filepath in all_map_filepaths:
+            map_name = os.path.basename(map_filepath)
+            result = results["maps"][map_name] = benchmark_map(map_filepath, work_folder, repeat)
+            log(f"{map_name:<14}{result['faces']:>8}" + "".join(
+                f"{stages['seconds'] * 1000:>12.1f}{stages['faces_per_second']:>11.0f}{stages['peak_bytes'] / 1e6:>7.1f}"
+                for stages in (result["stages"][stage] for stage in STAGES)))
+
+        if pipeline:
+            if os.name != 'posix':
+                log("Skipping the pipeline benchmark: the stub resourcecompiler needs a POSIX system.")
+            else:
+                results["pipeline"] = benchmark_pipeline(all_map_filepaths, work_folder, workers)
+                log(f"\nFull pipeline ({results['pipeline']['maps']} maps, {workers} workers, stub compiler): "
+                    f"{results['pipeline']['seconds']:.2f} s")
+    return results
+
+
+def compare_results(results, baseline, tolerance=REGRESSION_TOLERANCE):
+    """
+    Compares stage times and peak memory with a baseline results dict.
+    Returns a list of (map_name, stage, metric, baseline_value, value) for every value that grew by
+    more than tolerance. Maps or stages missing from either side are ignored.
+    """
+    regressions = []
+    for map_name, result in results["maps"].items():
+        baseline_map = baseline.get("maps", {}).get(map_name)
+        if not baseline_map:
+            continue
+        for stage, values in result["stages"].items():
+            baseline_values = baseline_map["stages"].get(stage)
+            if not baseline_values:
+                continue
+            for metric in ("seconds", "peak_bytes"):
+                if values[metric] > baseline_values[metric] * (1.0 + tolerance):
+                    regressions.append((map_name, stage, metric, baseline_values[metric], values[metric]))
+    if "pipeline" in results and "pipeline" in baseline:
+        if results["pipeline"]["seconds"] > baseline["pipeline"]["seconds"] * (1.0 + tolerance):
+            regressions.append(("*", "pipeline", "seconds", baseline["pipeline"]["seconds"], results["pipeline"]["seconds"]))
+    return regressions
+
+
+def main(argv=None):
+    """Command line entry point. Returns the exit code: 1 if a regression against the baseline was found."""
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(prog="benchmark", description="Benchmark the Quake map converter.")
+    parser.add_argument("input_folder", nargs='?', default=os.path.join(script_dir, "quake_maps_input"),
+                        help="folder with the E1M*.MAP files (default: quake_maps_input)")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per stage; the best is kept (default: 5)")
+    parser.add_argument("--workers", type=int, default=1, help="worker processes for the pipeline run (default: 1)")
+    parser.add_argument("--output", default=os.path.join(script_dir, RESULTS_FILENAME), metavar="PATH",
+                        help=f"results JSON file (default: {RESULTS_FILENAME})")
+    parser.add_argument("--baseline", default=os.path.join(script_dir, BASELINE_FILENAME), metavar="PATH",
+                        help=f"baseline JSON file to compare with (default: {BASELINE_FILENAME})")
+    parser.add_argument("--update-baseline", action="store_true", help="store these results as the baseline")
+    parser.add_argument("--tolerance", type=float, default=REGRESSION_TOLERANCE,
+                        help=f"allowed slowdown before a stage counts as a regression (default: {REGRESSION_TOLERANCE})")
+    parser.add_argument("--no-synthetic", action="store_true", help=f"skip the synthetic {SYNTHETIC_COPIES}x map")
+    parser.add_argument("--no-pipeline", action="store_true", help="skip the full convert_folder run")
+    args = parser.parse_args(argv)
+
+    map_filepaths = sorted(glob.glob(os.path.join(args.input_folder, "E1M*.MAP")))
+    if not map_filepaths:
+        print(f"No E1M*.MAP files found in '{args.input_folder}'.")
+        return 2
+    results = run_suite(map_filepaths, max(1, args.repeat), max(1, args.workers),
+                        synthetic=not args.no_synthetic, pipeline=not args.no_pipeline)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=1, sort_keys=True)
+    print(f"\nResults written to {args.output}")
+
+    if args.update_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=1, sort_keys=True)
+        print(f"Baseline updated: {args.baseline}")
+        return 0
+    try:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+    except (OSError, ValueError):
+        print(f"No baseline at {args.baseline}; run with --update-baseline to store one.")
+        return 0
+    regressions = compare_results(results, baseline, args.tolerance)
+    if not regressions:
+        print(f"No regressions against the baseline (tolerance {args.tolerance:.0%}).")
+        return 0
+    print(f"{len(regressions)} regressions against the baseline (tolerance {args.tolerance:.0%}):")
+    for map_name, stage, metric, baseline_value, value in regressions:
+        print(f"  {map_name} {stage} {metric}: {baseline_value:.4g} -> {value:.4g} ({value / baseline_value - 1:+.0%})")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
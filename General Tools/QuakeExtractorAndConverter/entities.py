@@ -0,0 +1,153 @@
+"""
+Maps Quake entities to their closest Half-Life: Alyx counterparts.
+ENTITY_MAP lists, per Quake classname, the Alyx class, how each Quake key-value converts and any
+fixed key-values the Alyx class needs. Quake entities without an entry are not converted (their
+brushes stay part of the world). Works on plain key-value dicts like the rest of the converter;
+the coordinate transform is passed in as a function, so the axis map and scale stay the caller's.
+"""
+import math
+
+# Quake lights default to this "light" value, which is also their reach in units.
+QUAKE_LIGHT_LEVEL = 300.0
+
+# Source entities fire their outputs at the target's Use input, what Quake does to every target.
+OUTPUT_INPUT = "Use"
+
+# How a Quake key-value converts; every entry maps the Quake key to (alyx key, conversion):
+#   'copy'     the value as is
+#   'distance' a length, scaled like the geometry
+#   'movedir'  a Quake "angle" (-1 up, -2 down) turned into the direction a door or button moves
+#   'output'   the Quake target, fired through the named output (see OUTPUT_INPUT)
+#   'light'    a Quake light level, turned into a brightness relative to QUAKE_LIGHT_LEVEL and the "range" it reaches
+#   'color'    a Quake "_color", with components from 0 to 1 or 0 to 255, turned into 0 to 255
+# 'light' and 'color' also apply when the Quake key is missing, with the Quake defaults.
+_NAMED = {'targetname': ('targetname', 'copy')}
+_MOVER = dict(_NAMED, speed=('speed', 'distance'), lip=('lip', 'distance'), wait=('wait', 'copy'),
+              angle=('movedir', 'movedir'))
+_LIGHT = {'light': ('brightness', 'light'), '_color': ('color', 'color')}
+_DEFAULT_VALUES = {'light': str(QUAKE_LIGHT_LEVEL), 'color': "1 1 1"}
+_TRIGGER_FLAGS = {'spawnflags': '1'}  # Clients can fire it
+
+ENTITY_MAP = {
+    'info_player_start': ('info_player_start', {}, {}),
+    'info_teleport_destination': ('info_teleport_destination', _NAMED, {}),
+    'path_corner': ('path_corner', dict(_NAMED, target=('target', 'copy'), wait=('wait', 'copy')), {}),
+    'light': ('light_omni', _LIGHT, {}),
+    'light_fluoro': ('light_omni', _LIGHT, {}),
+    'light_fluorospark': ('light_omni', _LIGHT, {}),
+    'light_globe': ('light_omni', _LIGHT, {}),
+    'light_torch_small_walltorch': ('light_omni', _LIGHT, {}),
+    'light_flame_large_yellow': ('light_omni', _LIGHT, {}),
+    'light_flame_small_yellow': ('light_omni', _LIGHT, {}),
+    'light_flame_small_white': ('light_omni', _LIGHT, {}),
+    'func_door': ('func_door', dict(_MOVER, target=('OnFullyOpen', 'output')), {}),
+    'func_door_secret': ('func_door', dict(_MOVER, target=('OnFullyOpen', 'output')), {}),
+    'func_button': ('func_button', dict(_MOVER, target=('OnPressed', 'output')), {}),
+    'func_wall': ('func_brush', _NAMED, {}),
+    'func_illusionary': ('func_illusionary', _NAMED, {}),
+    'trigger_once': ('trigger_once', dict(_NAMED, target=('OnTrigger', 'output')), _TRIGGER_FLAGS),
+    'trigger_multiple': ('trigger_multiple', dict(_NAMED, target=('OnTrigger', 'output'), wait=('wait', 'copy')),
+                         _TRIGGER_FLAGS),
+    'trigger_secret': ('trigger_once', dict(_NAMED, target=('OnTrigger', 'output')), _TRIGGER_FLAGS),
+    'trigger_teleport': ('trigger_teleport', dict(_NAMED, target=('target', 'copy')), _TRIGGER_FLAGS),
+    'trigger_changelevel': ('trigger_changelevel', {'map': ('map', 'copy')}, {}),
+    'item_health': ('item_healthvial', _NAMED, {}),
+}
+
+
+def _format_number(value):
+    # Adding 0.0 turns -0.0 into 0.0
+    return '%.6g' % (value + 0.0)
+
+
+def _parse_numbers(value, count):
+    """Returns the first count numbers of a space separated value, or None if it has fewer or any isn't a number."""
+    try:
+        numbers = [float(part) for part in value.split()[:count]]
+    except ValueError:
+        return None
+    return numbers if len(numbers) == count else None
+
+
+def _quake_direction(angle):
+    """Unit vector a Quake "angle" points at: a yaw in degrees, or -1 for up and -2 for down."""
+    if angle == -1:
+        return (0.0, 0.0, 1.0)
+    if angle == -2:
+        return (0.0, 0.0, -1.0)
+    yaw = math.radians(angle)
+    return (math.cos(yaw), math.sin(yaw), 0.0)
+
+
+def _source_angles(direction):
+    """Pitch, yaw and roll text of a VMF "angles" value facing the given direction."""
+    x, y, z = direction
+    length = math.sqrt(x * x + y * y + z * z) or 1.0
+    pitch = -math.degrees(math.asin(max(-1.0, min(1.0, z / length))))
+    yaw = math.degrees(math.atan2(y, x)) if abs(x) + abs(y) > 1e-9 else 0.0
+    return f"{_format_number(round(pitch, 4))} {_format_number(round(yaw, 4))} 0"
+
+
+def convert_entity(keyvalues, transform_point, scale=1.0, schema=None):
+    """
+    Converts the key-values of one Quake entity. transform_point takes Quake (x, y, z) coordinates
+    and returns the Source ones (scale and axis swap included); scale converts lengths.
+    Returns None if ENTITY_MAP has no entry for its classname, else a dict with the Alyx 'classname',
+    its 'keyvalues' (without classname) and 'connections', a list of (output, value) pairs.
+    "origin" is transformed and "angle" turned into "angles" on every entity; key-values that do not
+    convert are left out. With an FgdSchema whose definition of the class is complete, key-values
+    the class does not declare are left out too and listed under 'dropped'.
+    """
+    entry = ENTITY_MAP.get(keyvalues.get('classname', '').lower())
+    if entry is None:
+        return None
+    classname, conversions, fixed = entry
+    converted = dict(fixed)
+    connections = []
+    origin = _parse_numbers(keyvalues.get('origin', ''), 3)
+    if origin is not None:
+        converted['origin'] = " ".join(map(_format_number, transform_point(origin)))
+    zero = transform_point((0.0, 0.0, 0.0))
+
+    def direction(quake_direction):
+        return [a - b for a, b in zip(transform_point(quake_direction), zero)]
+
+    if 'angle' in keyvalues and 'angle' not in conversions:
+        angle = _parse_numbers(keyvalues['angle'], 1)
+        if angle is not None:
+            converted['angles'] = _source_angles(direction(_quake_direction(angle[0])))
+    for quake_key, (key, conversion) in conversions.items():
+        value = keyvalues.get(quake_key, _DEFAULT_VALUES.get(conversion))
+        if value is None:
+            continue
+        if conversion == 'copy':
+            converted[key] = value
+        elif conversion == 'distance':
+            number = _parse_numbers(value, 1)
+            if number is not None:
+                converted[key] = _format_number(round(number[0] * scale, 4))
+        elif conversion == 'movedir':
+            angle = _parse_numbers(value, 1)
+            if angle is not None:
+                converted[key] = _source_angles(direction(_quake_direction(angle[0])))
+        elif conversion == 'output':
+            delay = _parse_numbers(keyvalues.get('delay', ''), 1)
+            connections.append((key, f"{value},{OUTPUT_INPUT},,{_format_number(delay[0] if delay else 0.0)},-1"))
+        elif conversion == 'light':
+            level = _parse_numbers(value, 1)
+            level = level[0] if level else QUAKE_LIGHT_LEVEL
+            converted[key] = _format_number(round(level / QUAKE_LIGHT_LEVEL, 4))
+            converted['range'] = _format_number(round(abs(level) * scale, 4))
+        elif conversion == 'color':
+            color = _parse_numbers(value, 3) or [1.0, 1.0, 1.0]
+            if max(color) <= 1.0:
+                color = [component * 255.0 for component in color]
+            converted[key] = " ".join(str(int(round(max(0.0, min(255.0, c))))) for c in color)
+
+    dropped = []
+    if schema is not None and schema.is_complete(classname):
+        for key in list(converted):
+            if schema.keyvalue(classname, key) is None:
+                dropped.append(key)
+                del converted[key]
+    return {'classname': classname, 'keyvalues': converted, 'connections': connections, 'dropped': dropped}
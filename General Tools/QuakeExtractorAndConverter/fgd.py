@@ -0,0 +1,346 @@
+"""
+Reads Hammer FGD entity definition files into a schema of entity classes and their key-values.
+Parsing the Alyx FGDs (thousands of lines over several @include-d files) is the slow part, so the
+resolved schema, with every class's key-values already merged from its base classes, is cached as
+JSON next to the root FGD and reused while none of the source files changed.
+"""
+import os
+import re
+import json
+
+# Bump whenever the parser or the cached layout changes, so old caches get rebuilt.
+FGD_SCHEMA_VERSION = 1
+
+_TOKEN_RE = re.compile(r'''
+    (?P<space>\s+|//[^\n]*)
+  | "(?P<string>[^"\n]*)"
+  | (?P<punct>[@=:\[\](),+{}])
+  | (?P<word>[^\s"@=:\[\](),+{}]+)
+''', re.X)
+
+# Property types whose key-values the runtime never sees
+_NON_KEYVALUE_TYPES = frozenset(('remove_key',))
+
+
+def default_cache_filepath(fgd_filepath):
+    """Cache file of an FGD: a hidden .<name>.schema.json in the FGD's own folder."""
+    folder, name = os.path.split(os.path.abspath(fgd_filepath))
+    return os.path.join(folder, f".{name}.schema.json")
+
+
+def tokenize_fgd(text):
+    """Returns the FGD text as a list of (kind, value) tokens; kind is 'string', 'punct' or 'word'. Comments are dropped."""
+    tokens = []
+    for match in _TOKEN_RE.finditer(text):
+        kind = match.lastgroup
+        if kind != 'space':
+            tokens.append((kind, match.group(kind)))
+    return tokens
+
+
+class _FgdParser:
+    """Recursive descent over the tokens of one FGD file. Unknown constructs are skipped, not fatal."""
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.position = 0
+
+    def peek(self, offset=0):
+        index = self.position + offset
+        return self.tokens[index] if index < len(self.tokens) else (None, None)
+
+    def next(self):
+        token = self.peek()
+        self.position += 1
+        return token
+
+    def accept(self, value):
+        """Consumes the next token if it is the punctuation value. Returns True if it was."""
+        if self.peek() == ('punct', value):
+            self.position += 1
+            return True
+        return False
+
+    def skip_block(self):
+        """Skips a balanced (...), [...] or {...} block starting at the current token."""
+        pairs = {'(': ')', '[': ']', '{': '}'}
+        depth = 0
+        while self.position < len(self.tokens):
+            kind, value = self.next()
+            if kind == 'punct' and value in pairs:
+                depth += 1
+            elif kind == 'punct' and value in pairs.values():
+                depth -= 1
+                if depth <= 0:
+                    return
+
+    def text(self):
+        """Reads a string, joining "a" + "b" continuations; any other single token is taken as is."""
+        kind, value = self.next()
+        parts = [value or '']
+        while self.peek() == ('punct', '+') and self.peek(1)[0] == 'string':
+            self.position += 1
+            parts.append(self.next()[1])
+        return ''.join(parts)
+
+    def parse(self):
+        """Returns (classes, includes, excludes) of the file in order of appearance."""
+        classes = []
+        includes = []
+        excludes = []
+        while self.position < len(self.tokens):
+            if not self.accept('@'):
+                self.position += 1  # Stray token between definitions
+                continue
+            kind, directive = self.next()
+            directive = (directive or '').lower()
+            if directive == 'include':
+                includes.append(self.text())
+            elif directive == 'exclude':
+                excludes.append(self.next()[1])
+            elif directive.endswith('class'):
+                classes.append(self.parse_class(directive))
+            else:
+                # @mapsize(...), @EntityGroup "..." { ... }, @MaterialExclusion [ ... ], @AutoVisGroup = "..." [ ... ]
+                while self.position < len(self.tokens) and self.peek() != ('punct', '@'):
+                    if self.peek()[0] == 'punct' and self.peek()[1] in '([{':
+                        self.skip_block()
+                        if directive != 'autovisgroup':
+                            break
+                    else:
+                        self.position += 1
+        return classes, includes, excludes
+
+    def parse_class(self, directive):
+        definition = {'kind': directive, 'bases': [], 'description': '', 'keyvalues': {}, 'removed': [],
+                      'inputs': {}, 'outputs': {}}
+        # Helpers such as base(A, B), size(...), metadata { ... } up to the '='
+        while self.position < len(self.tokens) and not self.accept('='):
+            kind, value = self.next()
+            if kind == 'word' and self.peek() == ('punct', '('):
+                if value.lower() == 'base':
+                    self.next()
+                    while self.position < len(self.tokens) and not self.accept(')'):
+                        kind, value = self.next()
+                        if kind == 'word':
+                            definition['bases'].append(value)
+                else:
+                    self.skip_block()
+            elif self.peek() == ('punct', '{'):
+                self.skip_block()
+            elif (kind, value) == ('punct', '['):
+                return None  # Malformed header: a body without '= name'
+        definition['name'] = self.next()[1]
+        if self.accept(':'):
+            definition['description'] = self.text()
+        if self.peek() == ('punct', '['):
+            self.next()
+            self.parse_body(definition)
+        return definition
+
+    def parse_body(self, definition):
+        while self.position < len(self.tokens) and not self.accept(']'):
+            kind, name = self.next()
+            if kind != 'word':
+                if (kind, name) == ('punct', '['):
+                    self.position -= 1
+                    self.skip_block()
+                continue
+            lowered = name.lower()
+            if lowered in ('input', 'output') and self.peek()[0] == 'word' and self.peek(1) == ('punct', '('):
+                io_name = self.next()[1]
+                self.next()
+                io_type = self.next()[1]
+                self.accept(')')
+                definition[lowered + 's'][io_name] = io_type
+                if self.accept(':'):
+                    self.text()
+                continue
+            if not self.accept('('):
+                continue
+            value_type = (self.next()[1] or '').lower()
+            self.accept(')')
+            while True:
+                if self.peek() == ('punct', '['):
+                    self.skip_block()  # Property metadata, e.g. [ group="Shadows" ]
+                elif self.peek()[0] == 'word' and self.peek()[1].lower() in ('readonly', 'report'):
+                    self.position += 1
+                else:
+                    break
+            if value_type in _NON_KEYVALUE_TYPES:
+                definition['removed'].append(name)
+                continue
+            keyvalue = {'type': value_type, 'display': '', 'default': ''}
+            fields = []
+            while self.accept(':'):
+                if self.peek()[0] == 'punct':
+                    fields.append('')  # Empty field, e.g. "Name" : : "description"
+                else:
+                    fields.append(self.text())
+            if fields:
+                keyvalue['display'] = fields[0]
+            if len(fields) > 1:
+                keyvalue['default'] = fields[1]
+            if self.accept('='):
+                keyvalue['choices'] = self.parse_choices()
+            definition['keyvalues'][name] = keyvalue
+
+    def parse_choices(self):
+        """Reads a choices or flags list [ value : "label" (: default) ... ] into a dict of value -> label."""
+        choices = {}
+        if not self.accept('['):
+            return choices
+        while self.position < len(self.tokens) and not self.accept(']'):
+            value = self.text()
+            label = self.text() if self.accept(':') else ''
+            if self.accept(':'):
+                self.text()  # Default state of a flag
+            choices[value] = label
+        return choices
+
+
+def _file_signature(filepath):
+    try:
+        stat = os.stat(filepath)
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+class FgdSchema:
+    """
+    Entity classes of an FGD and everything it @includes.
+    classes maps each class name to a dict with its 'kind' (pointclass, solidclass, ...), 'bases',
+    'keyvalues' (name -> type, display name, default and choices, merged from all base classes),
+    'inputs', 'outputs' and 'complete', which is False when a base class (or the class itself, for
+    an @OverrideClass of a class from a missing file) is not defined by the loaded files.
+    sources holds the signature of every file read and missing_includes the @includes not found.
+    Build one with FgdSchema.load, which goes through the cache.
+    """
+    def __init__(self, classes, sources, missing_includes, from_cache=False):
+        self.classes = classes
+        self.sources = sources
+        self.missing_includes = missing_includes
+        self.from_cache = from_cache
+
+    def __len__(self):
+        return len(self.classes)
+
+    def __contains__(self, classname):
+        return classname.lower() in self.classes
+
+    def get(self, classname, default=None):
+        return self.classes.get(classname.lower(), default)
+
+    def keyvalue(self, classname, key):
+        """Returns the definition of a key-value of a class (base classes included), or None."""
+        definition = self.classes.get(classname.lower())
+        return definition['keyvalues'].get(key.lower()) if definition else None
+
+    def is_complete(self, classname):
+        """True if every key-value of the class is known, i.e. the class and all its bases were loaded."""
+        definition = self.classes.get(classname.lower())
+        return bool(definition and definition['complete'])
+
+    @classmethod
+    def parse(cls, fgd_filepath):
+        """Parses an FGD and its @includes without touching the cache."""
+        raw_classes = {}
+        sources = {}
+        missing_includes = []
+
+        def read(filepath):
+            filepath = os.path.abspath(filepath)
+            if filepath in sources:
+                return  # Already included; FGDs include shared bases more than once
+            sources[filepath] = _file_signature(filepath)
+            with open(filepath, 'r', encoding='utf-8', errors='replace') as f:
+                classes, includes, excludes = _FgdParser(tokenize_fgd(f.read())).parse()
+            for include in includes:
+                include_filepath = os.path.join(os.path.dirname(filepath), include)
+                if os.path.isfile(include_filepath):
+                    read(include_filepath)
+                else:
+                    missing_includes.append(include_filepath)
+            for definition in filter(None, classes):
+                key = definition['name'].lower()
+                existing = raw_classes.get(key)
+                if definition['kind'] == 'overrideclass':
+                    if existing is None:
+                        existing = raw_classes[key] = dict(definition, kind='overrideclass')
+                    else:
+                        existing['keyvalues'] = dict(existing['keyvalues'], **definition['keyvalues'])
+                        existing['inputs'] = dict(existing['inputs'], **definition['inputs'])
+                        existing['outputs'] = dict(existing['outputs'], **definition['outputs'])
+                    for removed in definition['removed']:
+                        existing['keyvalues'].pop(removed, None)
+                else:
+                    raw_classes[key] = definition
+            for exclude in excludes:
+                raw_classes.pop(exclude.lower(), None)
+
+        read(fgd_filepath)
+        return cls(_resolve_classes(raw_classes), sources, missing_includes)
+
+    @classmethod
+    def load(cls, fgd_filepath, cache_filepath=None):
+        """
+        Returns the schema of an FGD, from cache_filepath (default: see default_cache_filepath) when
+        it was written by this FGD_SCHEMA_VERSION and no source file changed, else by parsing the
+        files and rewriting the cache. A cache that cannot be written is not an error.
+        """
+        cache_filepath = cache_filepath or default_cache_filepath(fgd_filepath)
+        try:
+            with open(cache_filepath, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if (data.get('version') == FGD_SCHEMA_VERSION and data.get('root') == os.path.abspath(fgd_filepath)
+                    and all(_file_signature(path) == signature for path, signature in data['sources'].items())
+                    and not any(os.path.isfile(path) for path in data['missing_includes'])):
+                return cls(data['classes'], data['sources'], data['missing_includes'], from_cache=True)
+        except (OSError, ValueError, KeyError):
+            pass  # No cache yet, or unreadable: parse the FGDs
+
+        schema = cls.parse(fgd_filepath)
+        try:
+            temp_filepath = cache_filepath + ".tmp"
+            with open(temp_filepath, 'w', encoding='utf-8') as f:
+                json.dump({'version': FGD_SCHEMA_VERSION, 'root': os.path.abspath(fgd_filepath),
+                           'sources': schema.sources, 'missing_includes': schema.missing_includes,
+                           'classes': schema.classes}, f, separators=(',', ':'), sort_keys=True)
+            os.replace(temp_filepath, cache_filepath)
+        except OSError:
+            pass  # Read-only folder: the schema just isn't cached
+        return schema
+
+
+def _resolve_classes(raw_classes):
+    """Merges every class's key-values, inputs and outputs with those of its bases (bases first, own last)."""
+    resolved = {}
+
+    def resolve(key, visiting):
+        if key in resolved:
+            return resolved[key]
+        definition = raw_classes[key]
+        keyvalues = {}
+        inputs = {}
+        outputs = {}
+        complete = definition['kind'] != 'overrideclass'
+        for base in definition['bases']:
+            base_key = base.lower()
+            if base_key not in raw_classes or base_key in visiting:
+                complete = False
+                continue
+            base_definition = resolve(base_key, visiting | {key})
+            keyvalues.update(base_definition['keyvalues'])
+            inputs.update(base_definition['inputs'])
+            outputs.update(base_definition['outputs'])
+            complete = complete and base_definition['complete']
+        keyvalues.update((name.lower(), value) for name, value in definition['keyvalues'].items())
+        inputs.update(definition['inputs'])
+        outputs.update(definition['outputs'])
+        resolved[key] = {'kind': definition['kind'], 'bases': definition['bases'], 'keyvalues': keyvalues,
+                         'inputs': inputs, 'outputs': outputs, 'complete': complete}
+        return resolved[key]
+
+    for key in raw_classes:
+        resolve(key, frozenset())
+    return resolved
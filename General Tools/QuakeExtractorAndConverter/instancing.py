@@ -0,0 +1,161 @@
+"""
+Finds clusters of touching brushes that a map repeats at different places, so each can be written
+once as a prefab and placed with an instance wherever it occurs.
+A brush is canonicalized by moving it to its own origin, the low corner of its bounding box: its
+face planes and texture mappings are quantized there and sorted, so the key depends neither on
+the face order nor on which plane points the editor picked. Texture offsets are compared modulo
+the texture size when it is known, since copies usually sit a whole number of texture repeats
+apart; without it they must match exactly. Only translated copies are found, not rotated ones.
+Works on plain arrays (nine plane point floats per face, brush face offsets) like partition.py.
+"""
+import numpy as np
+
+from winding import build_windings, plane_equations
+
+# A cluster must occur at least this often to become a prefab.
+MIN_INSTANCE_COUNT = 2
+
+# A cluster needs at least this many brushes to become a prefab. Every prefab is a compile job of
+# its own, which a single brush does not pay back, so single brushes stay in the map.
+MIN_PREFAB_BRUSHES = 2
+
+# Brush origins are snapped to this grid (in Quake units), so copies on the map grid line up exactly.
+ORIGIN_QUANTUM = 1.0 / 8.0
+
+# Steps planes and texture mappings are quantized to before comparing.
+NORMAL_QUANTUM = 1e-5
+DISTANCE_QUANTUM = 1.0 / 64.0
+TEXTURE_QUANTUM = 1.0 / 64.0
+
+# Brushes whose bounds are this close count as touching when clustering.
+TOUCH_EPSILON = 0.01
+
+# Rows of candidate brushes compared against all others at once when clustering.
+_TOUCH_BLOCK = 512
+
+
+def brush_keys(planes, brush_offsets, texture_ids, texture_axes, texture_scales, texture_sizes=None):
+    """
+    Computes the translation-independent key of every brush.
+    texture_axes and texture_scales are the per-face texture mapping in Quake space (see
+    vmapconverter.quake_texture_axes); texture_sizes, if given, holds the (width, height) of each
+    face's texture, zero where unknown.
+    Returns (keys, origins, mins, maxs): keys is an int array with the same number for brushes that are
+    translated copies of each other and -1 for brushes that do not form a closed volume, origins the
+    (brush_count, 3) points each brush was normalized at, mins and maxs the brush bounds.
+    """
+    windings = build_windings(planes, brush_offsets)
+    offsets = np.asarray(brush_offsets, dtype=np.intp)
+    brush_count = len(offsets) - 1
+    valid = windings.valid
+    origins = np.where(valid[:, None], np.round(np.where(valid[:, None], windings.mins, 0.0) / ORIGIN_QUANTUM), 0.0) * ORIGIN_QUANTUM
+    face_brushes = np.repeat(np.arange(brush_count), np.diff(offsets))
+    face_origins = origins[face_brushes]
+
+    normals, dists, _ = plane_equations(planes)
+    dists = dists - np.einsum('ij,ij->i', normals, face_origins)
+    axes = np.asarray(texture_axes, dtype=np.float64)
+    scales = np.asarray(texture_scales, dtype=np.float64)
+    # The offset the face's mapping needs once the brush is moved to its origin
+    texture_offsets = axes[:, :, 3] + np.einsum('ijk,ik->ij', axes[:, :, :3], face_origins) / scales
+    if texture_sizes is not None:
+        sizes = np.asarray(texture_sizes, dtype=np.float64)
+        known = sizes > 0
+        texture_offsets[known] = np.mod(texture_offsets[known], sizes[known])
+        # Offsets just below a whole repeat are the same as 0
+        texture_offsets[known & (sizes - texture_offsets < TEXTURE_QUANTUM * 0.5)] = 0.0
+
+    rows = np.concatenate([
+        np.round(normals / NORMAL_QUANTUM),
+        np.round(dists / DISTANCE_QUANTUM)[:, None],
+        np.asarray(texture_ids, dtype=np.float64)[:, None],
+        np.round(axes[:, :, :3].reshape(-1, 6) / NORMAL_QUANTUM),
+        np.round(texture_offsets / TEXTURE_QUANTUM),
+        np.round(scales / NORMAL_QUANTUM),
+    ], axis=1).astype(np.int64)
+    # Sort the faces of every brush, so the face order of a copy does not matter
+    order = np.lexsort(tuple(rows[:, column] for column in range(rows.shape[1] - 1, -1, -1)) + (face_brushes,))
+    rows = rows[order]
+
+    keys = np.full(brush_count, -1, dtype=np.int64)
+    key_ids = {}
+    for brush_index in range(brush_count):
+        if valid[brush_index]:
+            key = rows[offsets[brush_index]:offsets[brush_index + 1]].tobytes()
+            keys[brush_index] = key_ids.setdefault(key, len(key_ids))
+    return keys, origins, windings.mins, windings.maxs
+
+
+def _touching_clusters(candidates, mins, maxs):
+    """Splits candidates (brush indices) into clusters of brushes whose bounds touch. Returns a list of index arrays."""
+    parents = np.arange(len(candidates))
+
+    def find(item):
+        while parents[item] != item:
+            parents[item] = parents[parents[item]]
+            item = parents[item]
+        return item
+
+    low = mins[candidates] - TOUCH_EPSILON
+    high = maxs[candidates] + TOUCH_EPSILON
+    for block_start in range(0, len(candidates), _TOUCH_BLOCK):
+        block = slice(block_start, block_start + _TOUCH_BLOCK)
+        touching = np.all((low[block, None] <= high[None]) & (low[None] <= high[block, None]), axis=2)
+        for a, b in zip(*np.nonzero(touching)):
+            a += block_start
+            if a < b:
+                root_a, root_b = find(a), find(b)
+                if root_a != root_b:
+                    parents[max(root_a, root_b)] = min(root_a, root_b)
+    roots = np.array([find(item) for item in range(len(candidates))], dtype=np.intp)
+    order = np.argsort(roots, kind='stable')
+    splits = np.flatnonzero(np.diff(roots[order])) + 1
+    return [candidates[cluster] for cluster in np.split(order, splits)] if len(candidates) else []
+
+
+def find_instances(planes, brush_offsets, texture_ids, texture_axes, texture_scales, texture_sizes=None,
+                   min_count=MIN_INSTANCE_COUNT, min_brushes=MIN_PREFAB_BRUSHES):
+    """
+    Groups the brushes of a map into repeated structures. Brushes that only occur once are never
+    instanced; the repeated ones are first clustered by touching bounds, so e.g. a light fixture
+    built from three brushes becomes one prefab, and clusters that are copies of each other form a
+    group. Only groups of at least min_count clusters of at least min_brushes brushes are kept; with
+    min_brushes=1, brushes of clusters that occur fewer than min_count times are grouped one by one.
+    Takes the arrays of brush_keys. Returns a list of groups, each a dict with 'brushes', one array
+    of brush indices per occurrence (corresponding brushes in the same order), and 'origins', an
+    (occurrences, 3) array of where each occurrence sits; the first occurrence has the lowest brush index.
+    """
+    keys, origins, mins, maxs = brush_keys(planes, brush_offsets, texture_ids, texture_axes, texture_scales,
+                                           texture_sizes)
+    valid_keys = keys[keys >= 0]
+    counts = np.bincount(valid_keys, minlength=keys.max() + 1) if len(valid_keys) else np.zeros(0, dtype=np.intp)
+    candidates = np.flatnonzero((keys >= 0) & (counts[np.maximum(keys, 0)] >= min_count)) if len(counts) else np.zeros(0, dtype=np.intp)
+
+    cluster_groups = {}
+    for cluster in _touching_clusters(candidates, mins, maxs):
+        cluster_origin = origins[cluster].min(axis=0)
+        local = np.round((origins[cluster] - cluster_origin) / ORIGIN_QUANTUM).astype(np.int64)
+        # Brushes in key order, so corresponding brushes of two copies line up
+        order = np.lexsort((local[:, 2], local[:, 1], local[:, 0], keys[cluster]))
+        signature = (keys[cluster][order].tobytes(), local[order].tobytes())
+        cluster_groups.setdefault(signature, []).append((cluster[order], cluster_origin))
+
+    groups = []
+    leftovers = {}
+    for occurrences in cluster_groups.values():
+        if len(occurrences) >= min_count:
+            groups.append(occurrences)
+            continue
+        for cluster, _ in occurrences:
+            for brush_index in cluster.tolist():
+                leftovers.setdefault(keys[brush_index], []).append((np.array([brush_index]), origins[brush_index]))
+    groups.extend(occurrences for occurrences in leftovers.values() if len(occurrences) >= min_count)
+    groups = [occurrences for occurrences in groups if len(occurrences[0][0]) >= min_brushes]
+
+    result = []
+    for occurrences in groups:
+        occurrences.sort(key=lambda occurrence: occurrence[0].min())
+        result.append({'brushes': [brushes for brushes, _ in occurrences],
+                       'origins': np.array([origin for _, origin in occurrences], dtype=np.float64)})
+    result.sort(key=lambda group: group['brushes'][0].min())
+    return result
@@ -0,0 +1,248 @@
+"""
+Writes a Source 2 material (.vmat) for every texture the converted maps use, next to a copy of its image.
+Textures are gathered across the whole batch, so one used by every map of an episode is handled once.
+Images are then keyed by a hash of their contents: textures whose images are identical (Quake WADs
+repeat quite a few) share one copy. Hashing, copying and converting the formats resourcecompiler
+does not read run in a process pool. A manifest in the image folder remembers the source hash of
+every image written, so unchanged images are not copied again, and materials whose text is
+unchanged are not rewritten (which would make resourcecompiler rebuild them).
+"""
+import os
+import json
+import shutil
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import wad2
+from textures import IMAGE_EXTENSIONS, texture_name_for_file
+
+# Bump whenever written images or materials change for the same input, so existing outputs get rewritten.
+MATERIALS_VERSION = "1"
+
+# Remembers the source hash of every image written, kept in the image folder.
+MATERIALS_MANIFEST_FILENAME = ".materials.json"
+
+# Images are written to this folder, next to the materials that use them.
+MATERIAL_IMAGE_FOLDER = "textures"
+
+# Image formats resourcecompiler reads; the others (BMP) are converted to PNG.
+COPIED_EXTENSIONS = (".png", ".tga", ".jpg", ".jpeg")
+
+HASH_CHUNK_SIZE = 1 << 20
+
+_VMAT_TEMPLATE = """// THIS FILE IS AUTO-GENERATED
+
+Layer0
+{
+	shader "vr_complex.vfx"
+%s
+	//---- Color ----
+	g_flModelTintAmount "1.000"
+	g_vColorTint "[1.000000 1.000000 1.000000 0.000000]"
+	TextureColor "%s"
+
+	//---- Metalness ----
+	g_flMetalness "0.000"
+
+	//---- Roughness ----
+	TextureRoughness "[1.000000 1.000000 1.000000 0.000000]"
+}
+"""
+
+# '{' textures draw palette index 255 see-through (see wad2.decode_miptex)
+_VMAT_ALPHA_TEST = """
+	//---- Translucent ----
+	F_ALPHA_TEST 1
+	g_flAlphaTestReference "0.500"
+"""
+
+
+def material_name(texture_name):
+    """
+    Material name of a Quake texture, without the prefix: the upper case name, with '*' (liquids)
+    turned into '#' like wad2.texture_filename, since the material is a file too.
+    """
+    return texture_name.upper().replace('*', '#')
+
+
+def format_vmat(texture_name, image_resource):
+    """Text of the .vmat for a texture, whose image is at image_resource (relative to the content folder)."""
+    return _VMAT_TEMPLATE % (_VMAT_ALPHA_TEST if texture_name.startswith('{') else "", image_resource)
+
+
+def find_texture_images(image_folder):
+    """
+    Maps texture names to the image file for them in image_folder (not its subfolders).
+    When a texture exists in several formats, the first one in IMAGE_EXTENSIONS wins.
+    """
+    try:
+        filenames = [entry.name for entry in os.scandir(image_folder)
+                     if entry.name.lower().endswith(IMAGE_EXTENSIONS) and entry.is_file()]
+    except OSError:
+        return {}
+    priority = {extension: rank for rank, extension in enumerate(IMAGE_EXTENSIONS)}
+    images = {}
+    for filename in sorted(filenames, key=lambda name: (priority[os.path.splitext(name)[1].lower()], name)):
+        images.setdefault(texture_name_for_file(filename), os.path.join(image_folder, filename))
+    return images
+
+
+def _hash_image(image_filepath):
+    digest = hashlib.sha1()
+    with open(image_filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def decode_bmp(data):
+    """Decodes an uncompressed 24 or 32 bit BMP into an (height, width, 3 or 4) uint8 array."""
+    if data[:2] != b'BM' or len(data) < 54:
+        raise ValueError("Not a BMP file")
+    pixel_offset = int.from_bytes(data[10:14], 'little')
+    width = int.from_bytes(data[18:22], 'little', signed=True)
+    height = int.from_bytes(data[22:26], 'little', signed=True)
+    bits = int.from_bytes(data[28:30], 'little')
+    compression = int.from_bytes(data[30:34], 'little')
+    if bits not in (24, 32) or compression not in (0, 3) or width <= 0 or not height:
+        raise ValueError(f"Unsupported BMP ({bits} bits, compression {compression})")
+    channels = bits // 8
+    stride = (width * channels + 3) & ~3  # Rows are padded to 4 bytes
+    if pixel_offset + stride * abs(height) > len(data):
+        raise ValueError("BMP pixel data is truncated")
+    rows = np.frombuffer(data, dtype=np.uint8, count=stride * abs(height), offset=pixel_offset).reshape(abs(height), stride)
+    pixels = rows[:, :width * channels].reshape(abs(height), width, channels)
+    if height > 0:
+        pixels = pixels[::-1]  # Positive height means bottom-up rows
+    order = [2, 1, 0, 3] if channels == 4 else [2, 1, 0]  # BGR(A) to RGB(A)
+    return np.ascontiguousarray(pixels[..., order])
+
+
+def _export_image(job):
+    """Copies (or converts to PNG) one image. Returns None, or the error message."""
+    source_filepath, output_filepath = job
+    temp_filepath = output_filepath + ".tmp"
+    try:
+        if source_filepath.lower().endswith(COPIED_EXTENSIONS):
+            shutil.copyfile(source_filepath, temp_filepath)
+        else:
+            with open(source_filepath, 'rb') as f:
+                data = wad2.encode_png(decode_bmp(f.read()))
+            with open(temp_filepath, 'wb') as f:
+                f.write(data)
+        os.replace(temp_filepath, output_filepath)
+    except (OSError, ValueError) as e:
+        return str(e)
+    return None
+
+
+def image_output_filename(source_filepath):
+    """File name an image is written under: the source name in lower case, as .png unless resourcecompiler reads its format."""
+    stem, extension = os.path.splitext(os.path.basename(source_filepath).lower())
+    return stem + (extension if extension in COPIED_EXTENSIONS else ".png")
+
+
+def write_materials(texture_names, image_folder, content_folder, material_prefix, workers=1):
+    """
+    Writes <content_folder>/<material_prefix><material name>.vmat (in lower case) for every texture
+    of texture_names (any case, repeats allowed) that has an image in image_folder, and copies the
+    images to MATERIAL_IMAGE_FOLDER next to those materials. Each distinct image content is written
+    once, under the name of the first texture (in sorted order) having it; the other textures' materials
+    point at that copy. Hashing and copying run on a pool of workers processes.
+    Returns a dict with lists of 'written' and 'unchanged' texture names (by material), 'without_image'
+    texture names, 'failed' (texture name, error message) pairs, and the number of distinct images
+    'exported', 'reused' (already up to date) and 'shared' (textures using another texture's image).
+    """
+    summary = {'written': [], 'unchanged': [], 'without_image': [], 'failed': [], 'exported': 0, 'reused': 0,
+               'shared': 0}
+    available = find_texture_images(image_folder)
+    textures = []
+    for texture_name in sorted(set(name.lower() for name in texture_names)):
+        if texture_name in available:
+            textures.append(texture_name)
+        else:
+            summary['without_image'].append(texture_name)
+    if not textures:
+        return summary
+
+    material_folder = os.path.join(content_folder, os.path.dirname(material_prefix.lower()))
+    output_folder = os.path.join(material_folder, MATERIAL_IMAGE_FOLDER)
+    os.makedirs(output_folder, exist_ok=True)
+    manifest_filepath = os.path.join(output_folder, MATERIALS_MANIFEST_FILENAME)
+    try:
+        with open(manifest_filepath, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 and len(textures) > 1 else None
+    try:
+        run = pool.map if pool else map
+        source_filepaths = [available[texture_name] for texture_name in textures]
+        try:
+            hashes = list(run(_hash_image, source_filepaths))
+        except OSError as e:
+            summary['failed'].extend((texture_name, str(e)) for texture_name in textures)
+            return summary
+
+        # Group textures by image content; sorted input makes the first texture of every group the one it is named after
+        image_filenames = {}  # Content hash -> output file name
+        texture_images = {}  # Texture name -> output file name
+        jobs = []
+        job_textures = []
+        for texture_name, source_filepath, image_hash in zip(textures, source_filepaths, hashes):
+            image_filename = image_filenames.get(image_hash)
+            if image_filename is not None:
+                summary['shared'] += 1
+            else:
+                image_filename = image_filenames[image_hash] = image_output_filename(source_filepath)
+                checksum = image_hash + MATERIALS_VERSION
+                if manifest.get(image_filename) == checksum and os.path.isfile(os.path.join(output_folder, image_filename)):
+                    summary['reused'] += 1
+                else:
+                    manifest[image_filename] = checksum
+                    jobs.append((source_filepath, os.path.join(output_folder, image_filename)))
+                    job_textures.append(texture_name)
+            texture_images[texture_name] = image_filename
+
+        failed_images = set()
+        for texture_name, (_, output_filepath), error in zip(job_textures, jobs, run(_export_image, jobs)):
+            if error is None:
+                summary['exported'] += 1
+                continue
+            image_filename = os.path.basename(output_filepath)
+            manifest.pop(image_filename, None)
+            failed_images.add(image_filename)
+            summary['failed'].append((texture_name, error))
+    finally:
+        if pool:
+            pool.shutdown()
+        if summary['exported'] or summary['failed']:
+            temp_filepath = manifest_filepath + ".tmp"
+            with open(temp_filepath, 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, indent=1, sort_keys=True)
+            os.replace(temp_filepath, manifest_filepath)
+
+    image_resource_folder = os.path.relpath(output_folder, content_folder).replace(os.sep, '/')
+    for texture_name in textures:
+        image_filename = texture_images[texture_name]
+        if image_filename in failed_images:
+            if not any(name == texture_name for name, _ in summary['failed']):
+                summary['failed'].append((texture_name, f"its image {image_filename} could not be written"))
+            continue
+        vmat_filepath = os.path.join(content_folder, (material_prefix + material_name(texture_name)).lower() + ".vmat")
+        text = format_vmat(texture_name, f"{image_resource_folder}/{image_filename}")
+        try:
+            with open(vmat_filepath, 'r', encoding='utf-8') as f:
+                if f.read() == text:
+                    summary['unchanged'].append(texture_name)
+                    continue
+        except OSError:
+            pass  # Not written yet
+        os.makedirs(os.path.dirname(vmat_filepath), exist_ok=True)
+        with open(vmat_filepath, 'w', encoding='utf-8') as f:
+            f.write(text)
+        summary['written'].append(texture_name)
+    return summary
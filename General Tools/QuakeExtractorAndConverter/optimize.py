@@ -0,0 +1,200 @@
+"""
+Optional clean-up of parsed brushes before VMF generation: merges neighbouring world brushes whose
+union is still convex, then retextures faces buried against an opaque neighbour with nodraw.
+Works on any geometry with the MapGeometry interface (planes, brush_offsets, brush_entities,
+textures, add_face, end_brush, ...) and returns a new one of the same type.
+Neighbours are found through a uniform grid over the brush bounds, so the cost grows with the
+number of touching brush pairs instead of the square of the brush count.
+"""
+import numpy as np
+
+from winding import build_windings, ON_EPSILON
+
+# Edge length of the neighbour search grid, in Quake units.
+GRID_CELL_SIZE = 256.0
+
+# Texture given to faces nobody can see.
+NODRAW_TEXTURE = "tools/toolsnodraw"
+
+# Two unit normals closer than this (1 - dot product) count as parallel.
+NORMAL_EPSILON = 1e-6
+
+# Faces of these brushes do not hide what is behind them.
+_SEE_THROUGH_PREFIXES = ('*', '{')
+_SEE_THROUGH_TEXTURES = frozenset(('clip', 'trigger', 'skip', 'hint'))
+
+
+def _is_opaque(texture_name):
+    return not texture_name.startswith(_SEE_THROUGH_PREFIXES) and texture_name not in _SEE_THROUGH_TEXTURES
+
+
+class _Brush:
+    """A brush while optimizing: its face indices and the polygon vertices of every face."""
+    __slots__ = ('faces', 'points', 'mins', 'maxs')
+
+    def __init__(self, faces, points):
+        self.faces = faces
+        self.points = points  # Face index -> (n, 3) vertices; merged coplanar faces hold both polygons
+        vertices = np.concatenate(list(points.values()))
+        self.mins = vertices.min(axis=0)
+        self.maxs = vertices.max(axis=0)
+
+    def vertices(self):
+        return np.concatenate(list(self.points.values()))
+
+
+def _neighbour_pairs(brushes, candidates, cell_size, epsilon):
+    """
+    Yields index pairs (i < j) of candidate brushes whose bounds touch, using a uniform grid.
+    The grid and the bounds tests are done up front; brushes set to None while iterating are skipped.
+    """
+    if not candidates:
+        return
+    candidates = np.asarray(candidates)
+    mins = np.array([brushes[index].mins for index in candidates]) - epsilon
+    maxs = np.array([brushes[index].maxs for index in candidates]) + epsilon
+    low = np.floor(mins / cell_size).astype(int)
+    high = np.floor(maxs / cell_size).astype(int)
+    grid = {}
+    for position in range(len(candidates)):
+        (x0, y0, z0), (x1, y1, z1) = low[position], high[position]
+        for x in range(x0, x1 + 1):
+            for y in range(y0, y1 + 1):
+                for z in range(z0, z1 + 1):
+                    grid.setdefault((x, y, z), []).append(position)
+    pairs = set()
+    for cell in grid.values():
+        if len(cell) < 2:
+            continue
+        cell = np.array(cell)
+        touching = np.all((mins[cell][:, None] <= maxs[cell][None, :]) & (mins[cell][None, :] <= maxs[cell][:, None]), axis=2)
+        rows, columns = np.nonzero(np.triu(touching, 1))
+        first = candidates[cell[rows]]
+        second = candidates[cell[columns]]
+        pairs.update(zip(np.minimum(first, second).tolist(), np.maximum(first, second).tolist()))
+    for first, second in sorted(pairs):
+        if brushes[first] is not None and brushes[second] is not None:
+            yield first, second
+
+
+class _Planes:
+    """Plane equations of the original faces plus the checks the optimizer runs on them."""
+    def __init__(self, normals, dists, epsilon):
+        self.normals = normals
+        self.dists = dists
+        self.epsilon = epsilon
+
+    def inside(self, points, faces):
+        """True if every point lies behind (or on) every plane of faces."""
+        if not faces:
+            return True
+        faces = list(faces)
+        distances = points @ self.normals[faces].T - self.dists[faces]
+        return bool(np.all(distances <= self.epsilon))
+
+    def pairs(self, faces_a, faces_b, opposite):
+        """Returns (face_a, face_b) pairs lying on the same plane, facing opposite ways or the same way."""
+        normals_a = self.normals[faces_a]
+        normals_b = self.normals[faces_b]
+        dots = normals_a @ normals_b.T
+        if opposite:
+            match = (dots < -1.0 + NORMAL_EPSILON) & (np.abs(self.dists[faces_a][:, None] + self.dists[faces_b][None, :]) <= self.epsilon)
+        else:
+            match = (dots > 1.0 - NORMAL_EPSILON) & (np.abs(self.dists[faces_a][:, None] - self.dists[faces_b][None, :]) <= self.epsilon)
+        rows, columns = np.nonzero(match)
+        return [(faces_a[row], faces_b[column]) for row, column in zip(rows.tolist(), columns.tolist())]
+
+
+def _try_merge(a, b, planes, texture_ids, texture_param_ids):
+    """
+    Returns the brush covering a and b if they share a whole face and their union is convex, else None.
+    The union is convex exactly when every vertex of each brush lies behind all planes of the other
+    except the shared one. Faces ending up coplanar must carry the same texture and mapping.
+    """
+    shared = planes.pairs(a.faces, b.faces, opposite=True)
+    if len(shared) != 1:
+        return None
+    face_a, face_b = shared[0]
+    other_a = [face for face in a.faces if face != face_a]
+    other_b = [face for face in b.faces if face != face_b]
+    if not planes.inside(a.vertices(), other_b) or not planes.inside(b.vertices(), other_a):
+        return None
+    coplanar = planes.pairs(other_a, other_b, opposite=False)
+    for kept, dropped in coplanar:
+        if texture_ids[kept] != texture_ids[dropped] or texture_param_ids[kept] != texture_param_ids[dropped]:
+            return None
+    dropped_faces = {dropped for _, dropped in coplanar}
+    points = {face: a.points[face] for face in other_a}
+    for kept, dropped in coplanar:
+        points[kept] = np.concatenate([points[kept], b.points[dropped]])
+    for face in other_b:
+        if face not in dropped_faces:
+            points[face] = b.points[face]
+    return _Brush(other_a + [face for face in other_b if face not in dropped_faces], points)
+
+
+def optimize_brushes(map_data, merge=True, cull=True, cell_size=GRID_CELL_SIZE, epsilon=ON_EPSILON):
+    """
+    Merges and culls the world brushes of map_data (see the module docstring); brushes of other
+    entities and brushes that do not form a closed volume are passed through unchanged.
+    Returns (optimized, stats): a new geometry of the same type and a dict with the solid and face
+    counts 'before' and 'after', the number of 'merged' brush pairs and of 'nodraw' faces.
+    """
+    windings = build_windings(map_data.planes, map_data.brush_offsets, epsilon)
+    planes = _Planes(windings.normals, windings.dists, epsilon)
+    texture_ids = np.frombuffer(map_data.texture_ids, dtype=np.int32)
+    texture_param_ids = np.frombuffer(map_data.texture_param_ids, dtype=np.int32)
+    offsets = map_data.brush_offsets
+    world = map_data.worldspawn_index
+    nodraw_faces = set()
+
+    brushes = []
+    candidates = []
+    for brush_index in range(len(map_data)):
+        faces = list(range(offsets[brush_index], offsets[brush_index + 1]))
+        if not windings.valid[brush_index] or map_data.brush_entities[brush_index] != world:
+            brushes.append(faces)  # Left exactly as parsed
+            continue
+        # Faces clipped away entirely are redundant planes; they are dropped with the brush rebuilt
+        points = {face: windings.face_polygon(face) for face in faces if len(windings.face_polygon(face))}
+        brushes.append(_Brush(list(points), points))
+        candidates.append(brush_index)
+
+    merged_pairs = 0
+    if merge:
+        while True:
+            merged_this_pass = 0
+            for first, second in _neighbour_pairs(brushes, candidates, cell_size, epsilon):
+                merged = _try_merge(brushes[first], brushes[second], planes, texture_ids, texture_param_ids)
+                if merged is not None:
+                    brushes[first] = merged
+                    brushes[second] = None
+                    merged_this_pass += 1
+            candidates = [index for index in candidates if brushes[index] is not None]
+            merged_pairs += merged_this_pass
+            if not merged_this_pass:
+                break
+
+    if cull:
+        opaque = np.array([_is_opaque(texture) for texture in map_data.textures] + [False])
+        for first, second in _neighbour_pairs(brushes, candidates, cell_size, epsilon):
+            for brush, other in ((brushes[first], brushes[second]), (brushes[second], brushes[first])):
+                for face, other_face in planes.pairs(brush.faces, other.faces, opposite=True):
+                    # Hidden if the face lies completely inside the opaque face pressed against it
+                    if opaque[texture_ids[other_face]] and planes.inside(brush.points[face], other.faces):
+                        nodraw_faces.add(face)
+
+    optimized = type(map_data)()
+    optimized.entities = map_data.entities
+    stats = {'before': {'solids': len(map_data), 'faces': map_data.face_count}, 'merged': merged_pairs, 'nodraw': 0}
+    for brush_index, brush in enumerate(brushes):
+        if brush is None:
+            continue
+        faces = brush if isinstance(brush, list) else sorted(brush.faces)
+        for face in faces:
+            texture = NODRAW_TEXTURE if face in nodraw_faces else map_data.textures[texture_ids[face]]
+            optimized.add_face(map_data.planes[face * 9:face * 9 + 9], texture, map_data.face_texture_params(face))
+        optimized.end_brush(map_data.brush_entities[brush_index])
+    stats['nodraw'] = len(nodraw_faces)
+    stats['after'] = {'solids': len(optimized), 'faces': optimized.face_count}
+    return optimized, stats
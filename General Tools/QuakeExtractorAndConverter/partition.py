@@ -0,0 +1,51 @@
+"""
+Splits the brushes of a map into regions of a uniform grid, so each region can be written as its
+own prefab VMF and compiled by its own resourcecompiler run.
+Every brush goes to exactly one region, the grid cell holding the centre of its bounding box, so
+brushes are never cut and regions may overlap a little at their borders.
+Works on plain arrays (nine plane point floats per face, brush face offsets) like winding.py.
+"""
+import numpy as np
+
+from winding import build_windings
+
+# Default edge length of a region, in Quake units.
+REGION_CELL_SIZE = 2048.0
+
+
+def brush_bounds(planes, brush_offsets):
+    """
+    Returns (mins, maxs), two (brush_count, 3) arrays with the bounding box of every brush.
+    Bounds come from the solved face polygons; brushes that do not form a closed volume fall back
+    to the bounds of their plane points, which editors place on the brush corners.
+    """
+    windings = build_windings(planes, brush_offsets)
+    mins = windings.mins.copy()
+    maxs = windings.maxs.copy()
+    invalid = np.flatnonzero(~windings.valid)
+    if len(invalid):
+        points = np.asarray(planes, dtype=np.float64).reshape(-1, 3, 3)
+        offsets = np.asarray(brush_offsets, dtype=np.intp)
+        for brush_index in invalid.tolist():
+            brush_points = points[offsets[brush_index]:offsets[brush_index + 1]].reshape(-1, 3)
+            mins[brush_index] = brush_points.min(axis=0)
+            maxs[brush_index] = brush_points.max(axis=0)
+    return mins, maxs
+
+
+def partition_brushes(mins, maxs, cell_size=REGION_CELL_SIZE):
+    """
+    Buckets brushes into grid cells of cell_size by the centre of their bounds.
+    Returns a dict mapping each non-empty cell (x, y, z) to the ascending array of its brush
+    indices, with the cells in sorted order.
+    """
+    if cell_size <= 0:
+        raise ValueError(f"Region cell size must be positive, got {cell_size}")
+    cells = np.floor((np.asarray(mins) + np.asarray(maxs)) * 0.5 / cell_size).astype(np.int64)
+    if not len(cells):
+        return {}
+    unique_cells, cell_of_brush = np.unique(cells, axis=0, return_inverse=True)
+    cell_of_brush = cell_of_brush.reshape(-1)
+    order = np.argsort(cell_of_brush, kind='stable')
+    splits = np.cumsum(np.bincount(cell_of_brush, minlength=len(unique_cells)))[:-1]
+    return {tuple(cell): brushes for cell, brushes in zip(unique_cells.tolist(), np.split(order, splits))}
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The converter modules import each other as top-level modules, the way the scripts are run
+TOOL_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, TOOL_DIR)
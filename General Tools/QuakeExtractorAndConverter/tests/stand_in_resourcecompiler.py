@@ -0,0 +1,23 @@
+"""
+Stands in for resourcecompiler.exe in the tests: floods stderr and stdout with far more than a pipe
+buffer holds, then optionally hangs.
+Usage: stand_in_resourcecompiler.py LINES HANG_SECONDS [compiler arguments...]
+Writes LINES lines to stderr and every third of them to stdout, sleeps HANG_SECONDS and exits 0.
+"""
+import sys
+import time
+
+
+def main():
+    lines, hang_seconds = int(sys.argv[1]), float(sys.argv[2])
+    for index in range(lines):
+        sys.stderr.write(f"err line {index} " + "x" * 60 + "\n")
+        if index % 3 == 0:
+            sys.stdout.write(f"out line {index}\n")
+    sys.stderr.flush()
+    sys.stdout.flush()
+    time.sleep(hang_seconds)
+
+
+if __name__ == "__main__":
+    main()
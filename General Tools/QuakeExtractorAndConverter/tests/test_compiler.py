@@ -0,0 +1,61 @@
+import os
+import sys
+import stat
+import threading
+
+from vmapconverter import run_resource_compiler
+
+STAND_IN = os.path.join(os.path.dirname(os.path.abspath(__file__)), "stand_in_resourcecompiler.py")
+
+FLOOD_LINES = 20000
+
+
+def _compiler(tmp_path, lines, hang_seconds):
+    """Writes a resourcecompiler in an Alyx-like game/bin/win64 folder that runs the stand-in. Returns its path."""
+    bin_folder = tmp_path / "game" / "bin" / "win64"
+    bin_folder.mkdir(parents=True)
+    arguments = f'"{sys.executable}" "{STAND_IN}" {lines} {hang_seconds}'
+    if os.name == 'nt':
+        compiler_path = bin_folder / "resourcecompiler.bat"
+        compiler_path.write_text(f"@{arguments} %*\n")
+    else:
+        compiler_path = bin_folder / "resourcecompiler"
+        compiler_path.write_text(f'#!/bin/sh\nexec {arguments} "$@"\n')
+        compiler_path.chmod(compiler_path.stat().st_mode | stat.S_IXUSR)
+    return str(compiler_path)
+
+
+def _run(compiler_path, **options):
+    stats = {}
+    lines = []
+    succeeded = run_resource_compiler(compiler_path, "map.vmf", log=lines.append, stats=stats, **options)
+    return succeeded, stats, "\n".join(lines)
+
+
+def test_flooded_pipes_are_drained(tmp_path):
+    succeeded, stats, output = _run(_compiler(tmp_path, FLOOD_LINES, 0))
+    assert succeeded
+    assert stats['exit_code'] == 0 and stats['stop_reason'] is None
+    assert stats['output_lines'] == FLOOD_LINES + (FLOOD_LINES + 2) // 3
+    assert f"[RC_ERROR] err line {FLOOD_LINES - 1} " in output
+
+
+def test_timeout_kills_the_compiler(tmp_path):
+    succeeded, stats, output = _run(_compiler(tmp_path, FLOOD_LINES, 30), timeout=1.0)
+    assert not succeeded
+    assert stats['stop_reason'] == "timed out after 1 seconds" and stats['exit_code'] is None
+    assert 1.0 <= stats['seconds'] < 3.0
+    assert "timed out" in output
+
+
+def test_cancel_kills_the_compiler(tmp_path):
+    cancel_event = threading.Event()
+    timer = threading.Timer(0.5, cancel_event.set)
+    timer.start()
+    try:
+        succeeded, stats, _ = _run(_compiler(tmp_path, FLOOD_LINES, 30), cancel_event=cancel_event)
+    finally:
+        timer.cancel()
+    assert not succeeded
+    assert stats['stop_reason'] == "cancelled" and stats['exit_code'] is None
+    assert 0.5 <= stats['seconds'] < 2.5
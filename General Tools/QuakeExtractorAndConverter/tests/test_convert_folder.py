@@ -0,0 +1,48 @@
+import os
+import json
+import shutil
+
+from conftest import TOOL_DIR
+from vmapconverter import REPORT_FILENAME, convert_folder
+
+
+def _convert(input_folder, output_folder, **options):
+    lines = []
+    results = convert_folder(str(input_folder), str(output_folder), log=lines.append, **options)
+    return results, "\n".join(lines)
+
+
+def test_check_brushes_is_not_skipped_by_the_cache(tmp_path, capsys):
+    input_folder = tmp_path / "maps"
+    input_folder.mkdir()
+    shutil.copy(os.path.join(TOOL_DIR, "quake_maps_input", "E1M4.MAP"), input_folder)
+
+    results, _ = _convert(input_folder, tmp_path / "out")
+    assert not results[0].get('cached')
+    results, _ = _convert(input_folder, tmp_path / "out")
+    assert results[0].get('cached')
+
+    results, output = _convert(input_folder, tmp_path / "out", check_brushes=True)
+    assert not results[0].get('cached')
+    assert results[0]['duplicate_faces'] == [(1, 12, 7), (11, 72, 67)]
+    assert "repeating a plane" in output + capsys.readouterr().out
+
+
+def test_partial_rebuild_keeps_the_other_maps_in_the_report(tmp_path):
+    input_folder = tmp_path / "maps"
+    input_folder.mkdir()
+    for filename in ("E1M7.MAP", "sample_map.map"):
+        shutil.copy(os.path.join(TOOL_DIR, "quake_maps_input", filename), input_folder)
+
+    _convert(input_folder, tmp_path / "out")
+    (report_filepath,) = tmp_path.glob("out/*/" + REPORT_FILENAME)
+    with open(report_filepath, encoding='utf-8') as f:
+        maps = [entry['map'] for entry in json.load(f)['maps']]
+    assert len(maps) == 2
+
+    rebuilt = [map_filepath for map_filepath in maps if map_filepath.endswith("sample_map.map")]
+    results, _ = _convert(input_folder, tmp_path / "out", map_filepaths=rebuilt, force=True)
+    assert [result['map'] for result in results] == rebuilt
+    with open(report_filepath, encoding='utf-8') as f:
+        report = json.load(f)
+    assert [entry['map'] for entry in report['maps']] == maps
@@ -0,0 +1,71 @@
+import io
+import os
+import math
+import contextlib
+
+import numpy as np
+
+from conftest import TOOL_DIR
+from entities import convert_entity
+from vmapconverter import parse_quake_map, transform_points
+
+
+def _transform_point(point):
+    return transform_points(point)[0].tolist()
+
+
+def _e1m1_entities(classname):
+    with contextlib.redirect_stdout(io.StringIO()):
+        brushes = parse_quake_map(os.path.join(TOOL_DIR, "quake_maps_input", "E1M1.MAP"))
+    return [entity for entity in brushes.entities if entity.get('classname') == classname]
+
+
+def _facing(angles):
+    """Source direction a VMF "angles" value faces (positive pitch looks down Source Z)."""
+    pitch, yaw, _ = (math.radians(float(part)) for part in angles.split())
+    return [math.cos(pitch) * math.cos(yaw), math.cos(pitch) * math.sin(yaw), -math.sin(pitch)]
+
+
+def _source_direction(quake_direction, **options):
+    """A Quake direction transformed like the geometry, as a unit vector."""
+    direction = (transform_points(quake_direction, **options) - transform_points((0, 0, 0), **options))[0]
+    return (direction / np.linalg.norm(direction)).tolist()
+
+
+def test_player_start_faces_quake_north():
+    (player_start,) = _e1m1_entities('info_player_start')
+    assert player_start['angle'] == "90"
+    angles = convert_entity(player_start, _transform_point, 0.75)['keyvalues']['angles']
+    # Quake +Y ends up on Source -Z with the default axis map
+    assert np.allclose(_facing(angles), [0, 0, -1])
+    assert np.allclose(_facing(angles), _source_direction((0, 1, 0)))
+
+
+def test_door_directions():
+    doors = {door['angle']: convert_entity(door, _transform_point, 0.75)['keyvalues']['movedir']
+             for door in _e1m1_entities('func_door')}
+    assert np.allclose(_facing(doors["270"]), _source_direction((0, -1, 0)))
+    assert np.allclose(_facing(doors["180"]), _source_direction((-1, 0, 0)))
+    # Quake -2 moves down, -1 up; Quake up is Source +Y
+    assert np.allclose(_facing(doors["-2"]), [0, -1, 0])
+    up = convert_entity({'classname': 'func_door', 'angle': "-1"}, _transform_point)['keyvalues']['movedir']
+    assert np.allclose(_facing(up), [0, 1, 0])
+
+
+def test_angles_follow_the_transform():
+    matrix = [[0, -1, 0], [1, 0, 0], [0, 0, 1]]  # A quarter turn about Source Z on top of the axis map
+
+    def transform_point(point):
+        return transform_points(point, matrix=matrix)[0].tolist()
+
+    for angle in (0, 45, 90, 135, 180, 270, 315):
+        angles = convert_entity({'classname': 'info_player_start', 'angle': str(angle)}, transform_point)['keyvalues']['angles']
+        yaw = math.radians(angle)
+        assert np.allclose(_facing(angles), _source_direction((math.cos(yaw), math.sin(yaw), 0), matrix=matrix))
+
+
+def test_light_conversions():
+    converted = convert_entity({'classname': 'light', 'light': "150", '_color': "1 0.5 0"}, _transform_point, 0.75)
+    assert converted['keyvalues'] == {'brightness': "0.5", 'range': "112.5", 'color': "255 128 0"}
+    defaults = convert_entity({'classname': 'light_globe'}, _transform_point, 0.75)
+    assert defaults['keyvalues'] == {'brightness': "1", 'range': "225", 'color': "255 255 255"}
@@ -0,0 +1,45 @@
+import numpy as np
+
+from instancing import find_instances
+
+
+def _box(mins, maxs):
+    """Plane points of an axis-aligned box brush in Quake order (normals pointing out)."""
+    (x0, y0, z0), (x1, y1, z1) = mins, maxs
+    return [
+        (x0, y0, z0, x0, y1, z0, x0, y0, z1),
+        (x1, y0, z0, x1, y0, z1, x1, y1, z0),
+        (x0, y0, z0, x0, y0, z1, x1, y0, z0),
+        (x0, y1, z0, x1, y1, z0, x0, y1, z1),
+        (x0, y0, z0, x1, y0, z0, x0, y1, z0),
+        (x0, y0, z1, x0, y1, z1, x1, y0, z1),
+    ]
+
+
+def _find(boxes, **options):
+    faces = [face for mins, maxs in boxes for face in _box(mins, maxs)]
+    face_count = len(faces)
+    # All-zero texture axes, so the texture mapping of every copy matches
+    return find_instances(np.array(faces, dtype=np.float64).ravel(), np.arange(0, face_count + 1, 6),
+                          np.zeros(face_count, dtype=np.int32), np.zeros((face_count, 2, 4)), np.ones((face_count, 2)),
+                          **options)
+
+
+# A cluster of two touching brushes twice, a single brush twice and a brush that occurs once
+BOXES = [((0, 0, 0), (32, 32, 32)), ((32, 0, 0), (64, 32, 16)),
+         ((256, 0, 0), (288, 32, 32)), ((288, 0, 0), (320, 32, 16)),
+         ((0, 512, 0), (16, 528, 16)), ((256, 512, 0), (272, 528, 16)),
+         ((512, 512, 0), (600, 600, 8))]
+
+
+def test_repeated_cluster_becomes_one_prefab():
+    groups = _find(BOXES)
+    assert len(groups) == 1
+    assert [brushes.tolist() for brushes in groups[0]['brushes']] == [[0, 1], [2, 3]]
+    assert groups[0]['origins'].tolist() == [[0, 0, 0], [256, 0, 0]]
+
+
+def test_single_brushes_are_only_instanced_on_request():
+    groups = _find(BOXES, min_brushes=1)
+    assert [[brushes.tolist() for brushes in group['brushes']] for group in groups] == [[[0, 1], [2, 3]], [[4], [5]]]
+    assert _find(BOXES, min_count=3) == []
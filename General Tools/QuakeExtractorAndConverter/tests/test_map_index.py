@@ -0,0 +1,45 @@
+import io
+import os
+import fnmatch
+import contextlib
+
+import numpy as np
+
+from conftest import TOOL_DIR
+from vmapconverter import MapEntityIndex, parse_quake_map
+
+E1M1 = os.path.join(TOOL_DIR, "quake_maps_input", "E1M1.MAP")
+
+
+def _parse(map_filepath, classnames=None):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return parse_quake_map(map_filepath, classnames)
+
+
+def test_index_matches_the_full_parse():
+    geometry = _parse(E1M1)
+    with MapEntityIndex(E1M1) as index:
+        assert len(index) == len(geometry.entities)
+        assert [index.keyvalues(entity_index) for entity_index in range(len(index))] == geometry.entities
+        assert index.classnames == [entity.get('classname', '') for entity in geometry.entities]
+        brush_entities = np.frombuffer(geometry.brush_entities, dtype=np.int32)
+        assert index.brush_counts == np.bincount(brush_entities, minlength=len(index)).tolist()
+        loaded = index.load()
+    assert loaded.planes == geometry.planes
+    assert loaded.entities == geometry.entities
+
+
+def test_classnames_keep_the_matching_entities():
+    patterns = ['func_door', 'trigger_*']
+    with MapEntityIndex(E1M1) as index:
+        selected = index.select(*patterns)
+        expected = [index.keyvalues(entity_index) for entity_index in selected]
+        brush_counts = [index.brush_counts[entity_index] for entity_index in selected]
+    assert expected and all(any(fnmatch.fnmatchcase(entity['classname'], pattern) for pattern in patterns)
+                            for entity in expected)
+
+    geometry = _parse(E1M1, patterns)
+    assert geometry.entities == expected
+    # Every brush still knows the entity it belongs to
+    brush_entities = np.frombuffer(geometry.brush_entities, dtype=np.int32)
+    assert np.bincount(brush_entities, minlength=len(expected)).tolist() == brush_counts
@@ -0,0 +1,95 @@
+import io
+import contextlib
+
+import numpy as np
+
+from optimize import NODRAW_TEXTURE, optimize_brushes
+from vmapconverter import parse_quake_map
+
+
+def _box(mins, maxs):
+    """Plane points of an axis-aligned box brush in Quake order (normals pointing out)."""
+    (x0, y0, z0), (x1, y1, z1) = mins, maxs
+    return [
+        (x0, y0, z0, x0, y1, z0, x0, y0, z1),  # -x
+        (x1, y0, z0, x1, y0, z1, x1, y1, z0),  # +x
+        (x0, y0, z0, x0, y0, z1, x1, y0, z0),  # -y
+        (x0, y1, z0, x1, y1, z0, x0, y1, z1),  # +y
+        (x0, y0, z0, x1, y0, z0, x0, y1, z0),  # -z
+        (x0, y0, z1, x0, y1, z1, x1, y0, z1),  # +z
+    ]
+
+
+def _parse(tmp_path, world_boxes, entity_boxes=()):
+    """Parses a map of WALL textured boxes: world_boxes in worldspawn, entity_boxes in one func_wall."""
+    def brushes(boxes):
+        text = ""
+        for mins, maxs in boxes:
+            text += "{\n"
+            for face in _box(mins, maxs):
+                points = " ".join("( %g %g %g )" % tuple(face[index:index + 3]) for index in (0, 3, 6))
+                text += f"{points} WALL 0 0 0 1 1\n"
+            text += "}\n"
+        return text
+
+    text = '{\n"classname" "worldspawn"\n' + brushes(world_boxes) + "}\n"
+    if entity_boxes:
+        text += '{\n"classname" "func_wall"\n' + brushes(entity_boxes) + "}\n"
+    map_filepath = tmp_path / "test.map"
+    map_filepath.write_text(text)
+    with contextlib.redirect_stdout(io.StringIO()):
+        return parse_quake_map(str(map_filepath))
+
+
+def _face_textures(map_data):
+    texture_ids = np.frombuffer(map_data.texture_ids, dtype=np.int32)
+    return [map_data.textures[texture_id] for texture_id in texture_ids.tolist()]
+
+
+def test_boxes_sharing_a_face_merge(tmp_path):
+    map_data = _parse(tmp_path, [((0, 0, 0), (64, 64, 64)), ((64, 0, 0), (128, 64, 64))])
+    optimized, stats = optimize_brushes(map_data, cull=False)
+    assert stats['merged'] == 1
+    assert stats['after']['solids'] == 1
+    # The shared faces are gone; the four sides that became coplanar are kept once each
+    assert stats['after']['faces'] == 6
+
+
+def test_boxes_without_a_shared_face_stay_apart(tmp_path):
+    boxes = [((0, 0, 0), (64, 64, 64)),
+             ((128, 0, 0), (192, 64, 64)),  # Apart
+             ((64, 64, 0), (128, 128, 64)),  # Touches the first along an edge only
+             ((0, 64, 0), (32, 128, 64))]  # Covers part of the first one's +y face; the union is not convex
+    optimized, stats = optimize_brushes(_parse(tmp_path, boxes), cull=False)
+    assert stats['merged'] == 0
+    assert stats['after']['solids'] == 4
+
+
+def test_flush_faces_become_nodraw(tmp_path):
+    map_data = _parse(tmp_path, [((0, 0, 0), (64, 64, 64)), ((64, 0, 0), (128, 64, 64))])
+    optimized, stats = optimize_brushes(map_data, merge=False)
+    assert stats['nodraw'] == 2
+    textures = _face_textures(optimized)
+    assert textures[1] == NODRAW_TEXTURE  # +x of the first box
+    assert textures[6] == NODRAW_TEXTURE  # -x of the second box
+    assert textures.count(NODRAW_TEXTURE) == 2
+
+
+def test_partly_covered_face_stays_visible(tmp_path):
+    # The second box covers only half of the first one's +x face, but its own -x face is covered completely
+    map_data = _parse(tmp_path, [((0, 0, 0), (64, 64, 64)), ((64, 0, 0), (128, 32, 64))])
+    optimized, stats = optimize_brushes(map_data, merge=False)
+    assert stats['nodraw'] == 1
+    textures = _face_textures(optimized)
+    assert textures[1] == "wall"
+    assert textures[6] == NODRAW_TEXTURE
+
+
+def test_entity_brushes_are_left_alone(tmp_path):
+    map_data = _parse(tmp_path, [((0, 0, 0), (16, 16, 16))],
+                      entity_boxes=[((0, 0, 64), (64, 64, 128)), ((64, 0, 64), (128, 64, 128))])
+    optimized, stats = optimize_brushes(map_data)
+    assert stats['merged'] == 0 and stats['nodraw'] == 0
+    assert stats['after'] == stats['before']
+    assert optimized.planes == map_data.planes
+    assert _face_textures(optimized) == _face_textures(map_data)
@@ -0,0 +1,96 @@
+import io
+import os
+import contextlib
+
+import vmap
+from conftest import TOOL_DIR
+from vmapconverter import parse_quake_map, write_vmap
+
+SMALL_MAP = """
+{
+"classname" "worldspawn"
+{
+( 0 0 0 ) ( 0 64 0 ) ( 0 0 64 ) WALL [ 0 1 0 0 ] [ 0 0 -1 0 ] 0 1 1
+( 128 0 0 ) ( 128 0 64 ) ( 128 64 0 ) WALL [ 0 1 0 0 ] [ 0 0 -1 0 ] 0 1 1
+( 0 0 0 ) ( 0 0 64 ) ( 128 0 0 ) WALL [ 1 0 0 0 ] [ 0 0 -1 0 ] 0 1 1
+( 0 64 0 ) ( 128 64 0 ) ( 0 64 64 ) WALL [ 1 0 0 0 ] [ 0 0 -1 0 ] 0 1 1
+( 0 0 0 ) ( 128 0 0 ) ( 0 64 0 ) FLOOR [ 1 0 0 0 ] [ 0 -1 0 0 ] 0 1 1
+( 0 0 16 ) ( 0 64 16 ) ( 128 0 16 ) FLOOR [ 1 0 0 0 ] [ 0 -1 0 0 ] 0 1 1
+}
+}
+{
+"classname" "func_door"
+"angle" "90"
+{
+( 0 0 16 ) ( 0 64 16 ) ( 0 0 80 ) DOOR [ 0 1 0 0 ] [ 0 0 -1 0 ] 0 1 1
+( 8 0 16 ) ( 8 0 80 ) ( 8 64 16 ) DOOR [ 0 1 0 0 ] [ 0 0 -1 0 ] 0 1 1
+( 0 0 16 ) ( 0 0 80 ) ( 8 0 16 ) DOOR [ 1 0 0 0 ] [ 0 0 -1 0 ] 0 1 1
+( 0 64 16 ) ( 8 64 16 ) ( 0 64 80 ) DOOR [ 1 0 0 0 ] [ 0 0 -1 0 ] 0 1 1
+( 0 0 16 ) ( 8 0 16 ) ( 0 64 16 ) DOOR [ 1 0 0 0 ] [ 0 -1 0 0 ] 0 1 1
+( 0 0 80 ) ( 0 64 80 ) ( 8 0 80 ) DOOR [ 1 0 0 0 ] [ 0 -1 0 0 ] 0 1 1
+}
+}
+{
+"classname" "info_player_start"
+"origin" "32 32 40"
+"angle" "90"
+}
+"""
+
+
+def _write(map_filepath, vmap_filepath, **options):
+    with contextlib.redirect_stdout(io.StringIO()) as output:
+        brushes = parse_quake_map(str(map_filepath))
+        write_vmap(brushes, str(vmap_filepath), validate=True, **options)
+    return output.getvalue()
+
+
+def _walk(element, element_type):
+    """All elements of element_type in the tree under element."""
+    found = [element] if element.type == element_type else []
+    for attribute_type, value in element.attributes.values():
+        children = value if attribute_type == 'element_array' else [value] if isinstance(value, vmap.Element) else []
+        for child in children:
+            found.extend(_walk(child, element_type))
+    return found
+
+
+def test_small_map_round_trip(tmp_path):
+    map_filepath = tmp_path / "small.map"
+    map_filepath.write_text(SMALL_MAP)
+    output = _write(map_filepath, tmp_path / "small.vmap", entities=True)
+    assert "Left out" not in output
+
+    with open(tmp_path / "small.vmap", encoding='utf-8') as f:
+        text = f.read()
+    assert text.startswith("<!-- dmx encoding keyvalues2 4 format vmap 29 -->\n")
+    elements = vmap.read_keyvalues2(text)
+    assert vmap.validate_vmap_elements(elements) == []
+    assert [element.type for element in elements] == ['$prefix_element$', 'CMapRootElement']
+
+    meshes = _walk(elements[1], 'CDmePolygonMesh')
+    assert len(meshes) == 2
+    for mesh in meshes:
+        # A box: 8 vertices, 12 edges as 24 half-edges, 6 faces
+        assert len(mesh.get('vertexEdgeIndices')) == 8
+        assert len(mesh.get('edgeVertexIndices')) == 24
+        assert len(mesh.get('faceEdgeIndices')) == 6
+    classnames = sorted(properties.get('classname') for properties in _walk(elements[1], 'EditGameClassProps'))
+    assert classnames == ['func_door', 'info_player_start', 'worldspawn']
+
+
+def test_malformed_text_is_reported():
+    errors = []
+    for text in ('"CMapRootElement" { "isprefab" "bool" }', '"CMapRootElement" { "a" "int_array" [ "1" "2" ] }',
+                 '"CMapRootElement" { "isprefab" "bool" "0"'):
+        try:
+            vmap.read_keyvalues2(text)
+        except vmap.VmapError as e:
+            errors.append(str(e))
+    assert len(errors) == 3
+
+
+def test_e1m4_keeps_brushes_with_duplicate_faces(tmp_path):
+    output = _write(os.path.join(TOOL_DIR, "quake_maps_input", "E1M4.MAP"), tmp_path / "E1M4.vmap")
+    assert "Left out" not in output
+    assert vmap.check_vmap_file(str(tmp_path / "E1M4.vmap")) == []
@@ -0,0 +1,49 @@
+import io
+import os
+import re
+import hashlib
+import contextlib
+
+import pytest
+
+from conftest import TOOL_DIR
+from vmapconverter import generate_vmf_content, parse_quake_map
+
+MAP_FOLDER = os.path.join(TOOL_DIR, "quake_maps_input")
+CHECKED_IN_FOLDER = os.path.join(TOOL_DIR, "alyx_output", "quakeautomatedscriptport", "maps")
+
+# sha256 of generate_vmf_content with the default options, texture axes included
+GOLDEN_HASHES = {
+    'E1M1': "1ff5e1035bc5ea517f50c3386f007d3ff1fec05b4df3bf9429e8348e86e0f2e7",
+    'E1M2': "a97dada0a746442dfed6824059e6f3f848b021700e82662d3111c1ed7b390604",
+    'E1M3': "6224a13678de18d0e2bf826008f768134ddcfe0a0620d274a236d7186d7edc9a",
+    'E1M4': "8c7c0442c947a48711c0a31c1962841c9b67b40bba0c16a4730e803c5cbbfc19",
+    'E1M5': "2c206d01477e539f284583466bb4b41b90a7f73b6cd7e0ff9b8b120dfa830ebb",
+    'E1M6': "5c722e8ee048eb2226f98db43cd087c5712a2530f3a499dc3b71bb4d909c531f",
+    'E1M7': "9124e19d55a522b4c0056a8f4f34d5a0ecfc344c05451b863e02d7a2491dd587",
+    'E1M8': "be1c6a3082582df29fb935dbdb9bdbf9773da285f1902270c2307cdead5ca0a5",
+    'sample_map': "7e6249b10398f4cc50bd7e1ce17cc0a8e058c36403aa8b6f41d652b730cdf374",
+}
+
+# The checked-in VMFs predate the texture alignment and the '#' for '*' in material names
+_TEXTURE_AXIS_RE = re.compile(r'^\s*"(?:uaxis|vaxis|rotation)" .*\n', re.M)
+
+
+def _generate(map_name):
+    filename = map_name + (".map" if map_name == 'sample_map' else ".MAP")
+    with contextlib.redirect_stdout(io.StringIO()):
+        brushes = parse_quake_map(os.path.join(MAP_FOLDER, filename))
+    return generate_vmf_content(brushes)
+
+
+@pytest.mark.parametrize('map_name', sorted(GOLDEN_HASHES))
+def test_vmf_matches_golden_hash(map_name):
+    assert hashlib.sha256(_generate(map_name).encode('utf-8')).hexdigest() == GOLDEN_HASHES[map_name]
+
+
+@pytest.mark.parametrize('map_name', sorted(GOLDEN_HASHES))
+def test_vmf_matches_checked_in_output(map_name):
+    with open(os.path.join(CHECKED_IN_FOLDER, map_name + ".vmf"), 'r', encoding='utf-8', newline='') as f:
+        checked_in = f.read()
+    generated = _generate(map_name)
+    assert _TEXTURE_AXIS_RE.sub('', generated) == _TEXTURE_AXIS_RE.sub('', checked_in).replace('"materials/*', '"materials/#')
@@ -0,0 +1,114 @@
+import zlib
+import struct
+
+import numpy as np
+import pytest
+
+import wad2
+
+# Palette entry i is (i, 255 - i, i // 2), so every index decodes to a distinct color
+PALETTE = np.stack([np.arange(256), 255 - np.arange(256), np.arange(256) // 2], axis=1).astype(np.uint8)
+
+
+def _miptex(name, indices):
+    """A miptex lump holding only its full-size mip level."""
+    height, width = indices.shape
+    header = struct.pack('<16s6I', name.encode('ascii'), width, height, 40, 0, 0, 0)
+    return header + indices.astype(np.uint8).tobytes()
+
+
+def _wad(lumps):
+    """WAD2 bytes for (name, type, data) lumps: header, lump data, then the directory."""
+    body = b''
+    directory = b''
+    for name, lump_type, data in lumps:
+        directory += struct.pack('<iiiBBH16s', 12 + len(body), len(data), len(data), lump_type, 0, 0,
+                                 name.encode('ascii'))
+        body += data
+    return wad2.WAD2_MAGIC + struct.pack('<ii', len(lumps), 12 + len(body)) + body + directory
+
+
+def _read_png(data):
+    """Decodes the 8-bit RGB/RGBA PNGs encode_png writes, checking the signature and every chunk CRC."""
+    assert data[:8] == b'\x89PNG\r\n\x1a\n'
+    position = 8
+    chunks = {}
+    while position < len(data):
+        (length,) = struct.unpack_from('>I', data, position)
+        chunk_type = data[position + 4:position + 8]
+        chunk = data[position + 8:position + 8 + length]
+        (crc,) = struct.unpack_from('>I', data, position + 8 + length)
+        assert crc == zlib.crc32(chunk_type + chunk)
+        chunks[chunk_type] = chunk
+        position += 12 + length
+    width, height, depth, color_type = struct.unpack('>IIBB', chunks[b'IHDR'][:10])
+    assert depth == 8 and b'IEND' in chunks
+    channels = 4 if color_type == 6 else 3
+    rows = np.frombuffer(zlib.decompress(chunks[b'IDAT']), dtype=np.uint8).reshape(height, 1 + width * channels)
+    assert not rows[:, 0].any()  # No row filters
+    return rows[:, 1:].reshape(height, width, channels)
+
+
+@pytest.fixture
+def wad_filepath(tmp_path):
+    indices = np.array([[0, 1, 2, 3], [4, 255, 255, 7]])
+    lumps = [("palette", wad2.LUMP_TYPE_PALETTE, PALETTE.tobytes()),
+             ("Brick1", wad2.LUMP_TYPE_MIPTEX, _miptex("brick1", indices)),
+             ("{grate", wad2.LUMP_TYPE_MIPTEX, _miptex("{grate", indices)),
+             ("brick1", wad2.LUMP_TYPE_MIPTEX, _miptex("brick1", np.zeros((2, 4))))]  # Shadowed by the first
+    filepath = tmp_path / "test.wad"
+    filepath.write_bytes(_wad(lumps))
+    return str(filepath)
+
+
+def test_lump_lookup(wad_filepath):
+    with wad2.WadFile(wad_filepath) as wad_file:
+        assert sorted(wad_file.lumps) == ['brick1', 'palette', '{grate']
+        assert wad_file.has_miptex('BRICK1') and not wad_file.has_miptex('palette')
+        assert wad_file.lump('missing') is None
+        lump = wad_file.lump('brick1')
+        # The first lump of a name wins
+        assert bytes(lump[40:48]) == bytes([0, 1, 2, 3, 4, 255, 255, 7])
+        lump.release()
+        assert np.array_equal(wad2.find_palette([wad_file]), PALETTE)
+
+
+def test_not_a_wad(tmp_path):
+    filepath = tmp_path / "bad.wad"
+    filepath.write_bytes(b"PACK" + bytes(20))
+    with pytest.raises(wad2.WadError):
+        wad2.WadFile(str(filepath))
+
+
+def test_decode_miptex(wad_filepath):
+    with wad2.WadFile(wad_filepath) as wad_file:
+        lump = wad_file.lump('brick1')
+        image = wad2.decode_miptex(lump, PALETTE)
+        assert image.shape == (2, 4, 3)
+        assert image[0, 1].tolist() == [1, 254, 0]
+        assert image[1, 1].tolist() == PALETTE[255].tolist()
+        rgba = wad2.decode_miptex(lump, PALETTE, transparent=True)
+        assert rgba.shape == (2, 4, 4)
+        assert rgba[..., 3].tolist() == [[255, 255, 255, 255], [255, 0, 0, 255]]
+        assert np.array_equal(rgba[..., :3], image)
+        lump.release()
+        with pytest.raises(wad2.WadError):
+            wad2.decode_miptex(bytes(20), PALETTE)
+
+
+@pytest.mark.parametrize('channels', [3, 4])
+def test_png_round_trip(channels):
+    image = np.random.default_rng(channels).integers(0, 256, size=(5, 7, channels), dtype=np.uint8)
+    assert np.array_equal(_read_png(wad2.encode_png(image)), image)
+
+
+def test_extract_textures(wad_filepath, tmp_path):
+    output_folder = tmp_path / "textures"
+    summary = wad2.extract_textures([wad_filepath], ["BRICK1", "{GRATE", "nothere"], str(output_folder), workers=1)
+    assert summary['extracted'] == ['brick1', '{grate'] and summary['missing'] == ['nothere']
+    grate = _read_png((output_folder / "{grate.png").read_bytes())
+    assert grate[..., 3].tolist() == [[255, 255, 255, 255], [255, 0, 0, 255]]
+    assert _read_png((output_folder / "brick1.png").read_bytes()).shape == (2, 4, 3)
+    # Unchanged lumps are not written again
+    summary = wad2.extract_textures([wad_filepath], ["brick1", "{grate"], str(output_folder), workers=1)
+    assert summary['reused'] == ['brick1', '{grate'] and summary['extracted'] == []
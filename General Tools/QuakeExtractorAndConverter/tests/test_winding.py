@@ -0,0 +1,49 @@
+import io
+import os
+import contextlib
+
+import numpy as np
+
+from conftest import TOOL_DIR
+from vmapconverter import parse_quake_map
+from winding import build_windings
+
+
+def _box(mins, maxs):
+    """Plane points of an axis-aligned box brush in Quake order (normals pointing out)."""
+    (x0, y0, z0), (x1, y1, z1) = mins, maxs
+    return [
+        (x0, y0, z0, x0, y1, z0, x0, y0, z1),  # -x
+        (x1, y0, z0, x1, y0, z1, x1, y1, z0),  # +x
+        (x0, y0, z0, x0, y0, z1, x1, y0, z0),  # -y
+        (x0, y1, z0, x1, y1, z0, x0, y1, z1),  # +y
+        (x0, y0, z0, x1, y0, z0, x0, y1, z0),  # -z
+        (x0, y0, z1, x0, y1, z1, x1, y0, z1),  # +z
+    ]
+
+
+def test_box_is_closed():
+    faces = _box((0, 0, 0), (64, 32, 16))
+    windings = build_windings(np.array(faces, dtype=np.float64).ravel(), [0, 6])
+    assert windings.valid.tolist() == [True]
+    assert windings.dropped == [] and windings.duplicates == []
+    assert windings.mins[0].tolist() == [0, 0, 0] and windings.maxs[0].tolist() == [64, 32, 16]
+
+
+def test_duplicate_plane_is_kept_once_and_reported():
+    faces = _box((0, 0, 0), (64, 64, 64))
+    # The same +z plane again, through other points on it
+    faces.append((8, 8, 64, 8, 16, 64, 16, 8, 64))
+    windings = build_windings(np.array(faces, dtype=np.float64).ravel(), [0, 7])
+    assert windings.valid.tolist() == [True]
+    assert windings.duplicates == [(0, 6, 5)]
+    assert len(windings.face_polygon(5)) == 4
+    assert len(windings.face_polygon(6)) == 0
+
+
+def test_e1m4_duplicate_faces():
+    with contextlib.redirect_stdout(io.StringIO()):
+        brushes = parse_quake_map(os.path.join(TOOL_DIR, "quake_maps_input", "E1M4.MAP"))
+    windings = build_windings(brushes.planes, brushes.brush_offsets)
+    assert windings.duplicates == [(1, 12, 7), (11, 72, 67)]
+    assert windings.valid[1] and windings.valid[11]
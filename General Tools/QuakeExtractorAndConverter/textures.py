@@ -0,0 +1,132 @@
+"""
+Index of texture image sizes, read from the image file headers only and cached on disk.
+UV coordinates in Source 2 are normalized by the texture size, so every converted face needs the
+width and height of its texture; opening tens of thousands of images for that is what this avoids.
+"""
+import os
+import json
+import struct
+
+# Bump whenever the cache layout or the header readers change.
+TEXTURE_INDEX_VERSION = 1
+
+# Written into the indexed folder; entries are reused while an image's size and mtime are unchanged.
+TEXTURE_INDEX_FILENAME = ".texture_sizes.json"
+
+# When a texture exists in several formats, the first extension listed wins.
+IMAGE_EXTENSIONS = (".png", ".tga", ".jpg", ".jpeg", ".bmp")
+
+_PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+# JPEG start-of-frame markers carry the image size; C4, C8 and CC are other segments
+_JPEG_SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+def _read_jpeg_size(f):
+    f.seek(2)
+    while True:
+        marker = f.read(2)
+        if len(marker) < 2 or marker[0] != 0xFF:
+            return None
+        if marker[1] in (0xD8, 0x01) or 0xD0 <= marker[1] <= 0xD7:
+            continue  # Markers without a length
+        length_bytes = f.read(2)
+        if len(length_bytes) < 2:
+            return None
+        length = struct.unpack('>H', length_bytes)[0]
+        if marker[1] in _JPEG_SOF_MARKERS:
+            data = f.read(5)
+            if len(data) < 5:
+                return None
+            height, width = struct.unpack('>xHH', data)
+            return width, height
+        f.seek(length - 2, os.SEEK_CUR)
+
+
+def read_image_size(image_filepath):
+    """
+    Returns (width, height) of a PNG, TGA, JPEG or BMP image by reading its header, or None when
+    the file is not one of those or is truncated.
+    """
+    extension = os.path.splitext(image_filepath)[1].lower()
+    with open(image_filepath, 'rb') as f:
+        header = f.read(26)
+        if header[:8] == _PNG_SIGNATURE and header[12:16] == b'IHDR':
+            return struct.unpack('>II', header[16:24])
+        if header[:2] == b'\xff\xd8':
+            return _read_jpeg_size(f)
+        if header[:2] == b'BM' and len(header) >= 26:
+            width, height = struct.unpack('<ii', header[18:26])
+            return width, abs(height)  # Negative height means top-down rows
+        if extension == ".tga" and len(header) >= 18:
+            return struct.unpack('<HH', header[12:16])
+    return None
+
+
+def texture_name_for_file(filename):
+    """Texture name an image file stands for: the lowercase stem, with '#' back to '*' (see wad2.texture_filename)."""
+    return os.path.splitext(filename)[0].lower().replace('#', '*')
+
+
+class TextureSizeIndex:
+    """
+    Maps texture names to (width, height) for the images in a folder (not its subfolders).
+    Only images that are new or changed since the cached index was written get their header read;
+    the updated index is saved back to the folder.
+    """
+    def __init__(self, folder, cache_filepath=None):
+        self.folder = folder
+        self.cache_filepath = cache_filepath or os.path.join(folder, TEXTURE_INDEX_FILENAME)
+        self.headers_read = 0
+        cached = {}
+        try:
+            with open(self.cache_filepath, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == TEXTURE_INDEX_VERSION:
+                cached = data.get('images', {})
+        except (OSError, ValueError):
+            pass  # No index yet, or unreadable: read every header
+
+        images = {}
+        try:
+            entries = list(os.scandir(folder))
+        except OSError:
+            entries = []
+        for entry in entries:
+            if not entry.name.lower().endswith(IMAGE_EXTENSIONS) or not entry.is_file():
+                continue
+            stat = entry.stat()
+            record = cached.get(entry.name)
+            if record is None or record[:2] != [stat.st_size, stat.st_mtime_ns]:
+                try:
+                    size = read_image_size(entry.path)
+                except OSError:
+                    size = None
+                self.headers_read += 1
+                record = [stat.st_size, stat.st_mtime_ns] + (list(size) if size else [0, 0])
+            images[entry.name] = record
+
+        self.sizes = {}
+        priority = {extension: rank for rank, extension in enumerate(IMAGE_EXTENSIONS)}
+        for filename in sorted(images, key=lambda name: priority[os.path.splitext(name)[1].lower()]):
+            width, height = images[filename][2:4]
+            if width and height:
+                self.sizes.setdefault(texture_name_for_file(filename), (width, height))
+
+        if self.headers_read or len(images) != len(cached):
+            try:
+                temp_filepath = self.cache_filepath + ".tmp"
+                with open(temp_filepath, 'w', encoding='utf-8') as f:
+                    json.dump({'version': TEXTURE_INDEX_VERSION, 'images': images}, f, indent=1, sort_keys=True)
+                os.replace(temp_filepath, self.cache_filepath)
+            except OSError:
+                pass  # Read-only folder: the index just isn't cached
+
+    def __len__(self):
+        return len(self.sizes)
+
+    def __contains__(self, texture_name):
+        return texture_name.lower() in self.sizes
+
+    def get(self, texture_name, default=None):
+        """Returns (width, height) of a texture, or default if the folder has no image for it."""
+        return self.sizes.get(texture_name.lower(), default)
@@ -0,0 +1,687 @@
+"""
+Writes Source 2 .vmap files (KeyValues2 text DMX) straight from brush polygons, so maps can go
+to resourcecompiler without the Source 1 VMF import step.
+Every brush becomes a CMapMesh holding a CDmePolygonMesh: a half-edge mesh of its convex face
+polygons, with the texture axes of every face so Hammer keeps the Quake texture alignment.
+Elements are held as Element objects whose attribute values are already encoded as KeyValues2
+text, so writing is a plain walk over the tree and a file read back with read_keyvalues2 compares
+equal to what was written. validate_vmap_elements checks a tree against VMAP_SCHEMA, the element
+layout this module writes, and the half-edge structure of every mesh against itself.
+Only what Hammer cannot derive is written: inline elements get no explicit id, faces no per-vertex
+normals or tangents, and arrays sit on one line each. Even so a .vmap is about 2.5 times the size of
+the VMF for the same map and takes longer to write, so this is an alternative to the VMF import,
+not a faster one.
+Works on plain arrays like winding.py; the caller transforms the polygons to Source space.
+"""
+import re
+
+import numpy as np
+
+# Version numbers written to the DMX header.
+KEYVALUES2_ENCODING_VERSION = 4
+VMAP_FORMAT_VERSION = 29
+
+# Texture size assumed for textures without a known image, for the texture coordinates.
+DEFAULT_TEXTURE_SIZE = (64, 64)
+
+# Vertices of a brush closer than 1 / VERTEX_SNAP on every axis are welded into one.
+VERTEX_SNAP = 64.0
+
+# Attribute layout of every element type written, name -> KeyValues2 type. Types that name an
+# element class hold that element inline. EditGameClassProps also takes any extra string key-values.
+_NODE = {'origin': 'vector3', 'angles': 'qangle', 'scales': 'vector3', 'nodeID': 'int', 'referenceID': 'uint64',
+         'children': 'element_array', 'editorOnly': 'bool', 'force_hidden': 'bool', 'transformLocked': 'bool',
+         'variableTargetKeys': 'string_array', 'variableNames': 'string_array'}
+_STREAM = {'name': 'string', 'standardAttributeName': 'string', 'semanticName': 'string', 'semanticIndex': 'int',
+           'vertexBufferLocation': 'int', 'dataStateFlags': 'int', 'subdivisionBinding': 'element'}
+VMAP_SCHEMA = {
+    '$prefix_element$': {'map_asset_references': 'string_array'},
+    'CMapRootElement': {'isprefab': 'bool', 'editorbuild': 'int', 'editorversion': 'int', 'showgrid': 'bool',
+                        'snaptogrid': 'bool', 'gridspacing': 'float', 'show3dgrid': 'bool', 'itemFile': 'string',
+                        'defaultcamera': 'CStoredCamera', '3dcameras': 'CStoredCameras', 'world': 'CMapWorld',
+                        'm_ReferencedMeshSnapshots': 'element_array', 'm_bIsCordoning': 'bool',
+                        'm_bCordonsVisible': 'bool', 'nodeInstanceData': 'element_array'},
+    'CStoredCamera': {'position': 'vector3', 'lookat': 'vector3'},
+    'CStoredCameras': {'activecamera': 'int', 'cameras': 'element_array'},
+    'CMapWorld': dict(_NODE, relayPlugData='DmePlugList', connectionsData='element_array',
+                      entity_properties='EditGameClassProps', nextDecalID='int', fixupEntityNames='bool',
+                      mapUsageType='string'),
+    'CMapEntity': dict(_NODE, relayPlugData='DmePlugList', connectionsData='element_array',
+                       entity_properties='EditGameClassProps', hitNormal='vector3', isProceduralEntity='bool'),
+    'DmePlugList': {'names': 'string_array', 'dataTypes': 'int_array', 'plugTypes': 'int_array',
+                    'descriptions': 'string_array'},
+    'DmeConnectionData': {'outputName': 'string', 'targetType': 'int', 'targetName': 'string', 'inputName': 'string',
+                          'overrideParam': 'string', 'delay': 'float', 'timesToFire': 'int'},
+    'EditGameClassProps': {'classname': 'string'},
+    'CMapMesh': dict(_NODE, cubeMapName='string', lightGroup='string', visexclude='bool', renderwithdynamic='bool',
+                     disableHeightDisplacement='bool', fademindist='float', fademaxdist='float',
+                     bakelighting='bool', precomputelightprobes='bool', renderToCubemaps='bool',
+                     disableShadows='bool', smoothingAngle='float', tintColor='color', renderAmt='int',
+                     physicsType='string', physicsGroup='string', physicsInteractsAs='string',
+                     physicsInteractsWith='string', physicsInteractsExclude='string', meshData='CDmePolygonMesh',
+                     useAsOccluder='bool', physicsSimplificationOverride='bool', physicsSimplificationError='float'),
+    'CDmePolygonMesh': {'vertexEdgeIndices': 'int_array', 'vertexDataIndices': 'int_array',
+                        'edgeVertexIndices': 'int_array', 'edgeOppositeIndices': 'int_array',
+                        'edgeNextIndices': 'int_array', 'edgeFaceIndices': 'int_array', 'edgeDataIndices': 'int_array',
+                        'edgeVertexDataIndices': 'int_array', 'faceEdgeIndices': 'int_array',
+                        'faceDataIndices': 'int_array', 'materials': 'string_array',
+                        'vertexData': 'CDmePolygonMeshDataArray', 'faceVertexData': 'CDmePolygonMeshDataArray',
+                        'edgeData': 'CDmePolygonMeshDataArray', 'faceData': 'CDmePolygonMeshDataArray'},
+    'CDmePolygonMeshDataArray': {'size': 'int', 'streams': 'element_array'},
+    'CDmePolygonMeshDataStream': _STREAM,
+}
+
+# Streams of each mesh data array: (name, standard/semantic name, data state flags, KeyValues2 type)
+_VERTEX_STREAMS = (('position$0', 'position', 3, 'vector3_array'),)
+# Normals and tangents are left out: every face is planar, so Hammer derives them from the face and its texture axes.
+_FACE_VERTEX_STREAMS = (('texcoord$0', 'texcoord', 1, 'vector2_array'),)
+_EDGE_STREAMS = (('flags$0', 'flags', 3, 'int_array'),)
+_FACE_STREAMS = (('textureScale$0', 'textureScale', 0, 'vector2_array'),
+                 ('textureAxisU$0', 'textureAxisU', 0, 'vector4_array'),
+                 ('textureAxisV$0', 'textureAxisV', 0, 'vector4_array'),
+                 ('materialindex$0', 'materialindex', 8, 'int_array'), ('flags$0', 'flags', 3, 'int_array'))
+
+# Float arrays shorter than this are formatted value by value; sorting out the distinct values costs more.
+_FORMAT_UNIQUE_MIN = 512
+
+_VECTOR_SIZES = {'vector2': 2, 'vector3': 3, 'vector4': 4, 'qangle': 3, 'color': 4}
+
+
+class VmapError(Exception):
+    """Raised for KeyValues2 text that cannot be read."""
+
+
+def _format_float(value):
+    # Adding 0.0 turns -0.0 into 0.0
+    return '%.6g' % (value + 0.0)
+
+
+def _format_floats(values):
+    """'%.6g' text of every value of a float array, formatting each distinct value once. Returns a flat list."""
+    flat = np.ascontiguousarray(values, dtype=np.float64).ravel() + 0.0
+    if flat.size < _FORMAT_UNIQUE_MIN:
+        return ['%.6g' % value for value in flat.tolist()]
+    unique, inverse = np.unique(flat, return_inverse=True)
+    strings = np.array([_format_float(value) for value in unique.tolist()], dtype=object)
+    return strings[inverse.reshape(-1)].tolist()
+
+
+def encode_value(attribute_type, value):
+    """Returns the KeyValues2 text of a value: a string, or a list of strings for array types."""
+    if attribute_type.endswith('_array'):
+        base = attribute_type[:-len('_array')]
+        if base in ('int', 'bool'):
+            return [str(int(item)) for item in np.asarray(value, dtype=np.int64).ravel().tolist()]
+        if base == 'float':
+            return _format_floats(value)
+        if base in _VECTOR_SIZES:
+            size = _VECTOR_SIZES[base]
+            strings = _format_floats(value)
+            return [' '.join(strings[index:index + size]) for index in range(0, len(strings), size)]
+        return [encode_value(base, item) for item in value]
+    if attribute_type == 'bool':
+        return '1' if value else '0'
+    if attribute_type == 'int':
+        return str(int(value))
+    if attribute_type == 'float':
+        return _format_float(value)
+    if attribute_type == 'uint64':
+        return '0x%x' % value
+    if attribute_type == 'color':
+        return ' '.join(str(int(component)) for component in value)
+    if attribute_type in _VECTOR_SIZES:
+        return ' '.join(map(_format_float, value))
+    if attribute_type == 'element':
+        return value.id if isinstance(value, Element) else (value or '')
+    return str(value)
+
+
+class Element:
+    """
+    A DMX element: its type, its elementid (None for an implicit one) and its attributes, a dict of
+    name -> (type, value). Values are stored encoded (see encode_value); inline elements are Element
+    objects and element arrays lists of them.
+    """
+    __slots__ = ('type', 'id', 'attributes')
+
+    def __init__(self, element_type, element_id):
+        self.type = element_type
+        self.id = element_id
+        self.attributes = {}
+
+    def __eq__(self, other):
+        return (isinstance(other, Element) and self.type == other.type and self.id == other.id
+                and self.attributes == other.attributes)
+
+    def __repr__(self):
+        return f"Element({self.type!r}, {self.id!r})"
+
+    def set(self, name, attribute_type, value):
+        """Sets an attribute, encoding plain values; returns the element to allow chaining."""
+        if attribute_type == 'element_array' or (isinstance(value, Element) and attribute_type != 'element'):
+            self.attributes[name] = (attribute_type, value)
+        else:
+            self.attributes[name] = (attribute_type, encode_value(attribute_type, value))
+        return self
+
+    def get(self, name, default=None):
+        """Returns the (encoded) value of an attribute, or default."""
+        return self.attributes[name][1] if name in self.attributes else default
+
+
+class ElementFactory:
+    """
+    Hands out elements and node IDs for map nodes. Nothing in a map refers to an element by id, so
+    only top level elements get an explicit one (unique within the file); the DMX reader makes up
+    ids for the inline elements, which saves a line for each of the tens of thousands of them.
+    """
+    def __init__(self):
+        self.count = 0
+        self.node_count = 0
+
+    def element(self, element_type, explicit_id=False):
+        if not explicit_id:
+            return Element(element_type, None)
+        self.count += 1
+        return Element(element_type, '00000000-0000-4000-8000-%012x' % self.count)
+
+    def node(self, element_type, origin=(0.0, 0.0, 0.0), angles=(0.0, 0.0, 0.0), children=()):
+        """An element with the attributes every map node carries (see _NODE)."""
+        self.node_count += 1
+        element = self.element(element_type)
+        element.set('origin', 'vector3', origin).set('angles', 'qangle', angles).set('scales', 'vector3', (1, 1, 1))
+        element.set('nodeID', 'int', self.node_count).set('referenceID', 'uint64', self.node_count)
+        element.set('children', 'element_array', list(children))
+        for name in ('editorOnly', 'force_hidden', 'transformLocked'):
+            element.set(name, 'bool', False)
+        element.set('variableTargetKeys', 'string_array', []).set('variableNames', 'string_array', [])
+        return element
+
+    def plug_list(self):
+        element = self.element('DmePlugList')
+        element.set('names', 'string_array', []).set('dataTypes', 'int_array', [])
+        return element.set('plugTypes', 'int_array', []).set('descriptions', 'string_array', [])
+
+    def data_array(self, size, streams, values):
+        """A CDmePolygonMeshDataArray of size items with one stream per (spec, data) pair."""
+        array_element = self.element('CDmePolygonMeshDataArray').set('size', 'int', size)
+        stream_elements = []
+        for (name, semantic, flags, data_type), data in zip(streams, values):
+            stream = self.element('CDmePolygonMeshDataStream')
+            stream.set('name', 'string', name).set('standardAttributeName', 'string', semantic)
+            stream.set('semanticName', 'string', semantic).set('semanticIndex', 'int', 0)
+            stream.set('vertexBufferLocation', 'int', 0).set('dataStateFlags', 'int', flags)
+            stream.set('subdivisionBinding', 'element', '').set('data', data_type, data)
+            stream_elements.append(stream)
+        return array_element.set('streams', 'element_array', stream_elements)
+
+
+def build_polygon_mesh(factory, polygons, face_materials, materials, texture_axes, texture_scales, texture_sizes):
+    """
+    Builds the CDmePolygonMesh of one convex brush.
+    polygons lists the (n, 3) Source space vertices of every face, counter-clockwise seen from
+    outside; face_materials indexes materials (the material paths of this mesh), texture_axes is
+    (faces, 2, 4) [x, y, z, shift] per u and v axis, texture_scales (faces, 2) and texture_sizes
+    (faces, 2) width and height in texels.
+    Returns the mesh element, or raises ValueError if the faces do not close up into a solid.
+    """
+    points = np.concatenate(polygons)
+    vertex_of_key = {}
+    first = []
+    vertex_of_point = []
+    for index, key in enumerate(map(tuple, np.round(points * VERTEX_SNAP).astype(np.int64).tolist())):
+        vertex = vertex_of_key.get(key)
+        if vertex is None:
+            vertex = vertex_of_key[key] = len(first)
+            first.append(index)
+        vertex_of_point.append(vertex)
+    positions = points[first]
+
+    loops = []
+    start = 0
+    for polygon in polygons:
+        loop = vertex_of_point[start:start + len(polygon)]
+        start += len(polygon)
+        loop = [vertex for index, vertex in enumerate(loop) if vertex != loop[index - 1]]  # Welded neighbours
+        loops.append(loop)
+    faces = [face for face, loop in enumerate(loops) if len(loop) >= 3]
+    if len(faces) < 4:
+        raise ValueError(f"only {len(faces)} faces left after welding vertices")
+
+    edge_vertices = []  # Destination vertex of every half-edge
+    edge_next = []
+    edge_faces = []
+    face_edges = []
+    half_edges = {}
+    vertex_edges = [-1] * len(positions)
+    for face_number, face in enumerate(faces):
+        loop = loops[face]
+        first_edge = len(edge_vertices)
+        face_edges.append(first_edge)
+        for index, vertex in enumerate(loop):
+            following = loop[(index + 1) % len(loop)]
+            edge = first_edge + index
+            if (vertex, following) in half_edges:
+                raise ValueError("two faces share an edge in the same direction")
+            half_edges[vertex, following] = edge
+            if vertex_edges[vertex] < 0:
+                vertex_edges[vertex] = edge
+            edge_vertices.append(following)
+            edge_next.append(first_edge + (index + 1) % len(loop))
+            edge_faces.append(face_number)
+    edge_opposites = []
+    edge_data = []
+    edge_count = 0
+    for vertex, following in half_edges:  # In half-edge order, as they were added
+        opposite = half_edges.get((following, vertex))
+        if opposite is None:
+            raise ValueError("the faces do not close up (an edge has no opposite)")
+        edge_opposites.append(opposite)
+    edge_ids = {}
+    for edge, opposite in enumerate(edge_opposites):
+        key = min(edge, opposite)
+        if key not in edge_ids:
+            edge_ids[key] = edge_count
+            edge_count += 1
+        edge_data.append(edge_ids[key])
+    if min(vertex_edges) < 0:
+        raise ValueError("a vertex is not used by any face")
+
+    half_edge_count = len(edge_vertices)
+    faces = np.array(faces)
+    corner_points = positions[np.array(edge_vertices)]
+    axes = np.asarray(texture_axes, dtype=np.float64)[faces]
+    scales = np.asarray(texture_scales, dtype=np.float64)[faces]
+    sizes = np.asarray(texture_sizes, dtype=np.float64)[faces]
+    edge_axes = axes[np.array(edge_faces)]
+    texcoords = ((np.einsum('ij,ikj->ik', corner_points, edge_axes[:, :, :3]) / scales[edge_faces] + edge_axes[:, :, 3])
+                 / sizes[edge_faces])
+
+    mesh = factory.element('CDmePolygonMesh')
+    mesh.set('vertexEdgeIndices', 'int_array', vertex_edges)
+    mesh.set('vertexDataIndices', 'int_array', np.arange(len(positions)))
+    mesh.set('edgeVertexIndices', 'int_array', edge_vertices)
+    mesh.set('edgeOppositeIndices', 'int_array', edge_opposites)
+    mesh.set('edgeNextIndices', 'int_array', edge_next)
+    mesh.set('edgeFaceIndices', 'int_array', edge_faces)
+    mesh.set('edgeDataIndices', 'int_array', edge_data)
+    mesh.set('edgeVertexDataIndices', 'int_array', np.arange(half_edge_count))
+    mesh.set('faceEdgeIndices', 'int_array', face_edges)
+    mesh.set('faceDataIndices', 'int_array', np.arange(len(faces)))
+    mesh.set('materials', 'string_array', materials)
+    mesh.set('vertexData', 'CDmePolygonMeshDataArray',
+             factory.data_array(len(positions), _VERTEX_STREAMS, [positions]))
+    mesh.set('faceVertexData', 'CDmePolygonMeshDataArray',
+             factory.data_array(half_edge_count, _FACE_VERTEX_STREAMS, [texcoords]))
+    mesh.set('edgeData', 'CDmePolygonMeshDataArray',
+             factory.data_array(edge_count, _EDGE_STREAMS, [np.zeros(edge_count, dtype=np.int64)]))
+    zeros = np.zeros(len(faces), dtype=np.int64)
+    mesh.set('faceData', 'CDmePolygonMeshDataArray',
+             factory.data_array(len(faces), _FACE_STREAMS,
+                                [scales, axes[:, 0], axes[:, 1], np.asarray(face_materials)[faces], zeros]))
+    return mesh
+
+
+def build_brush_meshes(factory, vertices, vertex_offsets, brush_offsets, brush_indices, face_materials, materials,
+                       texture_axes, texture_scales, texture_sizes, reverse=False):
+    """
+    Builds a CMapMesh for each of brush_indices from flat face polygons (see winding.BrushWindings):
+    face i has vertices[vertex_offsets[i]:vertex_offsets[i + 1]] in Source space and brush b owns
+    faces brush_offsets[b] up to brush_offsets[b + 1]. face_materials indexes materials; the texture
+    arrays hold one row per face (see build_polygon_mesh). Polygons come in clockwise order, as qbsp
+    clips them, and are reversed for the mesh; with reverse=True (a mirroring transform) they are kept.
+    Returns (meshes, skipped): skipped lists (brush_index, reason) for brushes that give no valid mesh.
+    """
+    meshes = []
+    skipped = []
+    for brush_index in brush_indices:
+        faces = [face for face in range(brush_offsets[brush_index], brush_offsets[brush_index + 1])
+                 if vertex_offsets[face + 1] - vertex_offsets[face] >= 3]
+        polygons = [vertices[vertex_offsets[face]:vertex_offsets[face + 1]] for face in faces]
+        if not reverse:
+            polygons = [polygon[::-1] for polygon in polygons]
+        used, local_materials = np.unique(np.asarray(face_materials)[faces], return_inverse=True) if faces \
+            else (np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp))
+        try:
+            if len(faces) < 4:
+                raise ValueError(f"only {len(faces)} faces have an area")
+            mesh_data = build_polygon_mesh(factory, polygons, local_materials.reshape(-1),
+                                           [materials[material] for material in used.tolist()],
+                                           np.asarray(texture_axes)[faces], np.asarray(texture_scales)[faces],
+                                           np.asarray(texture_sizes)[faces])
+        except ValueError as e:
+            skipped.append((int(brush_index), str(e)))
+            continue
+        mesh = factory.node('CMapMesh')
+        for name in ('cubeMapName', 'lightGroup'):
+            mesh.set(name, 'string', '')
+        for name, value in (('visexclude', False), ('renderwithdynamic', False), ('disableHeightDisplacement', False),
+                            ('bakelighting', True), ('precomputelightprobes', True), ('renderToCubemaps', True),
+                            ('disableShadows', False)):
+            mesh.set(name, 'bool', value)
+        mesh.set('fademindist', 'float', -1).set('fademaxdist', 'float', 0).set('smoothingAngle', 'float', 40)
+        mesh.set('tintColor', 'color', (255, 255, 255, 255)).set('renderAmt', 'int', 255)
+        mesh.set('physicsType', 'string', 'default')
+        for name in ('physicsGroup', 'physicsInteractsAs', 'physicsInteractsWith', 'physicsInteractsExclude'):
+            mesh.set(name, 'string', '')
+        mesh.set('meshData', 'CDmePolygonMesh', mesh_data)
+        mesh.set('useAsOccluder', 'bool', False).set('physicsSimplificationOverride', 'bool', False)
+        mesh.set('physicsSimplificationError', 'float', 0)
+        meshes.append(mesh)
+    return meshes, skipped
+
+
+def _parse_vector(text, size=3):
+    """Numbers of a space separated key-value, or zeros if it does not hold size numbers."""
+    try:
+        values = [float(part) for part in text.split()]
+    except ValueError:
+        values = []
+    return values if len(values) == size else [0.0] * size
+
+
+def build_map_elements(factory, world_meshes, entities=(), prefab=False):
+    """
+    Assembles a whole map: returns the top level elements of the file, the $prefix_element$ and
+    the CMapRootElement. entities holds dicts with the 'classname', 'keyvalues' and 'connections'
+    of an entity (see entities.convert_entity) and 'meshes', the CMapMesh elements of its brushes.
+    """
+    prefix = factory.element('$prefix_element$', explicit_id=True).set('map_asset_references', 'string_array', [])
+    entity_nodes = []
+    for entity in entities:
+        keyvalues = entity['keyvalues']
+        node = factory.node('CMapEntity', _parse_vector(keyvalues.get('origin', '')),
+                            _parse_vector(keyvalues.get('angles', '')), entity['meshes'])
+        node.set('relayPlugData', 'DmePlugList', factory.plug_list())
+        connections = []
+        for output, value in entity['connections']:
+            target, input_name, parameter, delay, times = (value.split(',') + [''] * 5)[:5]
+            connection = factory.element('DmeConnectionData')
+            connection.set('outputName', 'string', output).set('targetType', 'int', 7)
+            connection.set('targetName', 'string', target).set('inputName', 'string', input_name)
+            connection.set('overrideParam', 'string', parameter).set('delay', 'float', float(delay or 0))
+            connections.append(connection.set('timesToFire', 'int', int(times or -1)))
+        node.set('connectionsData', 'element_array', connections)
+        properties = factory.element('EditGameClassProps').set('classname', 'string', entity['classname'])
+        for key, value in keyvalues.items():
+            properties.set(key, 'string', value)
+        node.set('entity_properties', 'EditGameClassProps', properties)
+        node.set('hitNormal', 'vector3', (0, 0, 1)).set('isProceduralEntity', 'bool', False)
+        entity_nodes.append(node)
+
+    world = factory.node('CMapWorld', children=list(world_meshes) + entity_nodes)
+    world.set('relayPlugData', 'DmePlugList', factory.plug_list()).set('connectionsData', 'element_array', [])
+    world.set('entity_properties', 'EditGameClassProps',
+              factory.element('EditGameClassProps').set('classname', 'string', 'worldspawn'))
+    world.set('nextDecalID', 'int', 0).set('fixupEntityNames', 'bool', True).set('mapUsageType', 'string', 'standard')
+
+    root = factory.element('CMapRootElement', explicit_id=True)
+    root.set('isprefab', 'bool', prefab).set('editorbuild', 'int', 8600).set('editorversion', 'int', 400)
+    root.set('showgrid', 'bool', True).set('snaptogrid', 'bool', True).set('gridspacing', 'float', 64)
+    root.set('show3dgrid', 'bool', True).set('itemFile', 'string', '')
+    camera = factory.element('CStoredCamera').set('position', 'vector3', (0, -1000, 1000))
+    root.set('defaultcamera', 'CStoredCamera', camera.set('lookat', 'vector3', (0, 0, 0)))
+    cameras = factory.element('CStoredCameras').set('activecamera', 'int', -1).set('cameras', 'element_array', [])
+    root.set('3dcameras', 'CStoredCameras', cameras).set('world', 'CMapWorld', world)
+    root.set('m_ReferencedMeshSnapshots', 'element_array', []).set('m_bIsCordoning', 'bool', False)
+    root.set('m_bCordonsVisible', 'bool', False).set('nodeInstanceData', 'element_array', [])
+    return [prefix, root]
+
+
+def _escape(text):
+    if '"' not in text and '\\' not in text:
+        return text
+    return text.replace('\\', '\\\\').replace('"', '\\"')
+
+
+def _element_body(element, indent, out):
+    """Appends the braces block of an element, one string per line, to out."""
+    tabs = '\t' * indent
+    out.append(f'{tabs}{{\n' if element.id is None else f'{tabs}{{\n{tabs}\t"id" "elementid" "{element.id}"\n')
+    for name, (attribute_type, value) in element.attributes.items():
+        if isinstance(value, Element):
+            out.append(f'{tabs}\t"{name}" "{attribute_type}"\n')
+            _element_body(value, indent + 1, out)
+        elif attribute_type == 'element_array':
+            out.append(f'{tabs}\t"{name}" "{attribute_type}"\n{tabs}\t[\n')
+            for index, child in enumerate(value):
+                out.append(f'{tabs}\t\t"{child.type}"\n')
+                _element_body(child, indent + 2, out)
+                if index < len(value) - 1:
+                    out[-1] = out[-1][:-1] + ',\n'
+            out.append(f'{tabs}\t]\n')
+        elif isinstance(value, list):
+            # All items on one line: the format does not care, and deep in a mesh the indentation
+            # of one item per line made up most of the file
+            joined = '", "'.join(value)
+            if '"' in joined or '\\' in joined:
+                joined = '", "'.join(map(_escape, value))
+            items = f' "{joined}" ' if value else ' '
+            out.append(f'{tabs}\t"{name}" "{attribute_type}" [{items}]\n')
+        else:
+            out.append(f'{tabs}\t"{name}" "{attribute_type}" "{_escape(value)}"\n')
+    out.append(f'{tabs}}}\n')
+
+
+def write_keyvalues2(elements, f, format_name='vmap', format_version=VMAP_FORMAT_VERSION):
+    """Writes top level elements to the text file f as KeyValues2 DMX. Returns the number of characters written."""
+    written = f.write(f'<!-- dmx encoding keyvalues2 {KEYVALUES2_ENCODING_VERSION} '
+                      f'format {format_name} {format_version} -->\n')
+    for element in elements:
+        out = [f'"{element.type}"\n']
+        _element_body(element, 0, out)
+        written += f.write(''.join(out))
+    return written
+
+
+_SKIP_RE = re.compile(r'(?:\s+|<!--.*?-->|//[^\n]*)*', re.S)
+_STRING_RE = re.compile(r'"((?:[^"\\]|\\.)*)"', re.S)
+# A whole array of strings, matched at once: the items are pulled out of it with _STRING_RE
+_STRING_ARRAY_RE = re.compile(r'\[\s*(?:"(?:[^"\\]|\\.)*"(?:\s*,\s*"(?:[^"\\]|\\.)*")*\s*)?\]', re.S)
+# Name, type and, for a plain value, the value of an attribute, matched at once
+_ATTRIBUTE_RE = re.compile(r'"((?:[^"\\]|\\.)*)"\s*"((?:[^"\\]|\\.)*)"(?:\s*"((?:[^"\\]|\\.)*)")?', re.S)
+_UNESCAPE_RE = re.compile(r'\\(.)', re.S)
+
+
+def _unescape(string):
+    return _UNESCAPE_RE.sub(r'\1', string) if '\\' in string else string
+
+
+def read_keyvalues2(text):
+    """Parses KeyValues2 DMX text into its list of top level Elements. Raises VmapError on malformed text."""
+    position = 0
+
+    def peek():
+        nonlocal position
+        position = _SKIP_RE.match(text, position).end()
+        return text[position:position + 1]
+
+    def fail(expected):
+        found = repr(text[position]) if position < len(text) else 'end of file'
+        raise VmapError(f"expected {expected} but found {found} at offset {position}")
+
+    def take(punctuation):
+        nonlocal position
+        if peek() != punctuation:
+            fail(punctuation)
+        position += 1
+
+    def take_string():
+        nonlocal position
+        peek()
+        match = _STRING_RE.match(text, position)
+        if match is None:
+            fail('a string')
+        position = match.end()
+        return _unescape(match.group(1))
+
+    def element_body(element_type):
+        nonlocal position
+        element = Element(element_type, None)
+        take('{')
+        while peek() not in ('}', ''):
+            match = _ATTRIBUTE_RE.match(text, position)
+            if match is None:
+                fail('an attribute')
+            position = match.end()
+            name, attribute_type, value = match.groups()
+            name, attribute_type = _unescape(name), _unescape(attribute_type)
+            if value is not None:
+                value = _unescape(value)
+                if name == 'id' and attribute_type == 'elementid':
+                    element.id = value
+                else:
+                    element.attributes[name] = (attribute_type, value)
+            elif peek() == '{':
+                element.attributes[name] = (attribute_type, element_body(attribute_type))
+            elif attribute_type == 'element_array':
+                take('[')
+                items = []
+                while peek() not in (']', ''):
+                    if items:
+                        take(',')
+                    items.append(element_body(take_string()))
+                take(']')
+                element.attributes[name] = (attribute_type, items)
+            elif attribute_type.endswith('_array'):
+                peek()
+                match = _STRING_ARRAY_RE.match(text, position)
+                if match is None:
+                    fail('an array of strings')
+                position = match.end()
+                element.attributes[name] = (attribute_type, [_unescape(item) for item in _STRING_RE.findall(match.group())])
+            else:
+                fail('a value')
+        take('}')
+        return element
+
+    elements = []
+    while peek():
+        elements.append(element_body(take_string()))
+    return elements
+
+
+def _int_array(element, name):
+    return np.array([int(value) for value in element.get(name, [])], dtype=np.int64)
+
+
+def _check_polygon_mesh(mesh, where):
+    """Returns the errors in the half-edge structure and data arrays of a CDmePolygonMesh."""
+    errors = []
+    vertex_edges = _int_array(mesh, 'vertexEdgeIndices')
+    edge_vertices = _int_array(mesh, 'edgeVertexIndices')
+    opposites = _int_array(mesh, 'edgeOppositeIndices')
+    following = _int_array(mesh, 'edgeNextIndices')
+    edge_faces = _int_array(mesh, 'edgeFaceIndices')
+    face_edges = _int_array(mesh, 'faceEdgeIndices')
+    vertex_count, edge_count, face_count = len(vertex_edges), len(edge_vertices), len(face_edges)
+    for name, size in (('vertexDataIndices', vertex_count), ('edgeOppositeIndices', edge_count),
+                       ('edgeNextIndices', edge_count), ('edgeFaceIndices', edge_count),
+                       ('edgeDataIndices', edge_count), ('edgeVertexDataIndices', edge_count),
+                       ('faceDataIndices', face_count)):
+        if len(_int_array(mesh, name)) != size:
+            errors.append(f"{where}: {name} has {len(_int_array(mesh, name))} entries, expected {size}")
+    for array, limit, name in ((vertex_edges, edge_count, 'vertexEdgeIndices'),
+                               (edge_vertices, vertex_count, 'edgeVertexIndices'),
+                               (opposites, edge_count, 'edgeOppositeIndices'),
+                               (following, edge_count, 'edgeNextIndices'), (edge_faces, face_count, 'edgeFaceIndices'),
+                               (face_edges, edge_count, 'faceEdgeIndices')):
+        if len(array) and (array.min() < 0 or array.max() >= limit):
+            errors.append(f"{where}: {name} out of range")
+    if errors:
+        return errors
+
+    edges = np.arange(edge_count)
+    previous = np.empty(edge_count, dtype=np.int64)
+    previous[following] = edges
+    origins = edge_vertices[previous]
+    if np.any(opposites[opposites] != edges) or np.any(opposites == edges):
+        errors.append(f"{where}: edgeOppositeIndices do not pair up the half-edges")
+    elif np.any(edge_vertices[opposites] != origins):
+        errors.append(f"{where}: opposite half-edges do not run between the same vertices")
+    if len(np.unique(following)) != edge_count or np.any(edge_faces[following] != edge_faces):
+        errors.append(f"{where}: edgeNextIndices do not form one loop per face")
+    if np.any(edge_faces[face_edges] != np.arange(face_count)):
+        errors.append(f"{where}: faceEdgeIndices point at half-edges of other faces")
+    if np.any(origins[vertex_edges] != np.arange(vertex_count)):
+        errors.append(f"{where}: vertexEdgeIndices point at half-edges leaving other vertices")
+    if vertex_count - edge_count // 2 + face_count != 2:
+        errors.append(f"{where}: not a closed convex solid (V - E + F = {vertex_count - edge_count // 2 + face_count})")
+
+    for array_name, index_name in (('vertexData', 'vertexDataIndices'), ('faceVertexData', 'edgeVertexDataIndices'),
+                                   ('edgeData', 'edgeDataIndices'), ('faceData', 'faceDataIndices')):
+        data = mesh.get(array_name)
+        if not isinstance(data, Element):
+            continue  # Reported by the schema check
+        size = int(data.get('size', '0'))
+        indices = _int_array(mesh, index_name)
+        if len(indices) and (indices.min() < 0 or indices.max() >= size):
+            errors.append(f"{where}: {index_name} out of range of {array_name}")
+        for stream in data.get('streams', []):
+            if len(stream.get('data', [])) != size:
+                errors.append(f"{where}: stream {stream.get('name')} of {array_name} has "
+                              f"{len(stream.get('data', []))} items, expected {size}")
+            if stream.get('name') == 'materialindex$0':
+                material_indices = np.array([int(value) for value in stream.get('data', [])], dtype=np.int64)
+                if len(material_indices) and material_indices.max() >= len(mesh.get('materials', [])):
+                    errors.append(f"{where}: materialindex out of range of materials")
+    return errors
+
+
+def validate_vmap_elements(elements, schema=VMAP_SCHEMA):
+    """
+    Checks top level elements against schema (element type -> attribute name -> type) and the
+    half-edge meshes against themselves. Returns a list of error messages, empty if all is well.
+    """
+    errors = []
+    seen_ids = set()
+
+    def check(element, where):
+        if element.id is not None:
+            if element.id in seen_ids:
+                errors.append(f"{where}: duplicate element id {element.id}")
+            seen_ids.add(element.id)
+        layout = schema.get(element.type)
+        if layout is None:
+            errors.append(f"{where}: element type {element.type} is not in the schema")
+            return
+        for name, attribute_type in layout.items():
+            if name not in element.attributes:
+                errors.append(f"{where}: missing attribute {name}")
+            elif element.attributes[name][0] != attribute_type:
+                errors.append(f"{where}: attribute {name} is {element.attributes[name][0]}, expected {attribute_type}")
+        for name, (attribute_type, value) in element.attributes.items():
+            if name not in layout:
+                if element.type == 'EditGameClassProps' and attribute_type == 'string':
+                    continue
+                if element.type == 'CDmePolygonMeshDataStream' and name == 'data' and attribute_type.endswith('_array'):
+                    continue
+                errors.append(f"{where}: attribute {name} ({attribute_type}) is not in the schema")
+            elif isinstance(value, Element):
+                check(value, f"{where}.{name}")
+            elif attribute_type == 'element_array':
+                for index, child in enumerate(value):
+                    check(child, f"{where}.{name}[{index}]")
+        if element.type == 'CDmePolygonMesh':
+            errors.extend(_check_polygon_mesh(element, where))
+
+    for element in elements:
+        check(element, element.type)
+    return errors
+
+
+def check_vmap_file(filepath, expected=None, schema=VMAP_SCHEMA):
+    """
+    Round trip check of a written .vmap: reads it back, validates it against schema and, given
+    the elements it was written from, compares them with what was read. Returns a list of errors.
+    """
+    with open(filepath, 'r', encoding='utf-8') as f:
+        text = f.read()
+    try:
+        elements = read_keyvalues2(text)
+    except VmapError as e:
+        return [f"{filepath}: {e}"]
+    errors = validate_vmap_elements(elements, schema)
+    if expected is not None and elements != list(expected):
+        errors.append(f"{filepath}: the file read back differs from the elements written")
+    return errors
@@ -1,95 +1,820 @@
 import os
 import re
+import gzip
+import operator
+from array import array
 import shutil
-import tkinter as tk
-from tkinter import scrolledtext, messagebox, filedialog
+import argparse
 import threading
+import queue
+import collections
 import sys
 import subprocess # Import subprocess for running external commands
+import hashlib
+import json
+import time
+import io
+import contextlib
+import mmap
+import fnmatch
+import cProfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+from winding import build_windings, plane_equations
+import wad2
+from textures import TextureSizeIndex
+from optimize import optimize_brushes
+from partition import brush_bounds, partition_brushes, REGION_CELL_SIZE
+from instancing import find_instances
+from entities import convert_entity
+from fgd import FgdSchema
+from materials import material_name, write_materials
+import vmap
 
 
 # Removed prettify_xml as it's no longer used for VMF generation.
 
 
-def parse_quake_map(map_filepath):
+# The .map file is read in large chunks instead of line by line. 1 MiB covers
+# every stock Quake map in one or two reads.
+PARSE_CHUNK_SIZE = 1 << 20
+
+# A face line split on whitespace reads
+# ( x1 y1 z1 ) ( x2 y2 z2 ) ( x3 y3 z3 ) TEXTURE_NAME offsetX offsetY rotation scaleX scaleY           (Standard)
+# ( x1 y1 z1 ) ( x2 y2 z2 ) ( x3 y3 z3 ) TEXTURE_NAME [ ux uy uz offsetX ] [ vx vy vz offsetY ] rotation scaleX scaleY (Valve 220)
+# so the nine coordinates and the texture name sit at fixed token positions.
+_FACE_POINT_TOKENS = operator.itemgetter(1, 2, 3, 6, 7, 8, 11, 12, 13)
+_FACE_TEXTURE_TOKEN = 15
+
+# Texture mapping of a face, eleven floats: ux uy uz offsetX vx vy vz offsetY rotation scaleX scaleY.
+# Standard format faces leave both axes zero; they follow from the plane (see quake_texture_axes).
+TEXTURE_PARAMS_PER_FACE = 11
+_DEFAULT_TEXTURE_PARAMS = (0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 1.0, 1.0)
+_VALVE_TEXTURE_TOKENS = operator.itemgetter(1, 2, 3, 4, 7, 8, 9, 10, 12, 13, 14)
+
+# Fallback for face lines that don't space out their parentheses, e.g. "(448 -320 64)".
+_FACE_RE = re.compile(r'\(\s*([\d\.\-]+)\s+([\d\.\-]+)\s+([\d\.\-]+)\s*\)\s*\(\s*([\d\.\-]+)\s+([\d\.\-]+)\s+([\d\.\-]+)\s*\)\s*\(\s*([\d\.\-]+)\s+([\d\.\-]+)\s+([\d\.\-]+)\s*\)\s*([^\s]+)')
+
+
+# Entity key-value line: "key" "value" (some editors separate them with tabs)
+_KEYVALUE_RE = re.compile(r'"([^"]*)"\s*"([^"]*)"')
+
+
+class _FloatCache(dict):
+    """Maps coordinate strings to floats, converting each distinct string only once."""
+    def __missing__(self, text):
+        value = self[text] = float(text)
+        return value
+
+
+def _iter_map_line_chunks(f, chunk_size=PARSE_CHUNK_SIZE):
     """
-    Parses a Quake .map file to extract brush geometry (planes) and their original texture names.
-    It identifies brush blocks within entities and accurately extracts all brush planes,
-    ignoring other entity properties like key-value pairs.
+    Reads an open .map file chunk_size characters at a time and yields each chunk as a list of lines.
+    A partial last line is carried over to the next chunk, so every line is yielded whole exactly once.
+    """
+    carry = ''
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            break
+        lines = (carry + chunk).split('\n')
+        carry = lines.pop()
+        yield lines
+    if carry:
+        yield [carry]
+
+
+class MapGeometry:
+    """
+    Flat, array-backed storage for the brushes of a parsed map.
+    planes holds nine floats per face (x1, y1, z1, x2, ..., z3 of the three plane points) and
+    texture_ids one index per face into textures, where every texture name appears once.
+    texture_param_ids likewise indexes texture_param_table, the distinct texture mappings of the map
+    (TEXTURE_PARAMS_PER_FACE floats each: axes, offsets, rotation, scales).
+    Brush i owns faces brush_offsets[i] up to brush_offsets[i + 1] and belongs to entity
+    brush_entities[i]; entities holds the key-values of every entity in file order, one dict each.
+    """
+    def __init__(self):
+        self.planes = array('d')
+        self.texture_ids = array('i')
+        self.texture_param_ids = array('i')
+        self.texture_param_table = []
+        self.texture_param_lookup = {}  # Texture mapping tuple -> index into texture_param_table
+        self.textures = []
+        self.texture_lookup = {}  # Texture name -> index into textures
+        self.brush_offsets = array('i', [0])
+        self.brush_entities = array('i')
+        self.entities = []
+
+    def __len__(self):
+        """Number of brushes, so an empty map is falsy like the old list of brushes."""
+        return len(self.brush_offsets) - 1
+
+    @property
+    def face_count(self):
+        return len(self.texture_ids)
+
+    def texture_index(self, texture_name):
+        """Returns the index of texture_name in textures, adding it on first use."""
+        index = self.texture_lookup.get(texture_name)
+        if index is None:
+            index = self.texture_lookup[texture_name] = len(self.textures)
+            self.textures.append(texture_name)
+        return index
+
+    def add_face(self, coords, texture_name, texture_params=_DEFAULT_TEXTURE_PARAMS):
+        """Appends a face (nine plane point floats, a texture name and its mapping) to the brush being built."""
+        self.planes.extend(coords)
+        self.texture_ids.append(self.texture_index(texture_name))
+        self.texture_param_ids.append(self.texture_param_index(tuple(texture_params)))
+
+    def texture_param_index(self, texture_params):
+        """Returns the index of a texture mapping tuple in texture_param_table, adding it on first use."""
+        index = self.texture_param_lookup.get(texture_params)
+        if index is None:
+            index = self.texture_param_lookup[texture_params] = len(self.texture_param_table)
+            self.texture_param_table.append(texture_params)
+        return index
+
+    def end_brush(self, entity_index=0):
+        """Closes the brush being built as part of an entity. Does nothing if no face was added since the last brush."""
+        face_count = len(self.texture_ids)
+        if face_count > self.brush_offsets[-1]:
+            self.brush_offsets.append(face_count)
+            self.brush_entities.append(entity_index)
+
+    def face_texture_params(self, face_index):
+        """Returns the TEXTURE_PARAMS_PER_FACE texture mapping floats of a face."""
+        return self.texture_param_table[self.texture_param_ids[face_index]]
+
+    def texture_params(self, face_start=0, face_stop=None):
+        """Returns the texture mappings of faces face_start up to face_stop as an (n, TEXTURE_PARAMS_PER_FACE) array."""
+        table = np.array(self.texture_param_table, dtype=np.float64).reshape(-1, TEXTURE_PARAMS_PER_FACE)
+        return table[np.frombuffer(self.texture_param_ids, dtype=np.int32)[face_start:face_stop]]
+
+    def select_brushes(self, brush_indices):
+        """
+        Returns a new MapGeometry holding copies of the given brushes, in the order given.
+        The texture and texture mapping tables are copied whole, so face indices into them stay valid.
+        """
+        brush_indices = np.asarray(brush_indices, dtype=np.intp)
+        offsets = np.frombuffer(self.brush_offsets, dtype=np.int32).astype(np.intp)
+        starts = offsets[brush_indices]
+        counts = offsets[brush_indices + 1] - starts
+        new_offsets = np.zeros(len(brush_indices) + 1, dtype=np.intp)
+        np.cumsum(counts, out=new_offsets[1:])
+        faces = np.repeat(starts - new_offsets[:-1], counts) + np.arange(new_offsets[-1])
+
+        subset = MapGeometry()
+        subset.planes = array('d', np.frombuffer(self.planes, dtype=np.float64).reshape(-1, 9)[faces].tobytes())
+        subset.texture_ids = array('i', np.frombuffer(self.texture_ids, dtype=np.int32)[faces].tobytes())
+        subset.texture_param_ids = array('i', np.frombuffer(self.texture_param_ids, dtype=np.int32)[faces].tobytes())
+        subset.texture_param_table = list(self.texture_param_table)
+        subset.texture_param_lookup = dict(self.texture_param_lookup)
+        subset.textures = list(self.textures)
+        subset.texture_lookup = dict(self.texture_lookup)
+        subset.brush_offsets = array('i', new_offsets.astype(np.int32).tobytes())
+        subset.brush_entities = array('i', np.frombuffer(self.brush_entities, dtype=np.int32)[brush_indices].tobytes())
+        subset.entities = self.entities
+        return subset
+
+    @property
+    def worldspawn_index(self):
+        """Index of the worldspawn entity in entities, or -1 if the map has none."""
+        for entity_index, entity in enumerate(self.entities):
+            if entity.get('classname') == 'worldspawn':
+                return entity_index
+        return -1
+
+    @property
+    def worldspawn(self):
+        """Key-values of the worldspawn entity (empty if the map has none)."""
+        entity_index = self.worldspawn_index
+        return self.entities[entity_index] if entity_index >= 0 else {}
+
+
+def _texture_params(tokens, to_float):
+    """
+    Reads the texture mapping that follows the texture name of a face, in Standard or Valve 220 form,
+    into TEXTURE_PARAMS_PER_FACE floats. Missing or unreadable values fall back to the defaults.
     """
-    brushes = []          # List to store all parsed brushes, each containing its planes
-    current_brush_planes = [] # List to store planes for the current brush being parsed
-    
-    # State flags to correctly identify entity and brush blocks within the .map file
-    in_entity_block = False
-    
     try:
-        with open(map_filepath, 'r') as f:
-            print(f"  Attempting to parse map file: {map_filepath}")
-            for line_num, line in enumerate(f, 1):
-                stripped_line = line.strip()
+        if tokens[:1] == ['[']:
+            if len(tokens) >= 15 and tokens[5] == ']' and tokens[6] == '[' and tokens[11] == ']':
+                return tuple(map(to_float, _VALVE_TEXTURE_TOKENS(tokens)))
+            return _DEFAULT_TEXTURE_PARAMS
+        if len(tokens) >= 5:
+            offset_x, offset_y, rotation, scale_x, scale_y = map(to_float, tokens[:5])
+            return (0.0, 0.0, 0.0, offset_x, 0.0, 0.0, 0.0, offset_y, rotation, scale_x, scale_y)
+        values = list(map(to_float, tokens)) + list(_DEFAULT_TEXTURE_PARAMS[len(tokens) - 5:])
+        return (0.0, 0.0, 0.0, values[0], 0.0, 0.0, 0.0, values[1], values[2], values[3], values[4])
+    except ValueError:
+        return _DEFAULT_TEXTURE_PARAMS
+
+
+class _TextureParamsCache(dict):
+    """
+    Maps the raw text after a face's texture name to the index of its mapping in the geometry's
+    texture_param_table; only a few distinct texts occur per map.
+    """
+    def __init__(self, geometry, to_float):
+        super().__init__()
+        self.geometry = geometry
+        self.to_float = to_float
 
-                # Skip comments and empty lines for cleaner parsing
-                if not stripped_line or stripped_line.startswith('//'):
-                    continue
+    def __missing__(self, text):
+        index = self[text] = self.geometry.texture_param_index(_texture_params(text.split(), self.to_float))
+        return index
 
-                if stripped_line == '{':
-                    if not in_entity_block:
-                        # This marks the beginning of a top-level entity (e.g., worldspawn)
-                        in_entity_block = True
-                        current_brush_planes = [] # Reset for potential new brush
-                    else:
-                        # This marks the beginning of a brush block within an entity
-                        current_brush_planes = [] # Initialize list for planes of this new brush
-                elif stripped_line == '}':
-                    if current_brush_planes:
-                        # End of a brush block, add collected planes to brushes list
-                        brushes.append(current_brush_planes)
-                        current_brush_planes = [] # Reset for next brush
-                    elif in_entity_block:
-                        # End of an entity block
-                        in_entity_block = False
+
+def read_quake_map(f):
+    """
+    Reads an open .map file into a MapGeometry in a single streaming pass.
+    Quake maps sit on a coarse grid, so coordinates and texture names repeat heavily; both are
+    converted once per distinct string.
+    """
+    geometry = MapGeometry()
+    planes_extend = geometry.planes.extend
+    texture_ids_append = geometry.texture_ids.append
+    texture_param_ids_append = geometry.texture_param_ids.append
+    texture_ids = {}  # Raw texture name -> index into geometry.textures
+    to_float = _FloatCache().__getitem__
+    texture_param_ids = _TextureParamsCache(geometry, to_float).__getitem__
+    depth = 0  # 1 inside an entity, 2 inside one of its brushes
+
+    for lines in _iter_map_line_chunks(f):
+        for line in lines:
+            line = line.strip()
+            # Comments and empty lines fall through untouched
+            if line[:1] == '(':
+                if depth <= 0:
+                    continue
+                # Split off the texture mapping after the name in one piece, it is parsed once per distinct text
+                tokens = line.split(None, _FACE_TEXTURE_TOKEN + 1)
+                if (len(tokens) > _FACE_TEXTURE_TOKEN and tokens[4] == ')' and tokens[5] == '('
+                        and tokens[9] == ')' and tokens[10] == '(' and tokens[14] == ')'):
+                    coords = _FACE_POINT_TOKENS(tokens)
+                    raw_texture = tokens[_FACE_TEXTURE_TOKEN]
+                    texture_text = tokens[-1] if len(tokens) > _FACE_TEXTURE_TOKEN + 1 else ''
                 else:
-                    # If inside an entity block, attempt to parse a plane definition
-                    if in_entity_block:
-                        # Regex to extract three 3D points and the texture name.
-                        # ( x1 y1 z1 ) ( x2 y2 z2 ) ( x3 y3 z3 ) TEXTURE_NAME [ ux uy uz offsetX ] [ vx vy vz offsetY ] rotation scaleX scaleY
-                        plane_match = re.match(r'\(\s*([\d\.\-]+)\s+([\d\.\-]+)\s+([\d\.\-]+)\s*\)\s*\(\s*([\d\.\-]+)\s+([\d\.\-]+)\s+([\d\.\-]+)\s*\)\s*\(\s*([\d\.\-]+)\s+([\d\.\-]+)\s+([\d\.\-]+)\s*\)\s*([^\s]+).*', stripped_line)
-                        if plane_match:
-                            # Extract and convert points to floats
-                            p1 = (float(plane_match.group(1)), float(plane_match.group(2)), float(plane_match.group(3)))
-                            p2 = (float(plane_match.group(4)), float(plane_match.group(5)), float(plane_match.group(6)))
-                            p3 = (float(plane_match.group(7)), float(plane_match.group(8)), float(plane_match.group(9)))
-                            texture_name = plane_match.group(10).lower() # Get texture name and convert to lowercase
-
-                            current_brush_planes.append({
-                                'plane': (p1, p2, p3),
-                                'texture': texture_name # Re-including texture name here
-                            })
-                        # Lines not matching a plane within a brush block are ignored (e.g., UV/lightmap data or entity properties)
-        
-        # Add any remaining brush planes if the file ends abruptly without a closing brace
-        if current_brush_planes:
-            brushes.append(current_brush_planes)
+                    plane_match = _FACE_RE.match(line)
+                    if not plane_match:
+                        continue
+                    coords = plane_match.groups()[:9]
+                    raw_texture = plane_match.group(10)
+                    texture_text = line[plane_match.end():].strip()
+                texture_id = texture_ids.get(raw_texture)
+                if texture_id is None:
+                    texture_id = texture_ids[raw_texture] = geometry.texture_index(raw_texture.lower())
+                planes_extend(map(to_float, coords))
+                texture_ids_append(texture_id)
+                texture_param_ids_append(texture_param_ids(texture_text))
+            elif line[:1] == '"':
+                if depth == 1:
+                    keyvalue_match = _KEYVALUE_RE.match(line)
+                    if keyvalue_match:
+                        geometry.entities[-1][keyvalue_match.group(1)] = keyvalue_match.group(2)
+            elif line == '{':
+                depth += 1
+                if depth == 1:
+                    geometry.entities.append({})
+                # Drop faces that were never closed by a '}' before a new block opened
+                del geometry.planes[geometry.brush_offsets[-1] * 9:]
+                del geometry.texture_ids[geometry.brush_offsets[-1]:]
+                del geometry.texture_param_ids[geometry.brush_offsets[-1]:]
+            elif line == '}':
+                depth -= 1
+                # End of a brush block
+                geometry.end_brush(len(geometry.entities) - 1)
+
+    # Keep any remaining faces if the file ends abruptly without a closing brace
+    geometry.end_brush(len(geometry.entities) - 1)
+    return geometry
+
+
+def parse_quake_map(map_filepath, classnames=None):
+    """
+    Parses a Quake .map file to extract brush geometry (planes) and their original texture names.
+    It identifies brush blocks within entities and accurately extracts all brush planes,
+    ignoring other entity properties like key-value pairs.
+    With classnames (a list of fnmatch patterns such as 'worldspawn' or 'func_*') only the matching
+    entities are parsed, found through a MapEntityIndex.
+    Returns a MapGeometry, which is empty if the file could not be read.
+    """
+    try:
+        if classnames:
+            print(f"  Attempting to parse {', '.join(classnames)} entities of map file: {map_filepath}")
+            with MapEntityIndex(map_filepath) as index:
+                geometry = index.load(index.select(*classnames))
+        else:
+            with open(map_filepath, 'r') as f:
+                print(f"  Attempting to parse map file: {map_filepath}")
+                geometry = read_quake_map(f)
 
-        print(f"  Finished parsing {map_filepath}. Found {len(brushes)} brushes.")
-        # We no longer need to return unique_textures separately as they aren't processed for materials
-        return brushes
+        print(f"  Finished parsing {map_filepath}. Found {len(geometry)} brushes.")
+        return geometry
     except FileNotFoundError:
         print(f"[ERROR] Map file not found: {map_filepath}")
-        return []
+        return MapGeometry()
     except Exception as e:
         print(f"[ERROR] An error occurred while parsing {map_filepath}: {e}")
-        return []
+        return MapGeometry()
+
+
+_CLASSNAME_RE = re.compile(rb'"classname"[ \t]*"([^"]*)"')
+
+
+def _brace_lines(data):
+    """
+    Returns (positions, is_open) for every '{' or '}' in data that stands alone on its line, the
+    same lines read_quake_map treats as block delimiters. Braces inside face lines (texture names
+    like {BLUE) are skipped. The candidates are found with NumPy in one pass over the bytes.
+    """
+    if not len(data):
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=bool)
+    chars = np.frombuffer(data, dtype=np.uint8)
+    positions = np.flatnonzero((chars == ord('{')) | (chars == ord('}')))
+    previous = np.where(positions > 0, chars[np.maximum(positions - 1, 0)], ord('\n'))
+    following = np.where(positions + 1 < len(chars), chars[np.minimum(positions + 1, len(chars) - 1)], ord('\n'))
+    line_start = previous == ord('\n')
+    line_end = (following == ord('\n')) | (following == ord('\r'))
+    padded = (np.isin(previous, (ord(' '), ord('\t'))) & (line_end | np.isin(following, (ord(' '), ord('\t'))))
+              | line_start & np.isin(following, (ord(' '), ord('\t'))))
+    keep = line_start & line_end
+    # Rare indented or space-padded braces: check the whole line
+    for index in np.flatnonzero(padded).tolist():
+        position = positions[index]
+        start = data.rfind(b'\n', 0, position) + 1
+        stop = data.find(b'\n', position)
+        keep[index] = data[start:stop if stop >= 0 else len(data)].strip() in (b'{', b'}')
+    positions = positions[keep]
+    return positions, chars[positions] == ord('{')
+
+
+class MapEntityIndex:
+    """
+    Random access to the entities of a .map file without parsing it.
+    The file is memory-mapped and scanned once for its block braces; offsets[i] is the byte range
+    (start, stop) of entity i including its braces, classnames[i] its classname ('' if it has none)
+    and brush_counts[i] how many brushes it holds. Individual entities are parsed on demand with
+    keyvalues() or, geometry included, with load(). Use as a context manager or call close().
+    """
+    def __init__(self, map_filepath):
+        self.filepath = map_filepath
+        with open(map_filepath, 'rb') as f:
+            # mmap refuses empty files; an empty map simply has no entities
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b''
+        self.offsets = []
+        self.classnames = []
+        self.brush_counts = []
+        positions, is_open = _brace_lines(self.data)
+        depth = 0
+        start = header_stop = brush_count = 0
+        for position, opening in zip(positions.tolist(), is_open.tolist()):
+            if opening:
+                depth += 1
+                if depth == 1:
+                    start, header_stop, brush_count = position, None, 0
+                elif depth == 2:
+                    brush_count += 1
+                    if header_stop is None:
+                        header_stop = position
+            elif depth > 0:
+                depth -= 1
+                if depth == 0:
+                    self._add_entity(start, position + 1, header_stop, brush_count)
+        if depth > 0:
+            # Unterminated last entity, kept like read_quake_map keeps it
+            self._add_entity(start, len(self.data), header_stop, brush_count)
+
+    def _add_entity(self, start, stop, header_stop, brush_count):
+        # Key-values precede the brushes, so the classname is looked up in the entity's header only
+        classname_match = _CLASSNAME_RE.search(self.data[start:header_stop or stop])
+        self.offsets.append((start, stop))
+        self.classnames.append(classname_match.group(1).decode('utf-8', 'replace') if classname_match else '')
+        self.brush_counts.append(brush_count)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+
+    def entity_text(self, entity_index):
+        """Returns the source text of an entity, from its opening to its closing brace."""
+        start, stop = self.offsets[entity_index]
+        return self.data[start:stop].decode('utf-8', 'replace')
+
+    def keyvalues(self, entity_index):
+        """Returns the key-values of an entity as a dict, without parsing its brushes."""
+        keyvalues = {}
+        for line in self.entity_text(entity_index).splitlines()[1:]:
+            line = line.strip()
+            if line == '{':
+                break
+            keyvalue_match = _KEYVALUE_RE.match(line)
+            if keyvalue_match:
+                keyvalues[keyvalue_match.group(1)] = keyvalue_match.group(2)
+        return keyvalues
+
+    def select(self, *patterns):
+        """Returns the indices of the entities whose classname matches any of the fnmatch patterns, e.g. 'func_*'."""
+        return [entity_index for entity_index, classname in enumerate(self.classnames)
+                if any(fnmatch.fnmatchcase(classname, pattern) for pattern in patterns)]
+
+    def load(self, entity_indices=None):
+        """
+        Parses the given entities (all by default) into a MapGeometry, in file order.
+        Its entities list holds only these entities, so brush_entities index into them.
+        """
+        if entity_indices is None:
+            entity_indices = range(len(self))
+        text = "\n".join(self.entity_text(entity_index) for entity_index in sorted(set(entity_indices)))
+        return read_quake_map(io.StringIO(text))
+
+
+# Define a scaling factor for Quake units to Source units.
+# The 0.75 scale is intended for the final Alyx map size.
+SCALE_FACTOR = 0.75
 
+# Quake uses Z-up, Source (1 and 2) typically Y-up.
+# Conversion: (x_quake, y_quake, z_quake) -> (x_source, z_source, -y_source)
+# Each entry names the Quake axis (optionally negated) that feeds the Source X, Y and Z axis.
+AXIS_MAP = ('x', 'z', '-y')
 
-def generate_vmf_content(map_data):
+# Prefix put in front of every Quake texture name to form the VMF material path.
+MATERIAL_PREFIX = "materials/"
+
+# Grid-aligned coordinates are bulk-formatted through a lookup table with one slot per quarter
+# unit; maps spanning more quarter units than this fall back to a sort-based unique.
+_FORMAT_TABLE_LIMIT = 1 << 22
+
+
+def _axis_permutation(axis_map):
+    """Turns an AXIS_MAP-style spec such as ('x', 'z', '-y') into source axis indices and signs."""
+    indices = []
+    signs = []
+    for axis in axis_map:
+        axis = axis.strip().lower()
+        sign = -1.0 if axis.startswith('-') else 1.0
+        axis = axis.lstrip('+-')
+        if axis not in ('x', 'y', 'z'):
+            raise ValueError(f"Invalid axis '{axis}' in axis map {axis_map!r}")
+        indices.append('xyz'.index(axis))
+        signs.append(sign)
+    return indices, np.array(signs)
+
+
+def transform_points(points, scale=SCALE_FACTOR, axis_map=AXIS_MAP, matrix=None):
+    """
+    Converts points from Quake to Source space. points is any buffer or array of floats, three
+    per point; the result is an (N, 3) float64 array. Every point is scaled and has its axes
+    swapped per axis_map, then multiplied by the optional 3x3 user matrix.
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+    indices, signs = _axis_permutation(axis_map)
+    # Swapping and scaling per axis (instead of a matrix product) keeps -0.0 where the
+    # point-by-point conversion produced it, so the formatted output doesn't change.
+    points = points[:, indices] * (signs * scale)
+    if matrix is not None:
+        points = points @ np.asarray(matrix, dtype=np.float64).reshape(3, 3).T
+    return points
+
+
+def transform_planes(planes, scale=SCALE_FACTOR, axis_map=AXIS_MAP, matrix=None):
+    """
+    Converts plane points from Quake to Source space for a whole map at once.
+    planes is any buffer or array of floats, nine per face (three x, y, z points); the result is
+    an (N, 9) float64 array (see transform_points).
+    """
+    return transform_points(planes, scale, axis_map, matrix).reshape(-1, 9)
+
+
+# qbsp's baseaxis table: for each of six directions, the face normal it stands for and the
+# texture s and t axes of faces closest to it (floor, ceiling, west, east, south, north wall).
+_QUAKE_BASE_AXES = np.array([
+    [[0, 0, 1], [1, 0, 0], [0, -1, 0]],
+    [[0, 0, -1], [1, 0, 0], [0, -1, 0]],
+    [[1, 0, 0], [0, 1, 0], [0, 0, -1]],
+    [[-1, 0, 0], [0, 1, 0], [0, 0, -1]],
+    [[0, 1, 0], [1, 0, 0], [0, 0, -1]],
+    [[0, -1, 0], [1, 0, 0], [0, 0, -1]],
+], dtype=np.float64)
+
+
+def quake_texture_axes(planes, texture_params):
+    """
+    Computes the texture axes of a batch of faces at once, in Quake space.
+    planes holds nine plane point floats per face and texture_params TEXTURE_PARAMS_PER_FACE floats.
+    Returns (axes, scales): axes is (N, 2, 4) holding the u and v axis as [x, y, z, offset] and
+    scales is (N, 2), so that a point p maps to texel u = dot(axis, p) / scale + offset.
+    Standard format faces get the axes qbsp derives from the plane (TextureAxisFromPlane), rotated
+    by their rotation; Valve 220 faces keep the axes they carry.
+    """
+    return _texture_axes_for_base(quake_base_axis_indices(planes), texture_params)
+
+
+def quake_base_axis_indices(planes):
+    """Returns, per face, which of the six qbsp base directions (rows of _QUAKE_BASE_AXES) its normal is closest to."""
+    normals = plane_equations(planes)[0]
+    # The first base direction with the largest dot product wins, as in qbsp
+    return np.argmax(normals @ _QUAKE_BASE_AXES[:, 0].T, axis=1)
+
+
+def _texture_axes_for_base(best, texture_params):
+    """quake_texture_axes for faces whose base direction indices are already known."""
+    params = np.asarray(texture_params, dtype=np.float64).reshape(-1, TEXTURE_PARAMS_PER_FACE)
+    u_axes = _QUAKE_BASE_AXES[best, 1]
+    v_axes = _QUAKE_BASE_AXES[best, 2]
+
+    radians = np.deg2rad(params[:, 8])
+    sines = np.sin(radians)
+    cosines = np.cos(radians)
+    # Right angles are exact in qbsp; keep 90 degree rotations from picking up 6e-17 noise
+    right_angle = params[:, 8] % 90 == 0
+    sines[right_angle] = np.round(sines[right_angle])
+    cosines[right_angle] = np.round(cosines[right_angle])
+    rows = np.arange(len(params))
+    s_index = np.argmax(np.abs(u_axes), axis=1)
+    t_index = np.argmax(np.abs(v_axes), axis=1)
+    rotated = []
+    for base in (u_axes, v_axes):
+        axis = base.copy()
+        along_s = base[rows, s_index]
+        along_t = base[rows, t_index]
+        axis[rows, s_index] = cosines * along_s - sines * along_t
+        axis[rows, t_index] = sines * along_s + cosines * along_t
+        rotated.append(axis)
+
+    valve = params[:, 0:3].any(axis=1) | params[:, 4:7].any(axis=1)
+    axes = np.empty((len(params), 2, 4))
+    axes[:, 0, :3] = np.where(valve[:, None], params[:, 0:3], rotated[0])
+    axes[:, 1, :3] = np.where(valve[:, None], params[:, 4:7], rotated[1])
+    axes[:, 0, 3] = params[:, 3]
+    axes[:, 1, 3] = params[:, 7]
+    scales = params[:, 9:11].copy()
+    scales[scales == 0.0] = 1.0
+    return axes, scales
+
+
+def transform_texture_axes(axes, scales, scale=SCALE_FACTOR, axis_map=AXIS_MAP, matrix=None):
+    """
+    Carries texture axes (see quake_texture_axes) through the same transform as transform_planes,
+    so every face keeps its texel mapping. The axes come back unit length with the difference
+    (and any negative scale) folded into scales. Returns the new (axes, scales).
+    """
+    indices, signs = _axis_permutation(axis_map)
+    point_transform = np.zeros((3, 3))
+    point_transform[np.arange(3), indices] = signs * scale
+    if matrix is not None:
+        point_transform = np.asarray(matrix, dtype=np.float64).reshape(3, 3) @ point_transform
+    # dot(axis, p) == dot(axis @ inverse, transform @ p)
+    directions = axes[:, :, :3] @ np.linalg.inv(point_transform)
+    lengths = np.linalg.norm(directions, axis=2)
+    lengths[lengths == 0.0] = 1.0
+    new_scales = scales / lengths
+    flip = np.where(new_scales < 0.0, -1.0, 1.0)
+    new_axes = np.empty_like(axes)
+    new_axes[:, :, :3] = directions / (lengths * flip)[:, :, None]
+    new_axes[:, :, 3] = axes[:, :, 3]
+    return new_axes, new_scales * flip
+
+
+def format_coordinates(values):
+    """
+    Formats a float array with '%.6f' in bulk.
+    Returns (strings, inverse): the formatted distinct values and, for every input value, the index
+    of its string. Each distinct value is formatted only once; -0.0 and 0.0 stay distinct.
+    """
+    flat = np.ascontiguousarray(values, dtype=np.float64).ravel()
+    if flat.size:
+        with np.errstate(invalid='ignore'):
+            quarters = flat * 4.0
+            quarter_ints = quarters.astype(np.int64)
+        low = int(quarter_ints.min())
+        span = int(quarter_ints.max()) - low
+        if span < _FORMAT_TABLE_LIMIT and np.array_equal(quarter_ints, quarters):
+            # Every value sits on a quarter-unit grid: bucket by grid cell and sign instead of sorting
+            keys = (quarter_ints - low) * 2 + np.signbit(flat)
+            used = np.zeros(span * 2 + 2, dtype=bool)
+            used[keys] = True
+            slots = np.flatnonzero(used)
+            representatives = np.empty(len(used))
+            representatives[keys] = flat
+            slot_to_string = np.zeros(len(used), dtype=np.intp)
+            slot_to_string[slots] = np.arange(len(slots))
+            strings = ['%.6f' % value for value in representatives[slots].tolist()]
+            return strings, slot_to_string[keys]
+    unique_bits, inverse = np.unique(flat.view(np.int64), return_inverse=True)
+    strings = ['%.6f' % value for value in unique_bits.view(np.float64).tolist()]
+    return strings, inverse.ravel()
+
+
+# Fixed text around the per-face values of a VMF solid. Each face of a brush is emitted as the pieces
+# [solid/side opening, side id, plane opening, x1 .. z3, material, texture mapping + side closing
+# (, solid closing)], so a whole map is assembled with a single str.join instead of a dozen appends per side.
+_VMF_SOLID_OPEN = "    solid\n    {\n        \"id\" \"%d\"\n"
+_VMF_SIDE_OPEN = "        side\n        {\n            \"id\" \""
+_VMF_PLANE_OPEN = "\"\n            \"plane\" \"("
+_VMF_MATERIAL_OPEN = ")\"\n            \"material\" \""
+# Basic UVs for VMF. These are simplified and might require manual fine-tuning in Hammer.
+# A common scale for Quake-like textures might be 16 units per texture repeat (1/16 = 0.0625).
+_VMF_SIDE_CLOSE = (
+    "\"\n"
+    "            \"uaxis\" \"[%s %s %s %s] %s\"\n"  # Texture U axis and offset (texels), scale
+    "            \"vaxis\" \"[%s %s %s %s] %s\"\n"
+    "            \"rotation\" \"%s\"\n"
+    "            \"lightmapscale\" \"16\"\n"  # Default lightmap scale for lightmap grid
+    "            \"smoothing_groups\" \"0\"\n"
+    "        }\n"
+)
+# Editor block for solid (brush) in VMF: red, visible in Hammer
+_VMF_SOLID_CLOSE = (
+    "        \"editor\"\n"
+    "        {\n"
+    "            \"color\" \"255 0 0\"\n"
+    "            \"visgroupshown\" \"1\"\n"
+    "            \"visgroupautoshown\" \"1\"\n"
+    "            \"logicalpos\" \"[0 0]\"\n"
+    "        }\n"
+    "    }\n"
+)
+# Text following each of the nine plane coordinates: "(x1 y1 z1) (x2 y2 z2) (x3 y3 z3)"
+_VMF_COORD_SEPARATORS = (' ', ' ', ') (', ' ', ' ', ') (', ' ', ' ', '')
+_VMF_PIECES_PER_FACE = 15
+
+# Brushes formatted per chunk when streaming a VMF. Keeps the in-flight text around a megabyte
+# no matter how big the map is.
+VMF_BATCH_BRUSHES = 256
+VMF_WRITE_BUFFER_SIZE = 1 << 20
+VMF_GZIP_LEVEL = 6
+
+
+def _format_texture_value(value):
+    # Adding 0.0 turns -0.0 into 0.0
+    return '%.6g' % (value + 0.0)
+
+
+def format_side_mappings(map_data, scale=SCALE_FACTOR, axis_map=AXIS_MAP, matrix=None):
+    """
+    Formats the uaxis/vaxis/rotation part of every VMF side of a map, closing the side.
+    A face's mapping only depends on its texture params and, for Standard format faces, on which
+    qbsp base direction its plane is closest to; a map has a few hundred such pairs at most, so the
+    axes are computed and formatted once per pair. Returns an object array with one string per face.
+    """
+    param_count = len(map_data.texture_param_table)
+    base = _QUAKE_BASE_AXES.shape[0]
+    keys = np.frombuffer(map_data.texture_param_ids, dtype=np.int32) * base + quake_base_axis_indices(map_data.planes)
+    used = np.zeros(param_count * base, dtype=bool)
+    used[keys] = True
+    slots = np.flatnonzero(used)
+    table = np.array(map_data.texture_param_table, dtype=np.float64).reshape(-1, TEXTURE_PARAMS_PER_FACE)
+    slot_params = table[slots // base]
+    axes, scales = transform_texture_axes(*_texture_axes_for_base(slots % base, slot_params), scale, axis_map, matrix)
+    rows = np.concatenate([axes[:, 0], scales[:, :1], axes[:, 1], scales[:, 1:], slot_params[:, 8:9]], axis=1)
+    texts = np.array([_VMF_SIDE_CLOSE % tuple(map(_format_texture_value, row)) for row in rows.tolist()],
+                     dtype=object)
+    slot_of_key = np.zeros(len(used), dtype=np.intp)
+    slot_of_key[slots] = np.arange(len(slots))
+    return texts[slot_of_key[keys]]
+
+
+def format_vmf_solids(map_data, coords, first_id, brush_start=0, brush_stop=None, material_prefix=MATERIAL_PREFIX,
+                      side_mappings=None):
+    """
+    Formats brushes brush_start up to brush_stop of map_data as VMF solid blocks in one batched pass.
+    coords is the (face_count, 9) array of transformed plane points of those brushes' faces
+    (see transform_planes) and side_mappings the texture mapping texts of those faces (see format_side_mappings).
+    Solids and sides are numbered consecutively from first_id.
+    Returns (text, next_free_id); the text ends with a newline.
+    """
+    if brush_stop is None:
+        brush_stop = len(map_data)
+    brush_count = brush_stop - brush_start
+    if brush_count <= 0:
+        return "", first_id
+
+    offsets = np.frombuffer(map_data.brush_offsets, dtype=np.int32)[brush_start:brush_stop + 1].astype(np.intp)
+    face_start = int(offsets[0])
+    offsets -= face_start
+    face_count = int(offsets[-1])
+    first_faces = offsets[:-1]
+    last_faces = offsets[1:] - 1
+    brush_of_face = np.repeat(np.arange(brush_count), np.diff(offsets))
+    # Every brush takes one ID for the solid followed by one per side
+    solid_ids = first_id + np.arange(brush_count) + first_faces
+    side_ids = first_id + 1 + brush_of_face + np.arange(face_count)
+
+    pieces = np.empty((face_count, _VMF_PIECES_PER_FACE), dtype=object)
+    pieces[:, 0] = _VMF_SIDE_OPEN
+    pieces[first_faces, 0] = [_VMF_SOLID_OPEN % solid_id + _VMF_SIDE_OPEN for solid_id in solid_ids.tolist()]
+    pieces[:, 1] = list(map(str, side_ids.tolist()))
+    pieces[:, 2] = _VMF_PLANE_OPEN
+
+    strings, inverse = format_coordinates(coords)
+    inverse = inverse.reshape(face_count, 9)
+    suffixed = {}
+    for column, separator in enumerate(_VMF_COORD_SEPARATORS):
+        if separator not in suffixed:
+            suffixed[separator] = np.array([s + separator for s in strings], dtype=object)
+        pieces[:, 3 + column] = suffixed[separator][inverse[:, column]]
+
+    # Assign the original Quake texture name, prefixed with "materials/" as expected by Source 1 VMFs.
+    # Hammer will then look for a .vmat with this name (e.g., 'materials/wall_tex.vmat', see materials.py)
+    materials = np.array([_VMF_MATERIAL_OPEN + material_prefix + material_name(texture)
+                          for texture in map_data.textures], dtype=object)
+    texture_ids = np.frombuffer(map_data.texture_ids, dtype=np.int32)[face_start:face_start + face_count]
+    pieces[:, 12] = materials[texture_ids]
+    pieces[:, 13] = side_mappings
+    pieces[:, 14] = ""
+    pieces[last_faces, 14] = _VMF_SOLID_CLOSE
+
+    next_id = first_id + brush_count + face_count
+    return "".join(pieces.ravel().tolist()), next_id
+
+
+def convert_entities(map_data, scale=SCALE_FACTOR, axis_map=AXIS_MAP, matrix=None, schema=None, report=None):
     """
-    Generates the content for a Source 1 .vmf file from the parsed Quake map data.
+    Converts the entities of map_data to Alyx ones with the mapping table of entities.py, validating
+    their key-values against schema (an FgdSchema) when given.
+    Returns (world_brushes, converted): the ascending indices of the brushes that stay in the world,
+    those of worldspawn and of entities without a mapping, and one convert_entity dict per
+    converted entity with the indices of its own brushes added under 'brushes'.
+    With a report dict, the number of entities 'converted' per Alyx class and 'skipped' per Quake
+    class, the 'dropped_keys' count and the converted classes 'not_in_fgd' are accumulated in it.
+    """
+    brush_entities = np.frombuffer(map_data.brush_entities, dtype=np.int32)
+    world = np.ones(len(map_data), dtype=bool)
+    worldspawn_index = map_data.worldspawn_index
+    with_brushes = set(np.unique(brush_entities).tolist())
+    report = report if report is not None else {}
+    for key in ('converted', 'skipped'):
+        report.setdefault(key, {})
+    report.setdefault('dropped_keys', 0)
+    not_in_fgd = set(report.get('not_in_fgd', ()))
+
+    def transform_point(point):
+        return transform_points(point, scale, axis_map, matrix)[0].tolist()
+
+    converted = []
+    for entity_index, keyvalues in enumerate(map_data.entities):
+        if entity_index == worldspawn_index:
+            continue
+        entity = convert_entity(keyvalues, transform_point, scale, schema)
+        if entity is None:
+            quake_classname = keyvalues.get('classname', '')
+            report['skipped'][quake_classname] = report['skipped'].get(quake_classname, 0) + 1
+            continue
+        entity['brushes'] = np.flatnonzero(brush_entities == entity_index) if entity_index in with_brushes \
+            else np.zeros(0, dtype=np.intp)
+        world[entity['brushes']] = False
+        converted.append(entity)
+        report['converted'][entity['classname']] = report['converted'].get(entity['classname'], 0) + 1
+        report['dropped_keys'] += len(entity['dropped'])
+        if schema is not None and entity['classname'] not in schema:
+            not_in_fgd.add(entity['classname'])
+    report['not_in_fgd'] = sorted(not_in_fgd)
+    return np.flatnonzero(world), converted
+
+
+def iter_vmf_chunks(map_data, scale=SCALE_FACTOR, axis_map=AXIS_MAP, matrix=None, material_prefix=MATERIAL_PREFIX,
+                    batch_size=VMF_BATCH_BRUSHES, prefab=False, instances=(), entities=False, entity_schema=None,
+                    entity_report=None):
+    """
+    Generates the content for a Source 1 .vmf file from the parsed Quake map data (a MapGeometry),
+    yielding it piece by piece: the header, the solids batch_size brushes at a time, then the rest.
     This VMF will then be compiled by ResourceCompiler.exe into a Source 2 .vmap.
     Brush faces will be assigned their original Quake texture names.
     Includes a basic info_player_start and empty hidden block for VMF validity.
+    The coordinate transform (scale, axis_map and an optional 3x3 matrix) is applied a whole batch at once,
+    to the plane points and to the texture axes of every face alike.
+    With prefab=True the file is marked as a prefab and gets no info_player_start.
+    instances lists VMF paths (relative to this file) to add as func_instance entities at the origin,
+    or (path, origin) pairs placing them at an (x, y, z) origin in Source coordinates.
+    With entities=True the map's entities are converted too (see convert_entities): brushes of a
+    converted entity are written inside its entity block instead of the world, and the default
+    info_player_start is only added if the map has none. entity_schema and entity_report are
+    passed on to convert_entities.
     """
+    if entities:
+        world_brushes, converted = convert_entities(map_data, scale, axis_map, matrix, entity_schema, entity_report)
+        order = np.concatenate([world_brushes] + [entity['brushes'] for entity in converted]).astype(np.intp)
+        if not np.array_equal(order, np.arange(len(map_data))):
+            map_data = map_data.select_brushes(order)
+        world_count = len(world_brushes)
+    else:
+        converted = []
+        world_count = len(map_data)
+
     vmf_lines = []
     
     # VMF header information
@@ -99,7 +824,7 @@ def generate_vmf_content(map_data):
     vmf_lines.append("    \"editorversion\" \"400\"")
     vmf_lines.append("    \"editorbuild\" \"8000\"")
     vmf_lines.append("    \"formatversion\" \"1\"")
-    vmf_lines.append("    \"prefab\" \"0\"")
+    vmf_lines.append(f"    \"prefab\" \"{int(prefab)}\"")
     vmf_lines.append("}")
 
     # Worldspawn entity block
@@ -108,66 +833,22 @@ def generate_vmf_content(map_data):
     vmf_lines.append("    \"id\" \"1\"") # Worldspawn typically has ID 1
     vmf_lines.append("    \"mapversion\" \"1\"")
     vmf_lines.append("    \"classname\" \"worldspawn\"")
+    yield "\n".join(vmf_lines) + "\n"
 
-    # Define a scaling factor for Quake units to Source units.
-    # The 0.75 scale is intended for the final Alyx map size.
-    SCALE_FACTOR = 0.75 
-    
     # Unique ID counter for solids (brushes) and sides, starting after worldspawn's ID 1
-    current_id = 2 
-
-    # Iterate through each brush parsed from the Quake map
-    for brush_idx, brush_planes in enumerate(map_data):
-        vmf_lines.append("    solid")
-        vmf_lines.append("    {")
-        vmf_lines.append(f"        \"id\" \"{current_id}\"")
-        current_id += 1
-
-        # Iterate through each plane (side) of the current brush
-        for plane_data in brush_planes:
-            vmf_lines.append("        side")
-            vmf_lines.append("        {")
-            vmf_lines.append(f"            \"id\" \"{current_id}\"")
-            current_id += 1
-
-            # Quake uses Z-up, Source (1 and 2) typically Y-up.
-            # Conversion: (x_quake, y_quake, z_quake) -> (x_source, z_source, -y_source)
-            # This is the standard conversion that usually works.
-            p1 = plane_data['plane'][0]
-            p2 = plane_data['plane'][1]
-            p3 = plane_data['plane'][2]
-
-            # Apply Z-up to Y-up conversion and scaling to each point
-            p1_s = (p1[0] * SCALE_FACTOR, p1[2] * SCALE_FACTOR, -p1[1] * SCALE_FACTOR)
-            p2_s = (p2[0] * SCALE_FACTOR, p2[2] * SCALE_FACTOR, -p2[1] * SCALE_FACTOR)
-            p3_s = (p3[0] * SCALE_FACTOR, p3[2] * SCALE_FACTOR, -p3[1] * SCALE_FACTOR)
-
-            # Format coordinates for VMF plane string: "(x1 y1 z1) (x2 y2 z2) (x3 y3 z3)"
-            vmf_lines.append(f"            \"plane\" \"({p1_s[0]:.6f} {p1_s[1]:.6f} {p1_s[2]:.6f}) ({p2_s[0]:.6f} {p2_s[1]:.6f} {p2_s[2]:.6f}) ({p3_s[0]:.6f} {p3_s[1]:.6f} {p3_s[2]:.6f})\"")
-
-            # Assign the original Quake texture name, prefixed with "materials/" as expected by Source 1 VMFs.
-            # Hammer will then look for a .vmat with this name (e.g., 'materials/wall_tex.vmat')
-            vmf_lines.append(f"            \"material\" \"materials/{plane_data['texture'].upper()}\"") 
-
-            # Basic UVs for VMF. These are simplified and might require manual fine-tuning in Hammer.
-            # A common scale for Quake-like textures might be 16 units per texture repeat (1/16 = 0.0625).
-            vmf_lines.append("            \"uaxis\" \"[1 0 0 0] 0.0625\"") # X-axis projection, scale 0.0625
-            vmf_lines.append("            \"vaxis\" \"[0 1 0 0] 0.0625\"") # Y-axis projection, scale 0.0625
-            vmf_lines.append("            \"rotation\" \"0\"")
-            vmf_lines.append("            \"lightmapscale\" \"16\"") # Default lightmap scale for lightmap grid
-            vmf_lines.append("            \"smoothing_groups\" \"0\"")
-            vmf_lines.append("        }") # End side
-        
-        # Editor block for solid (brush) in VMF
-        vmf_lines.append("        \"editor\"")
-        vmf_lines.append("        {")
-        vmf_lines.append("            \"color\" \"255 0 0\"") # Default brush color in Hammer (Red)
-        vmf_lines.append("            \"visgroupshown\" \"1\"") # Brush visible in Hammer
-        vmf_lines.append("            \"visgroupautoshown\" \"1\"") # Brush auto-visible
-        vmf_lines.append("            \"logicalpos\" \"[0 0]\"") # Add logicalpos for brushes
-        vmf_lines.append("        }")
-        vmf_lines.append("    }") # End solid
+    current_id = 2
+    planes = map_data.planes
+    offsets = map_data.brush_offsets
+    side_mappings = format_side_mappings(map_data, scale, axis_map, matrix) if map_data else None
+    for brush_start in range(0, world_count, batch_size):
+        brush_stop = min(brush_start + batch_size, world_count)
+        face_start, face_stop = offsets[brush_start], offsets[brush_stop]
+        coords = transform_planes(planes[face_start * 9:face_stop * 9], scale, axis_map, matrix)
+        solids, current_id = format_vmf_solids(map_data, coords, current_id, brush_start, brush_stop, material_prefix,
+                                               side_mappings[face_start:face_stop])
+        yield solids
 
+    vmf_lines = []
     # Editor block for worldspawn in VMF
     vmf_lines.append("    \"editor\"")
     vmf_lines.append("    {")
@@ -178,35 +859,354 @@ def generate_vmf_content(map_data):
     vmf_lines.append("    }")
     vmf_lines.append("}") # End world
 
-    # Add a minimal info_player_start entity
-    vmf_lines.append("entity")
-    vmf_lines.append("{")
-    vmf_lines.append(f"    \"id\" \"{current_id}\"")
-    current_id += 1
-    vmf_lines.append("    \"classname\" \"info_player_start\"")
-    vmf_lines.append("    \"origin\" \"0 0 64\"") # Default spawn point
-    vmf_lines.append("    \"angles\" \"0 0 0\"") # Default orientation
-    vmf_lines.append("    \"editor\"")
-    vmf_lines.append("    {")
-    vmf_lines.append("        \"color\" \"255 255 0\"") # Yellow for player start
-    vmf_lines.append("        \"visgroupshown\" \"1\"")
-    vmf_lines.append("        \"visgroupautoshown\" \"1\"")
-    vmf_lines.append("        \"logicalpos\" \"[0 0]\"")
-    vmf_lines.append("    }")
-    vmf_lines.append("}")
+    for instance in instances:
+        if isinstance(instance, str):
+            instance_filepath, origin = instance, "0 0 0"
+        else:
+            instance_filepath, origin = instance[0], "%.6f %.6f %.6f" % tuple(value + 0.0 for value in instance[1])
+        vmf_lines.append("entity")
+        vmf_lines.append("{")
+        vmf_lines.append(f"    \"id\" \"{current_id}\"")
+        current_id += 1
+        vmf_lines.append("    \"classname\" \"func_instance\"")
+        vmf_lines.append(f"    \"file\" \"{instance_filepath.replace(os.sep, '/')}\"")
+        vmf_lines.append(f"    \"origin\" \"{origin}\"")
+        vmf_lines.append("    \"angles\" \"0 0 0\"")
+        vmf_lines.append("}")
+
+    # Converted entities, each followed by its own brushes, which come after the world's in map_data
+    brush_start = world_count
+    for entity in converted:
+        vmf_lines.append("entity")
+        vmf_lines.append("{")
+        vmf_lines.append(f"    \"id\" \"{current_id}\"")
+        current_id += 1
+        vmf_lines.append(f"    \"classname\" \"{entity['classname']}\"")
+        for key, value in entity['keyvalues'].items():
+            vmf_lines.append(f"    \"{key}\" \"{value}\"")
+        if entity['connections']:
+            vmf_lines.append("    connections")
+            vmf_lines.append("    {")
+            for output, value in entity['connections']:
+                vmf_lines.append(f"        \"{output}\" \"{value}\"")
+            vmf_lines.append("    }")
+        brush_stop = brush_start + len(entity['brushes'])
+        if brush_stop > brush_start:
+            face_start, face_stop = offsets[brush_start], offsets[brush_stop]
+            coords = transform_planes(planes[face_start * 9:face_stop * 9], scale, axis_map, matrix)
+            solids, current_id = format_vmf_solids(map_data, coords, current_id, brush_start, brush_stop,
+                                                   material_prefix, side_mappings[face_start:face_stop])
+            vmf_lines.append(solids.rstrip("\n"))
+        brush_start = brush_stop
+        vmf_lines.append("}")
+
+    if not prefab and not any(entity['classname'] == 'info_player_start' for entity in converted):
+        # Add a minimal info_player_start entity
+        vmf_lines.append("entity")
+        vmf_lines.append("{")
+        vmf_lines.append(f"    \"id\" \"{current_id}\"")
+        current_id += 1
+        vmf_lines.append("    \"classname\" \"info_player_start\"")
+        vmf_lines.append("    \"origin\" \"0 0 64\"") # Default spawn point
+        vmf_lines.append("    \"angles\" \"0 0 0\"") # Default orientation
+        vmf_lines.append("    \"editor\"")
+        vmf_lines.append("    {")
+        vmf_lines.append("        \"color\" \"255 255 0\"") # Yellow for player start
+        vmf_lines.append("        \"visgroupshown\" \"1\"")
+        vmf_lines.append("        \"visgroupautoshown\" \"1\"")
+        vmf_lines.append("        \"logicalpos\" \"[0 0]\"")
+        vmf_lines.append("    }")
+        vmf_lines.append("}")
 
     # Add an empty hidden block (often present in VMFs)
     vmf_lines.append("hidden")
     vmf_lines.append("{")
     vmf_lines.append("}")
 
-    return "\n".join(vmf_lines)
+    yield "\n".join(vmf_lines)
 
 
-def run_resource_compiler(compiler_path, input_vmf_path, console_widget):
+def generate_vmf_content(map_data, **vmf_options):
+    """
+    Returns the whole .vmf file for map_data as one string.
+    Takes the same options as iter_vmf_chunks; prefer write_vmf for writing to disk.
+    """
+    return "".join(iter_vmf_chunks(map_data, **vmf_options))
+
+
+def write_vmf(map_data, vmf_filepath, compress=False, timings=None, **vmf_options):
+    """
+    Streams the .vmf for map_data straight to vmf_filepath through a buffered file handle, so the
+    full text never exists in memory at once. With compress=True the file is written gzip-compressed.
+    Takes the same options as iter_vmf_chunks. Returns the number of characters written.
+    With a timings dict, the seconds spent generating the text and writing it out (including
+    compression) are added to its 'generate' and 'io' entries.
+    """
+    generate_seconds = io_seconds = 0.0
+    start = time.perf_counter()
+    if compress:
+        f = gzip.open(vmf_filepath, 'wt', compresslevel=VMF_GZIP_LEVEL)
+    else:
+        f = open(vmf_filepath, 'w', buffering=VMF_WRITE_BUFFER_SIZE)
+    written = 0
+    with f:
+        chunks = iter_vmf_chunks(map_data, **vmf_options)
+        while True:
+            generated = time.perf_counter()
+            io_seconds += generated - start
+            chunk = next(chunks, None)
+            start = time.perf_counter()
+            generate_seconds += start - generated
+            if chunk is None:
+                break
+            written += f.write(chunk)
+    io_seconds += time.perf_counter() - start  # Flushing and closing
+    if timings is not None:
+        timings['generate'] = timings.get('generate', 0.0) + generate_seconds
+        timings['io'] = timings.get('io', 0.0) + io_seconds
+    return written
+
+
+# Output formats of convert_map_to_vmf: Source 1 VMF text for Hammer's import, or a Source 2 .vmap written directly.
+OUTPUT_FORMATS = ('vmf', 'vmap')
+
+
+def write_vmap(map_data, vmap_filepath, timings=None, validate=False, scale=SCALE_FACTOR, axis_map=AXIS_MAP, matrix=None,
+               material_prefix=MATERIAL_PREFIX, entities=False, entity_schema=None, entity_report=None,
+               texture_sizes=None):
+    """
+    Writes map_data straight to a Source 2 .vmap (KeyValues2 text, see vmap.py), with every brush
+    as a polygon mesh, so resourcecompiler can build it without a VMF in between. This is not the
+    faster path: meshes are built brush by brush in Python, and the file comes out about 2.5 times
+    the size of the VMF; use it where the VMF import is the problem.
+    Takes the coordinate, material and entity options of iter_vmf_chunks; texture_sizes maps
+    texture names to (width, height) for the texture coordinates (vmap.DEFAULT_TEXTURE_SIZE otherwise).
+    Brushes that do not form a closed volume are left out and reported.
+    With validate=True the file is read back and checked against vmap.VMAP_SCHEMA and against the
+    elements written; a failed check raises vmap.VmapError.
+    With a timings dict, the seconds spent are added to its 'generate', 'io' and 'validate' entries.
+    Returns the number of characters written.
+    """
+    start = time.perf_counter()
+    windings = build_windings(map_data.planes, map_data.brush_offsets)
+    vertices = transform_points(windings.vertices, scale, axis_map, matrix)
+    # A mirroring transform turns the clockwise qbsp polygons counter-clockwise already
+    mirrored = np.linalg.det(transform_points(np.eye(3), scale, axis_map, matrix)) < 0
+    axes, scales = transform_texture_axes(*quake_texture_axes(map_data.planes, map_data.texture_params()),
+                                          scale, axis_map, matrix)
+    sizes = np.array([(texture_sizes or {}).get(texture.lower(), vmap.DEFAULT_TEXTURE_SIZE)
+                      for texture in map_data.textures] + [vmap.DEFAULT_TEXTURE_SIZE], dtype=np.float64)
+    texture_ids = np.frombuffer(map_data.texture_ids, dtype=np.int32)
+    materials = [material_prefix + material_name(texture) + ".vmat" for texture in map_data.textures]
+    if entities:
+        world_brushes, converted = convert_entities(map_data, scale, axis_map, matrix, entity_schema, entity_report)
+    else:
+        world_brushes, converted = np.arange(len(map_data)), []
+
+    factory = vmap.ElementFactory()
+    skipped = list(windings.dropped)
+
+    def meshes(brush_indices):
+        brush_meshes, invalid = vmap.build_brush_meshes(factory, vertices, windings.vertex_offsets, map_data.brush_offsets,
+                                                        [brush for brush in brush_indices if windings.valid[brush]],
+                                                        texture_ids, materials, axes, scales, sizes[texture_ids], mirrored)
+        skipped.extend(invalid)
+        return brush_meshes
+
+    world_meshes = meshes(world_brushes.tolist())
+    for entity in converted:
+        entity['meshes'] = meshes(entity['brushes'].tolist())
+    if not any(entity['classname'] == 'info_player_start' for entity in converted):
+        # Same default spawn point as the VMF output
+        converted.append({'classname': 'info_player_start', 'keyvalues': {'origin': "0 0 64", 'angles': "0 0 0"},
+                          'connections': [], 'meshes': []})
+    elements = vmap.build_map_elements(factory, world_meshes, converted)
+    if skipped:
+        print(f"Left out {len(skipped)} brushes that do not form a valid mesh (brush index: reason):")
+        for brush_index, reason in sorted(skipped):
+            print(f"  {brush_index}: {reason}")
+
+    generated = time.perf_counter()
+    with open(vmap_filepath, 'w', encoding='utf-8', buffering=VMF_WRITE_BUFFER_SIZE) as f:
+        written = vmap.write_keyvalues2(elements, f)
+    written_at = time.perf_counter()
+    if timings is not None:
+        timings['generate'] = timings.get('generate', 0.0) + generated - start
+        timings['io'] = timings.get('io', 0.0) + written_at - generated
+    if validate:
+        errors = vmap.check_vmap_file(vmap_filepath, elements)
+        if timings is not None:
+            timings['validate'] = timings.get('validate', 0.0) + time.perf_counter() - written_at
+        if errors:
+            raise vmap.VmapError(f"{len(errors)} problems, first: {errors[0]}")
+        print(f"Validated {os.path.basename(vmap_filepath)} against the vmap schema ({len(world_meshes)} world meshes).")
+    return written
+
+
+# FGD converted entities are validated against: the Alyx FGD kept next to this tool.
+DEFAULT_FGD_FILEPATH = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..",
+                                                     "Half Life Alyx FGD Backup", "hlvr.fgd"))
+
+
+# Region VMFs of a partitioned map, or the prefabs of an instanced one, go to maps/prefabs/<map name>/,
+# next to the master map.
+PREFABS_FOLDER = "prefabs"
+
+
+def _prefab_folder(vmf_filepath):
+    """Creates the prefab folder of a master map, removing the VMFs an earlier run left there. Returns its path."""
+    map_name = os.path.basename(vmf_filepath).split('.', 1)[0]
+    prefab_dir = os.path.join(os.path.dirname(vmf_filepath), PREFABS_FOLDER, map_name)
+    os.makedirs(prefab_dir, exist_ok=True)
+    for entry in os.scandir(prefab_dir):
+        if entry.is_file() and entry.name.lower().endswith((".vmf", ".vmf.gz")):
+            os.remove(entry.path)
+    return prefab_dir
+
+
+def write_partitioned_vmf(map_data, vmf_filepath, cell_size=REGION_CELL_SIZE, compress=False, timings=None, **vmf_options):
+    """
+    Writes map_data split into grid regions of cell_size Quake units (see partition.py): one prefab
+    VMF per region under PREFABS_FOLDER/<map name>/ next to vmf_filepath, and at vmf_filepath a
+    master map that places every region with a func_instance. Region files left over from an
+    earlier run of the same map are removed first. Takes the same options as write_vmf.
+    With entities=True only world brushes are partitioned; converted entities and their brushes
+    go to the master map.
+    Returns the list of region VMF paths written.
+    """
+    maps_dir = os.path.dirname(vmf_filepath)
+    map_name = os.path.basename(vmf_filepath).split('.', 1)[0]
+    extension = ".vmf.gz" if compress else ".vmf"
+    region_dir = _prefab_folder(vmf_filepath)
+
+    if vmf_options.get('entities'):
+        world_brushes, _ = convert_entities(map_data, vmf_options.get('scale', SCALE_FACTOR),
+                                            vmf_options.get('axis_map', AXIS_MAP), vmf_options.get('matrix'))
+        entity_brushes = np.setdiff1d(np.arange(len(map_data)), world_brushes)
+        world = map_data.select_brushes(world_brushes)
+        master = map_data.select_brushes(entity_brushes)
+    else:
+        world = map_data
+        master = MapGeometry()
+    region_options = dict(vmf_options, entities=False, entity_report=None)
+    regions = partition_brushes(*brush_bounds(world.planes, world.brush_offsets), cell_size)
+    region_filepaths = []
+    for (x, y, z), brush_indices in regions.items():
+        region_filepath = os.path.join(region_dir, f"{map_name}_{x}_{y}_{z}{extension}")
+        write_vmf(world.select_brushes(brush_indices), region_filepath, compress, timings, prefab=True, **region_options)
+        region_filepaths.append(region_filepath)
+    instances = [os.path.relpath(region_filepath, maps_dir) for region_filepath in region_filepaths]
+    write_vmf(master, vmf_filepath, compress, timings, instances=instances, **vmf_options)
+    return region_filepaths
+
+
+def translate_brushes(map_data, offset):
+    """
+    Returns a copy of map_data with every brush moved by offset, (x, y, z) in Quake units.
+    Texture offsets are shifted along, so the textures move with the brushes.
+    """
+    offset = np.asarray(offset, dtype=np.float64)
+    moved = map_data.select_brushes(np.arange(len(map_data)))
+    moved.planes = array('d', (np.frombuffer(map_data.planes, dtype=np.float64).reshape(-1, 3) + offset).tobytes())
+    params = map_data.texture_params()
+    axes, scales = quake_texture_axes(map_data.planes, params)
+    # u = dot(axis, p) / scale + offset has to stay the same for p + offset
+    params[:, 3] -= axes[:, 0, :3] @ offset / scales[:, 0]
+    params[:, 7] -= axes[:, 1, :3] @ offset / scales[:, 1]
+    moved.texture_param_ids = array('i', [moved.texture_param_index(tuple(row)) for row in params.tolist()])
+    return moved
+
+
+def write_instanced_vmf(map_data, vmf_filepath, compress=False, timings=None, texture_sizes=None, **vmf_options):
+    """
+    Writes map_data with the brush clusters it repeats (see instancing.py) as prefabs:
+    one prefab VMF per repeated structure under PREFABS_FOLDER/<map name>/ next to vmf_filepath,
+    placed with a func_instance at every occurrence in the master map at vmf_filepath, which keeps
+    all other brushes. Prefab files left over from an earlier run of the same map are removed first.
+    Takes the same options as write_vmf. texture_sizes maps texture names to (width, height); with
+    it, copies whose textures are shifted by whole repeats are found too, without it their texture
+    offsets must match exactly. With entities=True only world brushes are instanced.
+    Returns (prefab_filepaths, stats): stats counts the 'brushes' of the map, the 'instanced' ones,
+    the 'prefabs' and 'instances' written and the brushes 'written' in all files, and holds the
+    dedup 'ratio' of brushes to brushes written.
+    """
+    maps_dir = os.path.dirname(vmf_filepath)
+    map_name = os.path.basename(vmf_filepath).split('.', 1)[0]
+    extension = ".vmf.gz" if compress else ".vmf"
+    prefab_dir = _prefab_folder(vmf_filepath)
+    scale = vmf_options.get('scale', SCALE_FACTOR)
+    axis_map = vmf_options.get('axis_map', AXIS_MAP)
+    matrix = vmf_options.get('matrix')
+
+    if vmf_options.get('entities'):
+        world_brushes, _ = convert_entities(map_data, scale, axis_map, matrix)
+        world_brushes = np.sort(np.asarray(world_brushes, dtype=np.intp))
+    else:
+        world_brushes = np.arange(len(map_data))
+    world = map_data.select_brushes(world_brushes)
+    texture_ids = np.frombuffer(world.texture_ids, dtype=np.int32)
+    sizes = None
+    if texture_sizes:
+        sizes = np.array([texture_sizes.get(texture.lower(), (0, 0)) for texture in world.textures] + [(0, 0)],
+                         dtype=np.float64)[texture_ids]
+    groups = find_instances(world.planes, world.brush_offsets, texture_ids,
+                            *quake_texture_axes(world.planes, world.texture_params()), sizes)
+
+    prefab_options = dict(vmf_options, entities=False, entity_report=None)
+    instanced = np.zeros(len(world), dtype=bool)
+    prefab_filepaths = []
+    instances = []
+    for number, group in enumerate(groups, 1):
+        for brushes in group['brushes']:
+            instanced[brushes] = True
+        prefab_filepath = os.path.join(prefab_dir, f"{map_name}_instance_{number}{extension}")
+        # The prefab holds the first occurrence, moved so that its origin is the prefab's
+        prefab = translate_brushes(world.select_brushes(group['brushes'][0]), -group['origins'][0])
+        write_vmf(prefab, prefab_filepath, compress, timings, prefab=True, **prefab_options)
+        prefab_filepaths.append(prefab_filepath)
+        relative_filepath = os.path.relpath(prefab_filepath, maps_dir)
+        instances.extend((relative_filepath, origin)
+                         for origin in transform_points(group['origins'], scale, axis_map, matrix).tolist())
+    kept = np.setdiff1d(np.arange(len(map_data)), world_brushes[instanced])
+    write_vmf(map_data.select_brushes(kept), vmf_filepath, compress, timings, instances=instances, **vmf_options)
+
+    written = len(kept) + sum(len(group['brushes'][0]) for group in groups)
+    stats = {'brushes': len(map_data), 'instanced': int(instanced.sum()), 'prefabs': len(groups),
+             'instances': len(instances), 'written': written, 'ratio': len(map_data) / written if written else 1.0}
+    return prefab_filepaths, stats
+
+
+# Seconds a single resourcecompiler run may take before it is killed (None waits forever).
+COMPILE_TIMEOUT = 60 * 60
+
+# How often collected compiler output is passed on to the log, in seconds.
+COMPILE_OUTPUT_FLUSH_INTERVAL = 0.1
+
+
+def _pump_pipe(pipe, prefix, output_queue):
+    """Reader thread body: forwards every line of a compiler pipe to output_queue, then None at EOF."""
+    try:
+        for line in iter(pipe.readline, ''):
+            output_queue.put(prefix + line.rstrip("\r\n"))
+    finally:
+        pipe.close()
+        output_queue.put(None)
+
+
+def run_resource_compiler(compiler_path, input_vmf_path, log=print, timeout=COMPILE_TIMEOUT, cancel_event=None, stats=None):
     """
     Runs the Half-Life: Alyx resourcecompiler.exe to compile a VMF file into a VMAP.
+    Progress messages are passed to log one line at a time; compiler output is passed on in batches
+    of lines every COMPILE_OUTPUT_FLUSH_INTERVAL seconds, stderr lines prefixed with [RC_ERROR].
+    stdout and stderr are drained by separate threads, so a compiler filling either pipe cannot stall.
+    The compiler is killed and False returned once timeout seconds pass or cancel_event
+    (a threading.Event) is set.
+    With a stats dict, the run is recorded in it: 'vmf', 'exit_code' (None if the compiler never
+    exited on its own), 'seconds', 'output_lines' and 'stop_reason' (None, or why it was killed).
     """
+    stats = {} if stats is None else stats
+    stats.update(vmf=input_vmf_path, exit_code=None, seconds=0.0, output_lines=0, stop_reason=None)
+    start = time.perf_counter()
     try:
         # The resourcecompiler expects the input path to be either absolute or relative
         # to the game's content root. Using absolute path for simplicity and robustness.
@@ -235,66 +1235,558 @@ def run_resource_compiler(compiler_path, input_vmf_path, console_widget):
         # CWD remains the compiler's bin directory
         subprocess_cwd = compiler_bin_dir
         
-        console_widget.insert(tk.END, f"\n  Attempting to run resourcecompiler with VPROJECT='{env['VPROJECT']}' and CWD='{subprocess_cwd}'\n")
-        console_widget.insert(tk.END, f"  Command: {' '.join(command)}\n")
-        console_widget.see(tk.END)
+        log(f"\n  Attempting to run resourcecompiler with VPROJECT='{env['VPROJECT']}' and CWD='{subprocess_cwd}'")
+        log(f"  Command: {' '.join(command)}")
 
         process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, encoding='utf-8', errors='replace', env=env, cwd=subprocess_cwd)
         
-        # Read stdout and stderr line by line to update the console in real-time
-        for line in iter(process.stdout.readline, ''):
-            console_widget.insert(tk.END, line)
-            console_widget.see(tk.END)
-            console_widget.update_idletasks()
-        for line in iter(process.stderr.readline, ''):
-            console_widget.insert(tk.END, f"[RC_ERROR] {line}") # Prefix stderr for clarity
-            console_widget.see(tk.END)
-            console_widget.update_idletasks()
+        # Drain stdout and stderr on their own threads; this thread batches what they read into the log
+        output_queue = queue.Queue()
+        readers = [threading.Thread(target=_pump_pipe, args=(process.stdout, "", output_queue), daemon=True),
+                   threading.Thread(target=_pump_pipe, args=(process.stderr, "[RC_ERROR] ", output_queue), daemon=True)] # Prefix stderr for clarity
+        for reader in readers:
+            reader.start()
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        open_pipes = len(readers)
+        stop_reason = None
+        while open_pipes:
+            batch = []
+            try:
+                item = output_queue.get(timeout=COMPILE_OUTPUT_FLUSH_INTERVAL)
+                while True:
+                    if item is None:
+                        open_pipes -= 1
+                    else:
+                        batch.append(item)
+                    item = output_queue.get_nowait()
+            except queue.Empty:
+                pass
+            if batch:
+                stats['output_lines'] += len(batch)
+                log("\n".join(batch))
+            if cancel_event is not None and cancel_event.is_set():
+                stop_reason = "cancelled"
+            elif deadline is not None and time.monotonic() > deadline:
+                stop_reason = f"timed out after {timeout:g} seconds"
+            if stop_reason:
+                process.kill()
+                break
 
         process.wait() # Wait for the process to complete
+        stats['stop_reason'] = stop_reason
+        if stop_reason:
+            # The pipes close once the process is gone; give the readers a moment to finish
+            for reader in readers:
+                reader.join(timeout=1.0)
+            log(f"[ERROR] resourcecompiler {stop_reason}; killed it.")
+            return False
 
+        stats['exit_code'] = process.returncode
         if process.returncode != 0:
-            console_widget.insert(tk.END, f"[ERROR] resourcecompiler exited with code {process.returncode}\n")
+            log(f"[ERROR] resourcecompiler exited with code {process.returncode}")
             return False
         else:
-            console_widget.insert(tk.END, "resourcecompiler finished successfully.\n")
+            log("resourcecompiler finished successfully.")
             return True
     except FileNotFoundError:
-        console_widget.insert(tk.END, f"[ERROR] resourcecompiler.exe not found at '{compiler_path}'. Please check the path.\n")
+        log(f"[ERROR] resourcecompiler.exe not found at '{compiler_path}'. Please check the path.")
         return False
     except subprocess.CalledProcessError as e:
-        console_widget.insert(tk.END, f"[ERROR] resourcecompiler command failed: {e}\n")
-        console_widget.insert(tk.END, f"Stdout: {e.stdout}\nStderr: {e.stderr}\n")
+        log(f"[ERROR] resourcecompiler command failed: {e}")
+        log(f"Stdout: {e.stdout}\nStderr: {e.stderr}")
         return False
     except Exception as e:
-        console_widget.insert(tk.END, f"[ERROR] An unexpected error occurred while running resourcecompiler: {e}\n")
+        log(f"[ERROR] An unexpected error occurred while running resourcecompiler: {e}")
         return False
+    finally:
+        stats['seconds'] = time.perf_counter() - start
+
+
+# Bump whenever the generated VMFs change for the same input, so cached outputs get rebuilt.
+CONVERTER_VERSION = "7"
+
+# Build cache kept in the addon output folder (see BuildCache)
+BUILD_CACHE_FILENAME = ".vmapconverter_cache.json"
+
+# Per-map stage timings and counters of the last convert_folder run, kept in the addon output folder
+REPORT_FILENAME = "conversion_report.json"
+
+# Stages in the order they run; the ones that did not run for a map are left out of its timings.
+REPORT_STAGES = ('parse', 'check', 'optimize', 'generate', 'io', 'validate', 'compile')
+
+
+def hash_file(filepath, chunk_size=PARSE_CHUNK_SIZE):
+    """Returns the SHA-256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
 
 
-def convert_folder(input_folder, output_base_folder, resource_compiler_path, console_widget):
+def _file_signature(filepath):
+    """Returns [size, mtime_ns] of a file, or None if it doesn't exist."""
+    try:
+        stat = os.stat(filepath)
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+class BuildCache:
+    """
+    Remembers what the last conversions produced, so unchanged maps skip both the VMF and the compile stage.
+    Each map is keyed by its absolute path and records the SHA-256 of the .map, a fingerprint of the
+    converter settings and version, and the size and mtime of the .vmf written for it (plus the same
+    for the last .vmf resourcecompiler accepted). An input, setting or output change invalidates the entry,
+    as does a missing region or prefab VMF of a partitioned or instanced map.
+    """
+    def __init__(self, cache_filepath, settings):
+        self.cache_filepath = cache_filepath
+        # Settings are part of every entry, so e.g. a new scale rebuilds every map
+        self.settings_hash = hashlib.sha256(json.dumps(
+            dict(settings, converter_version=CONVERTER_VERSION), sort_keys=True, default=str).encode('utf-8')).hexdigest()
+        self.entries = {}
+        self.lock = threading.Lock()  # Compiles record their results from a worker thread
+        try:
+            with open(cache_filepath, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('converter_version') == CONVERTER_VERSION:
+                self.entries = data.get('maps', {})
+        except (OSError, ValueError):
+            pass  # No cache yet, or unreadable: every map gets rebuilt
+
+    def lookup(self, map_filepath, map_hash, vmf_filepath):
+        """Returns the cache entry for a map if its VMF is still up to date, else None."""
+        entry = self.entries.get(os.path.abspath(map_filepath))
+        if (entry and entry['map_hash'] == map_hash and entry['settings_hash'] == self.settings_hash
+                and entry['vmf'] == os.path.abspath(vmf_filepath)
+                and entry['vmf_signature'] == _file_signature(vmf_filepath)
+                and all(os.path.isfile(prefab_filepath)
+                        for prefab_filepath in (entry.get('regions') or []) + (entry.get('prefabs') or []))):
+            return entry
+        return None
+
+    def record_vmf(self, map_filepath, map_hash, result):
+        """Records a freshly written VMF. A failed conversion just drops the map's entry."""
+        key = os.path.abspath(map_filepath)
+        with self.lock:
+            if result['error'] or not result['brushes']:
+                self.entries.pop(key, None)
+                return
+            self.entries[key] = {
+                'map_hash': map_hash,
+                'settings_hash': self.settings_hash,
+                'vmf': os.path.abspath(result['vmf']),
+                'vmf_signature': _file_signature(result['vmf']),
+                'brushes': result['brushes'],
+                'faces': result['faces'],
+                'textures': result.get('textures', []),
+                'wad': result.get('wad', ''),
+                'regions': result.get('regions'),
+                'prefabs': result.get('prefabs'),
+                'instanced': result.get('instanced'),
+                'bytes_written': result.get('bytes_written', 0),
+                'compiled_signature': None,
+            }
+
+    def is_compiled(self, map_filepath):
+        """True if resourcecompiler already succeeded on the map's current VMF."""
+        entry = self.entries.get(os.path.abspath(map_filepath))
+        return bool(entry and entry['compiled_signature'] and entry['compiled_signature'] == entry['vmf_signature'])
+
+    def record_compile(self, map_filepath, succeeded):
+        with self.lock:
+            entry = self.entries.get(os.path.abspath(map_filepath))
+            if entry:
+                entry['compiled_signature'] = entry['vmf_signature'] if succeeded else None
+
+    def save(self):
+        """Writes the cache next to the outputs, replacing the old file in one step."""
+        with self.lock:
+            data = {'converter_version': CONVERTER_VERSION, 'maps': self.entries}
+            temp_filepath = self.cache_filepath + ".tmp"
+            with open(temp_filepath, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=1, sort_keys=True)
+            os.replace(temp_filepath, self.cache_filepath)
+
+
+def extract_map_textures(results, texture_folder, wad_dirs=(), log=print, palette_filepath=None):
+    """
+    Extracts the textures used by converted maps into texture_folder as PNGs, from the WADs named
+    by each map's worldspawn "wad" key. WADs are looked up as written, then by file name in wad_dirs
+    and the map's own folder. Images already extracted from an identical lump are kept.
+    The folder's texture size index (see textures.py) is refreshed afterwards.
+    results are convert_map_to_vmf result dicts. Returns the combined wad2.extract_textures summary,
+    plus the used textures that still have no image under 'without_image'.
+    """
+    summary = {'extracted': [], 'reused': [], 'missing': [], 'failed': []}
+    try:
+        palette = wad2.load_palette(palette_filepath) if palette_filepath else None
+    except (OSError, wad2.WadError) as e:
+        log(f"[ERROR] Could not read palette '{palette_filepath}': {e}")
+        return summary
+    # Maps listing the same WADs are extracted together; a texture is only taken from the first set using it
+    textures_by_wads = {}
+    handled = set()
+    without_wads = set()
+    for result in results:
+        if not result.get('textures'):
+            continue
+        wad_filepaths, missing_wads = wad2.resolve_wad_paths(result.get('wad', ''), list(wad_dirs) + [os.path.dirname(result['map'])])
+        for missing_wad in missing_wads:
+            log(f"Warning: WAD '{missing_wad}' listed by {os.path.basename(result['map'])} was not found.")
+        if not wad_filepaths:
+            without_wads.update(result['textures'])
+            continue
+        textures = [name for name in result['textures'] if name not in handled]
+        handled.update(textures)
+        textures_by_wads.setdefault(tuple(wad_filepaths), []).extend(textures)
+
+    summary['missing'].extend(sorted(without_wads - handled))
+    log(f"\nExtracting textures to '{texture_folder}'...")
+    for wad_filepaths, texture_names in textures_by_wads.items():
+        try:
+            wad_summary = wad2.extract_textures(wad_filepaths, texture_names, texture_folder, palette=palette,
+                                                palette_dirs=wad_dirs, workers=os.cpu_count() or 1)
+        except (OSError, wad2.WadError) as e:
+            log(f"[ERROR] Could not extract textures from {', '.join(wad_filepaths) or 'no WADs'}: {e}")
+            summary['missing'].extend(texture_names)
+            continue
+        for key in summary:
+            summary[key].extend(wad_summary[key])
+    for texture_name, error in summary['failed']:
+        log(f"[ERROR] Could not decode texture '{texture_name}': {error}")
+    if summary['missing']:
+        log(f"Warning: {len(summary['missing'])} textures were not found in any WAD: {', '.join(sorted(summary['missing']))}")
+    log(f"Textures: {len(summary['extracted'])} extracted, {len(summary['reused'])} unchanged, "
+        f"{len(summary['missing'])} missing, {len(summary['failed'])} failed.")
+
+    # Check against the images actually in the folder, which may also come from earlier or manual extractions
+    size_index = TextureSizeIndex(texture_folder)
+    used = set(name for result in results for name in result.get('textures', []))
+    without_image = sorted(name for name in used if name not in size_index)
+    log(f"Texture size index: {len(size_index)} images ({size_index.headers_read} headers read), "
+        f"{len(used) - len(without_image)} of {len(used)} used textures have one.")
+    if without_image:
+        log(f"Warning: no image for {', '.join(without_image)}")
+    summary['without_image'] = without_image
+    return summary
+
+
+def generate_map_materials(results, texture_folder, content_folder, material_prefix=MATERIAL_PREFIX, workers=1, log=print):
+    """
+    Writes a .vmat for every texture used by the converted maps, pointing at a copy of its image
+    from texture_folder under content_folder (see materials.write_materials). The texture set is
+    gathered across all results first, so textures shared by several maps are handled once.
+    results are convert_map_to_vmf result dicts. Returns the write_materials summary.
+    """
+    used = set(name for result in results for name in result.get('textures', []))
+    log(f"\nWriting materials for {len(used)} textures to '{content_folder}'...")
+    try:
+        summary = write_materials(used, texture_folder, content_folder, material_prefix, workers)
+    except OSError as e:
+        log(f"[ERROR] Could not write materials: {e}")
+        return None
+    for texture_name, error in summary['failed']:
+        log(f"[ERROR] Could not write the material for '{texture_name}': {error}")
+    if summary['without_image']:
+        log(f"Warning: no image in '{texture_folder}' for {', '.join(summary['without_image'])}; "
+            f"their materials were not written.")
+    images = summary['exported'] + summary['reused']
+    log(f"Materials: {len(summary['written'])} written, {len(summary['unchanged'])} unchanged, "
+        f"{len(summary['without_image'])} without image, {len(summary['failed'])} failed. "
+        f"Images: {images} distinct ({summary['exported']} copied, {summary['reused']} unchanged), "
+        f"{summary['shared']} textures share an identical image.")
+    return summary
+
+
+def convert_map_to_vmf(map_filepath, vmf_filepath, compress_vmf=False, vmf_options=None, check_brushes=False,
+                       optimize=False, partition_cell_size=None, profile_filepath=None, classnames=None,
+                       output_format='vmf', validate_vmap=False, instancing=False):
+    """
+    Parses one Quake .map file and writes its .vmf: the CPU-bound part of a conversion.
+    This is what the worker processes of convert_folder run, so everything it prints is captured
+    and handed back for the caller to report in order.
+    vmf_options are passed on to write_vmf.
+    With check_brushes=True every brush is also solved into face polygons (see winding.py) and the
+    ones that do not form a closed volume are reported; they are still written to the VMF.
+    With optimize=True world brushes are merged and hidden faces set to nodraw before writing
+    (see optimize.py); the counts in the result are still those of the parsed map.
+    With partition_cell_size the map is written as region prefabs plus a master map (see
+    write_partitioned_vmf) and the region paths are returned under 'regions'.
+    With profile_filepath the whole conversion runs under cProfile and the stats are dumped there.
+    classnames limits the conversion to the brushes of matching entities (see parse_quake_map).
+    With output_format='vmap' a Source 2 .vmap is written to vmf_filepath instead (see write_vmap),
+    read back and validated when validate_vmap is set; it cannot be partitioned or compressed.
+    With instancing=True the brush clusters the map repeats are written once as prefabs and placed with
+    instances (see write_instanced_vmf); the prefab paths are returned under 'prefabs' and the
+    stats, including the dedup ratio, under 'instanced'. It cannot be combined with partitioning.
+    Returns a result dict with the map and vmf paths, brush and face counts, the texture names used,
+    the worldspawn "wad" value, the captured log, the elapsed seconds and an error message
+    (None on success), plus the list of (brush_index, reason) pairs under 'dropped' and of
+    (brush_index, face_index, kept_face_index) faces repeating a plane under 'duplicate_faces' when brushes
+    were checked and the optimize_brushes stats under 'optimized' when optimizing.
+    'timings' holds the seconds of each stage that ran (parse, check, optimize, generate, io) and
+    'bytes_written' the size of the VMF files on disk. When vmf_options convert entities, the
+    convert_entities report is returned under 'entities'.
+    """
+    start = time.perf_counter()
+    result = {'map': map_filepath, 'vmf': vmf_filepath, 'brushes': 0, 'faces': 0, 'error': None, 'timings': {},
+              'bytes_written': 0}
+    timings = result['timings']
+    log = io.StringIO()
+    profiler = cProfile.Profile() if profile_filepath else None
+    with contextlib.redirect_stdout(log):
+        if profiler:
+            profiler.enable()
+        # brushes is a MapGeometry holding every brush's planes and texture indices
+        brushes = parse_quake_map(map_filepath, classnames)
+        timings['parse'] = time.perf_counter() - start
+        result['brushes'] = len(brushes)
+        result['faces'] = brushes.face_count
+        result['textures'] = list(brushes.textures)
+        result['wad'] = brushes.worldspawn.get('wad', '')
+        if brushes and check_brushes:
+            stage_start = time.perf_counter()
+            windings = build_windings(brushes.planes, brushes.brush_offsets)
+            timings['check'] = time.perf_counter() - stage_start
+            result['dropped'] = windings.dropped
+            if windings.dropped:
+                print(f"Found {len(windings.dropped)} invalid brushes (brush index: reason):")
+                for brush_index, reason in windings.dropped:
+                    print(f"  {brush_index}: {reason}")
+            else:
+                print(f"All {len(brushes)} brushes form closed volumes.")
+            result['duplicate_faces'] = windings.duplicates
+            if windings.duplicates:
+                print(f"Found {len(windings.duplicates)} faces repeating a plane of their brush; only the first is kept "
+                      f"(brush index: face index = kept face index):")
+                for brush_index, face_index, kept_face_index in windings.duplicates:
+                    print(f"  {brush_index}: {face_index} = {kept_face_index}")
+        if brushes and optimize:
+            stage_start = time.perf_counter()
+            brushes, stats = optimize_brushes(brushes)
+            timings['optimize'] = time.perf_counter() - stage_start
+            result['optimized'] = stats
+            before, after = stats['before'], stats['after']
+            print(f"Optimized: {before['solids']} -> {after['solids']} solids ({stats['merged']} merged), "
+                  f"{before['faces']} -> {after['faces']} faces, {stats['nodraw']} hidden faces set to nodraw.")
+        if brushes:
+            vmf_options = dict(vmf_options or {})
+            if vmf_options.get('entities'):
+                result['entities'] = vmf_options['entity_report'] = {}
+            try:
+                if output_format == 'vmap':
+                    if partition_cell_size or compress_vmf or instancing:
+                        raise ValueError(".vmap output cannot be partitioned, instanced or compressed")
+                    write_vmap(brushes, vmf_filepath, timings, validate_vmap, **vmf_options)
+                elif instancing:
+                    if partition_cell_size:
+                        raise ValueError("an instanced map cannot be partitioned")
+                    result['prefabs'], stats = write_instanced_vmf(brushes, vmf_filepath, compress_vmf, timings,
+                                                                   **vmf_options)
+                    result['instanced'] = stats
+                    print(f"Instanced {stats['instanced']} of {stats['brushes']} brushes as {stats['prefabs']} prefabs "
+                          f"placed {stats['instances']} times: {stats['written']} brushes written, "
+                          f"dedup ratio {stats['ratio']:.3f}.")
+                elif partition_cell_size:
+                    result['regions'] = write_partitioned_vmf(brushes, vmf_filepath, partition_cell_size, compress_vmf,
+                                                              timings, **vmf_options)
+                    print(f"Split into {len(result['regions'])} regions of {partition_cell_size:g} units.")
+                else:
+                    write_vmf(brushes, vmf_filepath, compress_vmf, timings, **vmf_options)
+                if 'entities' in result:
+                    report = result['entities']
+                    print(f"Converted {sum(report['converted'].values())} entities, skipped "
+                          f"{sum(report['skipped'].values())} without an Alyx counterpart.")
+                    if report['not_in_fgd']:
+                        print(f"  Not defined by the FGD: {', '.join(report['not_in_fgd'])}")
+                result['bytes_written'] = sum(os.path.getsize(path) for path in
+                                              [vmf_filepath] + result.get('regions', []) + result.get('prefabs', []))
+            except IOError as e:
+                result['error'] = f"Could not write .{output_format} file '{vmf_filepath}': {e}"
+            except vmap.VmapError as e:
+                result['error'] = f"Validation of '{vmf_filepath}' failed: {e}"
+            except Exception as e:
+                result['error'] = f"An unexpected error occurred during VMF generation for {os.path.basename(vmf_filepath)}: {e}"
+        if profiler:
+            profiler.disable()
+            try:
+                profiler.dump_stats(profile_filepath)
+                print(f"Profile written to {profile_filepath}")
+            except OSError as e:
+                print(f"[ERROR] Could not write profile '{profile_filepath}': {e}")
+    result['log'] = log.getvalue()
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+
+def _result_status(result):
+    """Returns the (vmf, compile) status words of a convert_folder result."""
+    vmf_status = 'cached' if result.get('cached') else 'failed' if result['error'] else ('ok' if result['brushes'] else 'empty')
+    compile_status = 'cached' if result.get('compile_cached') else {True: 'ok', False: 'failed', None: 'skipped'}[result.get('compiled')]
+    return vmf_status, compile_status
+
+
+def format_summary_table(results):
+    """Returns the lines of a table with the counters and stage seconds of every map, plus totals."""
+    stage_columns = [stage for stage in REPORT_STAGES if any(stage in result.get('timings', {}) for result in results)]
+    lines = [f"{'map':<20}{'brushes':>8}{'faces':>8}{'tex':>5}" + "".join(f"{stage + ' s':>11}" for stage in stage_columns)
+             + f"{'MB':>8}  {'vmf':<8}{'compile':<8}"]
+    totals = dict.fromkeys(stage_columns, 0.0)
+    for result in results:
+        timings = result.get('timings', {})
+        for stage in stage_columns:
+            totals[stage] += timings.get(stage, 0.0)
+        vmf_status, compile_status = _result_status(result)
+        lines.append(f"{os.path.basename(result['map']):<20}{result['brushes']:>8}{result['faces']:>8}"
+                     f"{len(result.get('textures', [])):>5}"
+                     + "".join(f"{timings[stage]:>11.3f}" if stage in timings else f"{'-':>11}" for stage in stage_columns)
+                     + f"{result.get('bytes_written', 0) / 1e6:>8.2f}  {vmf_status:<8}{compile_status:<8}")
+    lines.append(f"{'total':<20}{sum(result['brushes'] for result in results):>8}{sum(result['faces'] for result in results):>8}"
+                 f"{'':>5}" + "".join(f"{totals[stage]:>11.3f}" for stage in stage_columns)
+                 + f"{sum(result.get('bytes_written', 0) for result in results) / 1e6:>8.2f}")
+    return lines
+
+
+def write_conversion_report(results, report_filepath, settings=None, seconds=None, merge=False):
+    """
+    Writes the per-map timings and counters of a convert_folder run as JSON: brush, face and unique
+    texture counts, bytes written, the seconds of every stage that ran, the statuses and the
+    resourcecompiler stats (exit code, duration, output lines) of every compile, plus the
+    settings used and the run's total wall-clock seconds.
+    With merge=True (a run that rebuilt only some maps) the maps of the existing report that were
+    not rebuilt are kept, as long as it was written by the same converter version and settings and
+    the map still exists; the stage totals then cover all maps.
+    """
+    maps = []
+    for result in results:
+        vmf_status, compile_status = _result_status(result)
+        maps.append({
+            'map': result['map'],
+            'vmf': result['vmf'],
+            'vmf_status': vmf_status,
+            'compile_status': compile_status,
+            'error': result['error'],
+            'brushes': result['brushes'],
+            'faces': result['faces'],
+            'unique_textures': len(result.get('textures', [])),
+            'bytes_written': result.get('bytes_written', 0),
+            'regions': len(result.get('regions') or ()),
+            'prefabs': len(result.get('prefabs') or ()),
+            'seconds': result['seconds'],
+            'timings': result.get('timings', {}),
+            'compiles': result.get('compiles', []),
+            'optimized': result.get('optimized'),
+            'instanced': result.get('instanced'),
+        })
+    if merge:
+        try:
+            with open(report_filepath, 'r', encoding='utf-8') as f:
+                previous = json.load(f)
+        except (OSError, ValueError):
+            previous = {}
+        same_run_setup = (previous.get('converter_version') == CONVERTER_VERSION
+                          and previous.get('settings') == json.loads(json.dumps(settings or {}, default=str)))
+        if same_run_setup:
+            rebuilt = {entry['map']: entry for entry in maps}
+            merged = []
+            for entry in previous.get('maps', []):
+                if entry['map'] in rebuilt:
+                    merged.append(rebuilt.pop(entry['map']))
+                elif os.path.isfile(entry['map']):
+                    merged.append(entry)
+            maps = merged + list(rebuilt.values())
+    totals = {stage: sum(entry['timings'].get(stage, 0.0) for entry in maps) for stage in REPORT_STAGES}
+    report = {'converter_version': CONVERTER_VERSION, 'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+              'settings': settings or {}, 'seconds': seconds, 'stage_totals': totals, 'maps': maps}
+    temp_filepath = report_filepath + ".tmp"
+    with open(temp_filepath, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=1, default=str)
+    os.replace(temp_filepath, report_filepath)
+
+
+def _load_entity_schema(fgd_filepath, log=print):
+    """Loads the FgdSchema of an FGD, logging what was loaded. Returns None if the FGD cannot be read."""
+    try:
+        entity_schema = FgdSchema.load(fgd_filepath)
+    except OSError as e:
+        log(f"Warning: Could not read FGD '{fgd_filepath}' ({e}); entities are converted without validation.")
+        return None
+    log(f"Loaded {len(entity_schema)} entity classes from {fgd_filepath}{' (cached)' if entity_schema.from_cache else ''}.")
+    for missing_include in entity_schema.missing_includes:
+        log(f"  Warning: included FGD not found, its classes are not validated: {missing_include}")
+    return entity_schema
+
+
+def convert_folder(input_folder, output_base_folder, resource_compiler_path=None, log=print, compress_vmf=False, workers=1,
+                   vmf_options=None, force=False, compile_timeout=COMPILE_TIMEOUT, cancel_event=None, check_brushes=False,
+                   texture_folder=None, wad_dirs=(), palette_filepath=None, optimize=False, partition_cell_size=None,
+                   profile_folder=None, classnames=None, fgd_filepath=None, output_format='vmf', validate_vmap=False,
+                   map_filepaths=None, materials=False, instancing=False):
     """
     Orchestrates the conversion process:
     1. Parses Quake .map files.
     2. Generates Source 1 .vmf files (using original texture names).
     3. Uses resourcecompiler.exe to compile .vmf to .vmap.
-    Output messages are redirected to the provided console_widget.
+    Output messages are passed to log one line at a time (print by default; the GUI passes its console).
+    With resource_compiler_path=None only the VMFs are generated and step 3 is skipped.
+    With compress_vmf=True the VMFs are written as .vmf.gz and not compiled, since
+    resourcecompiler only reads plain .vmf files.
+    With workers > 1, steps 1 and 2 run in a pool of that many processes while resourcecompiler
+    works through the finished VMFs on a background thread. Maps are still reported in input order.
+    vmf_options (scale, axis_map, matrix, material_prefix, entities) are passed on to write_vmf.
+    When they convert entities, the FGD at fgd_filepath is loaded once (see FgdSchema.load) and
+    the converted entities are validated against it, unless vmf_options already hold an 'entity_schema'.
+    With map_filepaths only those .map files of the input folder are converted (see watch_folder).
+    check_brushes=True reports brushes that do not form a closed volume and optimize=True merges
+    brushes and culls hidden faces (see convert_map_to_vmf). classnames restricts every map to the
+    brushes of entities matching those fnmatch patterns, e.g. ['worldspawn'] or ['func_*'].
+    With partition_cell_size every map is split into region prefabs of that many Quake units plus
+    a master map; the regions are compiled on up to workers threads at once, then the master map.
+    With instancing=True the brushes and brush clusters every map repeats are written once as
+    prefabs placed with func_instance (see write_instanced_vmf) and compiled like regions; images
+    already in texture_folder give the texture sizes copies are compared with.
+    With texture_folder, the textures the maps use are extracted there from the WADs their
+    worldspawn lists (see extract_map_textures). With materials=True a .vmat is then written to the
+    addon's materials folder for every texture used across the maps, next to a copy of its image
+    from texture_folder (see generate_map_materials).
+    With output_format='vmap' every map is written as a Source 2 .vmap and compiled from that (see
+    write_vmap), validated after writing if validate_vmap is set; images already in texture_folder
+    give the texture sizes for its texture coordinates.
+    Maps whose input, settings and output are unchanged since the last run are skipped at both the
+    VMF and compile stages (see BuildCache); force=True rebuilds and recompiles everything.
+    Each resourcecompiler run is killed after compile_timeout seconds. Setting cancel_event (a
+    threading.Event) kills the running compile and stops before the next map.
+    Every map's stage timings and counters are logged as a summary table at the end and written to
+    REPORT_FILENAME in the addon folder (see write_conversion_report). With profile_folder, the VMF
+    stage of every converted map is profiled with cProfile into <map name>.prof there.
+    Returns the list of per-map result dicts (see convert_map_to_vmf), each with a 'compiled' entry
+    and, for compiled maps, the run_resource_compiler stats of every compile under 'compiles'.
     """
-    def print_to_console(s):
-        """Helper function to print messages to the GUI console and auto-scroll."""
-        console_widget.insert(tk.END, s + "\n")
-        console_widget.see(tk.END) # Auto-scroll to the end
-        console_widget.update_idletasks() # Force GUI update
-
+    run_start = time.perf_counter()
     if not os.path.exists(input_folder):
-        print_to_console(f"Error: Quake Maps Input folder '{input_folder}' does not exist. Please check the path.")
-        return
+        log(f"Error: Quake Maps Input folder '{input_folder}' does not exist. Please check the path.")
+        return []
+
+    if resource_compiler_path is not None and not os.path.exists(resource_compiler_path):
+        log(f"Error: resourcecompiler.exe not found at '{resource_compiler_path}'. Please check the path.")
+        return []
 
-    if not os.path.exists(resource_compiler_path):
-        print_to_console(f"Error: resourcecompiler.exe not found at '{resource_compiler_path}'. Please check the path.")
-        return
+    if output_format not in OUTPUT_FORMATS:
+        log(f"Error: unknown output format '{output_format}'; expected one of {', '.join(OUTPUT_FORMATS)}.")
+        return []
+    if output_format == 'vmap' and (compress_vmf or partition_cell_size or instancing):
+        log("Error: .vmap output cannot be compressed, partitioned or instanced.")
+        return []
+    if instancing and partition_cell_size:
+        log("Error: maps cannot be both partitioned and instanced.")
+        return []
 
     # Define the addon content structure: [output_base_folder]/quakeautomatedscriptport/[maps|materials]
-    # Note: 'materials' folder is still created for consistency, but no custom materials are generated by this script.
+    # The 'materials' folder stays empty unless materials are generated from texture_folder.
     addon_content_dir = os.path.join(output_base_folder, "quakeautomatedscriptport")
     maps_output_dir = os.path.join(addon_content_dir, "maps")
     materials_output_dir = os.path.join(addon_content_dir, "materials") 
@@ -302,264 +1794,503 @@ def convert_folder(input_folder, output_base_folder, resource_compiler_path, con
     # Create all necessary output directories, including the addon folder itself
     os.makedirs(addon_content_dir, exist_ok=True)
     os.makedirs(maps_output_dir, exist_ok=True)
-    os.makedirs(materials_output_dir, exist_ok=True) # Create materials dir, but it will be empty by this script
+    os.makedirs(materials_output_dir, exist_ok=True)
 
     map_files_found = False
 
-    print_to_console(f"\n--- Starting Map Conversion Process ---")
-    print_to_console(f"Scanning input folder: '{input_folder}' for .map files...")
+    log(f"\n--- Starting Map Conversion Process ---")
+    log(f"Scanning input folder: '{input_folder}' for .map files...")
     map_files_to_process = []
     # Walk through the input folder to find all .map files
     for root, dirs, files in os.walk(input_folder):
         for file in files:
             if file.lower().endswith(".map"):
                 map_files_to_process.append(os.path.join(root, file))
+    if map_filepaths is not None:
+        selected = set(os.path.abspath(map_filepath) for map_filepath in map_filepaths)
+        map_files_to_process = [map_filepath for map_filepath in map_files_to_process
+                                if os.path.abspath(map_filepath) in selected]
 
     if not map_files_to_process:
-        print_to_console(f"No .map files found in '{input_folder}' or its subdirectories. Nothing to convert.")
-        return
+        log(f"No .map files found in '{input_folder}' or its subdirectories. Nothing to convert.")
+        return []
 
-    print_to_console(f"Found {len(map_files_to_process)} .map files to convert:")
+    log(f"Found {len(map_files_to_process)} .map files to convert:")
+    output_label = "Source 2 .vmap" if output_format == 'vmap' else "Source 1 .vmf"
+    jobs = []
     for map_filepath in map_files_to_process:
-        print_to_console(f"- {map_filepath}")
+        log(f"- {map_filepath}")
         map_files_found = True
         map_name = os.path.splitext(os.path.basename(map_filepath))[0]
         # Construct the .vmf file path within the 'maps' subdirectory
-        vmf_filepath = os.path.join(maps_output_dir, f"{map_name}.vmf")
-
-        print_to_console(f"\nProcessing Quake map: {map_filepath}...")
-        # brushes now contains 'plane' and 'texture' data
-        brushes = parse_quake_map(map_filepath) 
-
-        if brushes:
-            vmf_content = generate_vmf_content(brushes)
-            try:
-                with open(vmf_filepath, 'w') as f:
-                    f.write(vmf_content)
-                print_to_console(f"Generated Source 1 .vmf file: {vmf_filepath}")
-                
-                # --- Run resourcecompiler on the generated VMF ---
-                print_to_console(f"Attempting to compile {map_name}.vmf using resourcecompiler...")
-                if run_resource_compiler(resource_compiler_path, vmf_filepath, console_widget):
-                    print_to_console(f"Successfully compiled {map_name}.vmf to .vmap_c.")
-                else:
-                    print_to_console(f"[ERROR] Failed to compile {map_name}.vmf. Please review resourcecompiler output above for details.")
-
-            except IOError as e:
-                print_to_console(f"[ERROR] Could not write .vmf file '{vmf_filepath}': {e}")
-            except Exception as e:
-                print_to_console(f"[ERROR] An unexpected error occurred during VMF generation or compilation for {map_name}.vmf: {e}")
+        extension = ".vmap" if output_format == 'vmap' else ".vmf.gz" if compress_vmf else ".vmf"
+        vmf_filepath = os.path.join(maps_output_dir, map_name + extension)
+        jobs.append((map_filepath, vmf_filepath))
+
+    vmf_options = dict(vmf_options or {})
+    entity_schema = vmf_options.get('entity_schema')
+    if vmf_options.get('entities') and fgd_filepath and entity_schema is None:
+        entity_schema = _load_entity_schema(fgd_filepath, log)
+        if entity_schema is not None:
+            vmf_options['entity_schema'] = entity_schema
+    if (output_format == 'vmap' or instancing) and texture_folder and os.path.isdir(texture_folder):
+        vmf_options['texture_sizes'] = TextureSizeIndex(texture_folder).sizes
+    elif instancing:
+        log("Note: no texture folder with images, so repeated brushes are only instanced where their texture offsets match exactly.")
+    settings = {
+        'scale': vmf_options.get('scale', SCALE_FACTOR),
+        'axis_map': list(vmf_options.get('axis_map', AXIS_MAP)),
+        'matrix': np.asarray(vmf_options['matrix']).tolist() if vmf_options.get('matrix') is not None else None,
+        'material_prefix': vmf_options.get('material_prefix', MATERIAL_PREFIX),
+        'compress_vmf': compress_vmf,
+        'optimize': optimize,
+        'partition_cell_size': partition_cell_size,
+        'classnames': sorted(classnames) if classnames else None,
+        'entities': bool(vmf_options.get('entities')),
+        'fgd': entity_schema.sources if entity_schema else None,
+        'output_format': output_format,
+        'texture_sizes': sorted(vmf_options['texture_sizes'].items()) if vmf_options.get('texture_sizes') else None,
+        'instancing': instancing,
+        # Not part of the output, but the brush report is only printed while a map is converted
+        'check_brushes': check_brushes,
+    }
+    build_cache = BuildCache(os.path.join(addon_content_dir, BUILD_CACHE_FILENAME), settings)
+    map_hashes = {}
+    cached_results = {}
+    for map_filepath, vmf_filepath in jobs:
+        map_hashes[map_filepath] = hash_file(map_filepath)
+        entry = None if force else build_cache.lookup(map_filepath, map_hashes[map_filepath], vmf_filepath)
+        if entry:
+            cached_results[map_filepath] = {'map': map_filepath, 'vmf': vmf_filepath, 'brushes': entry['brushes'],
+                                            'faces': entry['faces'], 'textures': entry.get('textures', []),
+                                            'wad': entry.get('wad', ''), 'log': '', 'seconds': 0.0, 'error': None,
+                                            'timings': {}, 'bytes_written': entry.get('bytes_written', 0), 'cached': True}
+            for key in ('regions', 'prefabs', 'instanced'):
+                if entry.get(key) is not None:
+                    cached_results[map_filepath][key] = entry[key]
+    pending_jobs = [job for job in jobs if job[0] not in cached_results]
+
+    def report_vmf(result):
+        """Prints what happened while parsing a map and writing its VMF. Returns True if the VMF is ready to compile."""
+        result['compiled'] = None
+        if result.get('cached'):
+            log(f"\nSkipping Quake map: {result['map']} (unchanged since the last build, {result['vmf']} is up to date).")
         else:
-            print_to_console(f"No brushes found in {map_filepath}. Skipping .vmf generation and compilation.")
-
-    if not map_files_found:
-        print_to_console(f"No .map files were processed. Please ensure your input folder contains .map files.")
-        return
-
-    print_to_console("\n--- Conversion process completed. ---")
-    print_to_console(f"Output files are located in: {addon_content_dir}")
-    print_to_console("\nIMPORTANT NOTES FOR HALF-LIFE: ALYX:")
-    print_to_console(f"1. Copy the entire '{os.path.basename(addon_content_dir)}' folder (located at '{addon_content_dir}')")
-    print_to_console("   into your Half-Life: Alyx addon's 'content' directory.")
-    print_to_console("   Example: `Half-Life Alyx/game/hlvr_addons/my_addon_name/content/`")
-    print_to_console("2. This script provides a simplified conversion of Quake map geometry. Complex geometry (e.g., curved surfaces, precise UVs, advanced entities) are not fully handled.")
-    print_to_console("3. Quake uses a Z-up coordinate system, while Source 2 typically uses Y-up. The script attempts to convert (X,Y,Z) to (X,Z,-Y). You might still need to adjust the map's orientation in Hammer after import.")
-    print_to_console("4. **Material Assignment:** The generated VMFs will now include the original Quake texture names (e.g., 'WALL_TEX'). You will need to manually create corresponding Source 2 materials (`.vmat` files) in Hammer and apply them to the brushes. The `materials/` folder in the output will be empty by this script.")
-    print_to_console("5. The resourcecompiler.exe has converted the generated .vmf files to .vmap_c.")
-    print_to_console("6. For best results, you may need to manually adjust materials, brush geometry, and add entities in Half-Life: Alyx's Hammer editor.")
-
-
-class QuakeVmapConverterApp:
-    def __init__(self, master):
-        self.master = master
-        master.title("Quake .map to Alyx .vmap Converter")
-
-        # Define dark theme colors for a modern look
-        self.bg_dark_gray = "#2B2B2B"
-        self.fg_light_gray = "#E0E0E0"
-        self.button_bg = "#4A4A4A"
-        self.button_fg = "#FFFFFF"
-        self.console_bg = "#1E1E1E"
-        self.console_text_color = "#BB86FC" # A shade of purple for console output
-
-        master.config(bg=self.bg_dark_gray)
-
-        # Use tk.StringVar for dynamic path updates in Entry widgets
-        script_dir = os.path.dirname(__file__)
-        self.input_folder_var = tk.StringVar(value=os.path.normpath(os.path.join(script_dir, "quake_maps_input")))
-        # Set the main output base folder to a generic 'alyx_output' in the script's directory.
-        # The 'quakeautomatedscriptport' folder will be created inside this.
-        self.output_folder_var = tk.StringVar(value=os.path.normpath(os.path.join(script_dir, "alyx_output")))
-        # New variable for resourcecompiler.exe path, pre-filled with the user-provided path
-        self.resource_compiler_path_var = tk.StringVar(value=os.path.normpath(r"F:\SteamLibrary\steamapps\common\Half-Life Alyx\game\bin\win64\resourcecompiler.exe"))
-
-
-        self.create_widgets()
-        self.setup_dummy_files() # Setup dummy files on app start for convenience
-
-    def create_widgets(self):
-        # Input Folder Selection
-        tk.Label(self.master, text="Quake Maps Input Folder:", bg=self.bg_dark_gray, fg=self.fg_light_gray).pack(pady=(10, 0))
-        input_frame = tk.Frame(self.master, bg=self.bg_dark_gray)
-        input_frame.pack(fill=tk.X, padx=10)
-        tk.Entry(input_frame, textvariable=self.input_folder_var, width=50, bg=self.button_bg, fg=self.button_fg, insertbackground=self.fg_light_gray).pack(side=tk.LEFT, fill=tk.X, expand=True)
-        tk.Button(input_frame, text="Browse", command=lambda: self.browse_folder(self.input_folder_var), bg=self.button_bg, fg=self.button_fg, activebackground=self.fg_light_gray, activeforeground=self.button_bg).pack(side=tk.RIGHT)
-
-        # Output Folder Selection
-        tk.Label(self.master, text="Alyx Addon Content Base Folder (e.g., alyx_output):", bg=self.bg_dark_gray, fg=self.fg_light_gray).pack(pady=(10, 0))
-        output_frame = tk.Frame(self.master, bg=self.bg_dark_gray)
-        output_frame.pack(fill=tk.X, padx=10)
-        tk.Entry(output_frame, textvariable=self.output_folder_var, width=50, bg=self.button_bg, fg=self.button_fg, insertbackground=self.fg_light_gray).pack(side=tk.LEFT, fill=tk.X, expand=True)
-        tk.Button(output_frame, text="Browse", command=lambda: self.browse_folder(self.output_folder_var), bg=self.button_bg, fg=self.button_fg, activebackground=self.fg_light_gray, activeforeground=self.button_bg).pack(side=tk.RIGHT)
-
-        # ResourceCompiler.exe Path Selection
-        tk.Label(self.master, text="resourcecompiler.exe Path:", bg=self.bg_dark_gray, fg=self.fg_light_gray).pack(pady=(10, 0))
-        compiler_frame = tk.Frame(self.master, bg=self.bg_dark_gray)
-        compiler_frame.pack(fill=tk.X, padx=10)
-        tk.Entry(compiler_frame, textvariable=self.resource_compiler_path_var, width=50, bg=self.button_bg, fg=self.button_fg, insertbackground=self.fg_light_gray).pack(side=tk.LEFT, fill=tk.X, expand=True)
-        tk.Button(compiler_frame, text="Browse", command=lambda: self.browse_file(self.resource_compiler_path_var), bg=self.button_bg, fg=self.button_fg, activebackground=self.fg_light_gray, activeforeground=self.button_bg).pack(side=tk.RIGHT)
-
-
-        # Frame for buttons
-        button_frame = tk.Frame(self.master, bg=self.bg_dark_gray)
-        button_frame.pack(pady=10)
-
-        self.compile_button = tk.Button(button_frame, text="Compile Maps", command=self.start_conversion_thread, bg=self.button_bg, fg=self.button_fg, activebackground=self.fg_light_gray, activeforeground=self.button_bg)
-        self.compile_button.pack(side=tk.LEFT, padx=5)
-
-        self.clear_button = tk.Button(button_frame, text="Clear Console", command=self.clear_console, bg=self.button_bg, fg=self.button_fg, activebackground=self.fg_light_gray, activeforeground=self.button_bg)
-        self.clear_button.pack(side=tk.LEFT, padx=5)
-
-        # Console output area
-        self.console_text = scrolledtext.ScrolledText(self.master, wrap=tk.WORD, height=25, width=80, state='disabled', bg=self.console_bg, fg=self.console_text_color, insertbackground=self.fg_light_gray)
-        self.console_text.pack(padx=10, pady=10, fill=tk.BOTH, expand=True)
-        # Apply tag for console text color (though fg already sets it, this is for consistency/future tags)
-        self.console_text.tag_config("console_output", foreground=self.console_text_color)
-
-
-        # Redirect stdout to the console_text widget
-        self.text_redirector = TextRedirector(self.console_text)
-        sys.stdout = self.text_redirector
-        sys.stderr = self.text_redirector # Also redirect stderr
-
-    def browse_folder(self, path_var):
-        """Opens a file dialog to select a folder and updates the StringVar."""
-        folder_selected = filedialog.askdirectory()
-        if folder_selected:
-            path_var.set(os.path.normpath(folder_selected))
-
-    def browse_file(self, path_var):
-        """Opens a file dialog to select a file and updates the StringVar."""
-        file_selected = filedialog.askopenfilename(filetypes=[("Executable files", "*.exe")])
-        if file_selected:
-            path_var.set(os.path.normpath(file_selected))
-
-    def clear_console(self):
-        """Clears the text in the console output area."""
-        self.console_text.config(state='normal')
-        self.console_text.delete(1.0, tk.END)
-        self.console_text.config(state='disabled')
-
-    def start_conversion_thread(self):
-        """Starts the conversion process in a separate thread to keep the GUI responsive."""
-        self.clear_console()
-        self.compile_button.config(state='disabled') # Disable buttons during conversion
-        self.clear_button.config(state='disabled')
-
-        # Get current paths from entry widgets
-        input_folder = self.input_folder_var.get()
-        output_base_folder = self.output_folder_var.get()
-        resource_compiler_path = self.resource_compiler_path_var.get()
-
-        # Run conversion in a separate thread
-        self.conversion_thread = threading.Thread(target=self.run_conversion, args=(input_folder, output_base_folder, resource_compiler_path))
-        self.conversion_thread.start()
-        # Start checking thread status periodically to re-enable buttons
-        self.master.after(100, self.check_conversion_thread) 
-
-    def run_conversion(self, input_folder, output_base_folder, resource_compiler_path):
-        """Executes the map conversion logic."""
+            build_cache.record_vmf(result['map'], map_hashes[result['map']], result)
+            log(f"\nProcessing Quake map: {result['map']}...")
+            log(result['log'].rstrip("\n"))
+            if not result['brushes']:
+                log(f"No brushes found in {result['map']}. Skipping {output_label} generation and compilation.")
+                return False
+            if result['error']:
+                log(f"[ERROR] {result['error']}")
+                return False
+            log(f"Generated {output_label} file: {result['vmf']}")
+        if resource_compiler_path is None:
+            return False
+        if compress_vmf:
+            log(f"Skipping compilation of {os.path.basename(result['vmf'])}; resourcecompiler needs an uncompressed .vmf.")
+            return False
+        return True
+
+    def compile_vmf(result):
+        """Runs resourcecompiler on a generated VMF and records the outcome in result['compiled']."""
+        map_name = os.path.splitext(os.path.basename(result['vmf']))[0]
+        vmf_name = os.path.basename(result['vmf'])
+        if cancel_event is not None and cancel_event.is_set():
+            return
+        if not force and build_cache.is_compiled(result['map']):
+            log(f"{vmf_name} is unchanged since its last successful compile. Skipping resourcecompiler.")
+            result['compiled'] = True
+            result['compile_cached'] = True
+            return
+        compile_start = time.perf_counter()
+        result['compiles'] = []
         try:
-            convert_folder(input_folder, output_base_folder, resource_compiler_path, self.console_text)
-            messagebox.showinfo("Conversion Complete", "Map conversion process finished successfully!")
+            failed_regions = []
+            kind = 'regions' if result.get('regions') else 'prefabs'
+            if result.get(kind):
+                # Regions and instanced prefabs are independent: compile them side by side, then the master map that places them
+                log(f"Compiling {len(result[kind])} {kind} of {map_name} on up to {max(1, workers)} threads...")
+                region_stats = [{} for _ in result[kind]]
+                result['compiles'].extend(region_stats)
+                with ThreadPoolExecutor(max_workers=max(1, workers)) as region_pool:
+                    region_results = list(region_pool.map(
+                        lambda region_filepath, stats: run_resource_compiler(resource_compiler_path, region_filepath, log,
+                                                                             compile_timeout, cancel_event, stats),
+                        result[kind], region_stats))
+                failed_regions = [os.path.basename(region_filepath)
+                                  for region_filepath, compiled in zip(result[kind], region_results) if not compiled]
+            if failed_regions:
+                result['compiled'] = False
+                log(f"[ERROR] Failed to compile {kind} of {map_name}: {', '.join(failed_regions)}")
+            else:
+                # --- Run resourcecompiler on the generated VMF ---
+                log(f"Attempting to compile {vmf_name} using resourcecompiler...")
+                result['compiles'].append({})
+                result['compiled'] = run_resource_compiler(resource_compiler_path, result['vmf'], log, compile_timeout, cancel_event,
+                                                           result['compiles'][-1])
+                if result['compiled']:
+                    log(f"Successfully compiled {vmf_name} to .vmap_c.")
+                else:
+                    log(f"[ERROR] Failed to compile {vmf_name}. Please review resourcecompiler output above for details.")
         except Exception as e:
-            messagebox.showerror("Conversion Error", f"An unexpected error occurred during conversion: {e}")
-            print(f"[ERROR] Critical error during conversion: {e}")
-        finally:
-            # Re-enable buttons in the main thread after conversion finishes
-            self.master.after(0, self.enable_buttons)
-
-    def check_conversion_thread(self):
-        """Checks if the conversion thread is still alive and re-enables buttons when it finishes."""
-        if self.conversion_thread.is_alive():
-            self.master.after(100, self.check_conversion_thread) # Keep checking
-        else:
-            self.enable_buttons()
-
-    def enable_buttons(self):
-        """Re-enables the GUI buttons."""
-        self.compile_button.config(state='normal')
-        self.clear_button.config(state='normal')
+            result['compiled'] = False
+            log(f"[ERROR] An unexpected error occurred during compilation for {vmf_name}: {e}")
+        result.setdefault('timings', {})['compile'] = time.perf_counter() - compile_start
+        build_cache.record_compile(result['map'], result['compiled'])
+
+    if profile_folder:
+        os.makedirs(profile_folder, exist_ok=True)
+
+    def profile_filepath(map_filepath):
+        if not profile_folder:
+            return None
+        return os.path.join(profile_folder, os.path.splitext(os.path.basename(map_filepath))[0] + ".prof")
+
+    def vmf_results(vmf_pool):
+        """Yields the VMF stage result of every map in input order, converting the ones not cached."""
+        futures = {}
+        if vmf_pool:
+            for map_filepath, vmf_filepath in pending_jobs:
+                futures[map_filepath] = vmf_pool.submit(convert_map_to_vmf, map_filepath, vmf_filepath, compress_vmf, vmf_options,
+                                                         check_brushes, optimize, partition_cell_size,
+                                                         profile_filepath(map_filepath), classnames, output_format,
+                                                         validate_vmap, instancing)
+        for map_filepath, vmf_filepath in jobs:
+            if map_filepath in cached_results:
+                yield cached_results[map_filepath]
+            elif vmf_pool:
+                try:
+                    yield futures[map_filepath].result()
+                except Exception as e:
+                    yield {'map': map_filepath, 'vmf': vmf_filepath, 'brushes': 0, 'faces': 0, 'log': '',
+                           'seconds': 0.0, 'timings': {}, 'bytes_written': 0, 'error': f"Worker process failed: {e}"}
+            else:
+                yield convert_map_to_vmf(map_filepath, vmf_filepath, compress_vmf, vmf_options, check_brushes, optimize,
+                                         partition_cell_size, profile_filepath(map_filepath), classnames, output_format,
+                                         validate_vmap, instancing)
+
+    results = []
+    parallel = workers > 1 and len(pending_jobs) > 1
+    try:
+        with contextlib.ExitStack() as stack:
+            vmf_pool = compile_pool = None
+            if parallel:
+                log(f"\nConverting with {min(workers, len(pending_jobs))} worker processes...")
+                # Parsing and VMF generation run in worker processes; resourcecompiler runs one map at a
+                # time on a thread, overlapping with the maps still being converted.
+                vmf_pool = stack.enter_context(ProcessPoolExecutor(max_workers=min(workers, len(pending_jobs))))
+                # Runs before the pool's own exit, so maps not started yet are dropped when the run is cancelled
+                stack.callback(vmf_pool.shutdown, wait=True, cancel_futures=True)
+                compile_pool = stack.enter_context(ThreadPoolExecutor(max_workers=1))
+            compiles = []
+            for result in vmf_results(vmf_pool):
+                if cancel_event is not None and cancel_event.is_set():
+                    log("\nConversion cancelled. Remaining maps were not processed.")
+                    break
+                results.append(result)
+                if report_vmf(result):
+                    if compile_pool:
+                        compiles.append(compile_pool.submit(compile_vmf, result))
+                    else:
+                        compile_vmf(result)
+            if texture_folder and not (cancel_event is not None and cancel_event.is_set()):
+                # Runs while resourcecompiler may still be busy with the last maps
+                extract_map_textures(results, texture_folder, wad_dirs, log, palette_filepath)
+                if materials:
+                    generate_map_materials(results, texture_folder, addon_content_dir,
+                                           vmf_options.get('material_prefix', MATERIAL_PREFIX), workers, log)
+            for compile_future in compiles:
+                compile_future.result()
+    finally:
+        build_cache.save()
+
+    log("\n--- Summary ---")
+    for line in format_summary_table(results):
+        log(line)
+    report_filepath = os.path.join(addon_content_dir, REPORT_FILENAME)
+    try:
+        write_conversion_report(results, report_filepath, settings, time.perf_counter() - run_start,
+                                merge=map_filepaths is not None)
+        log(f"Timings and counters written to {report_filepath}")
+    except OSError as e:
+        log(f"[ERROR] Could not write the conversion report '{report_filepath}': {e}")
 
-    def setup_dummy_files(self):
-        """
-        Ensures input folder and dummy map exist for testing/initial setup.
-        """
-        # Ensure base directories exist
-        os.makedirs(self.input_folder_var.get(), exist_ok=True)
-
-        # Create sample map only if the input folder is empty
-        sample_map_path = os.path.join(self.input_folder_var.get(), "sample_map.map")
-        if not os.listdir(self.input_folder_var.get()): # Check if folder is empty
-            sample_map_content = """
-// My Sample Quake Map
-{
-    "classname" "worldspawn"
-    {
-        ( -128 -128 0 ) ( 128 -128 0 ) ( -128 128 0 ) WALL_TEX [ 1 0 0 0 ] [ 0 1 0 0 ] 0 1 1
-        ( -128 -128 128 ) ( -128 128 128 ) ( 128 -128 128 ) CEILING_TEX [ 1 0 0 0 ] [ 0 1 0 0 ] 0 1 1
-        ( -128 -128 0 ) ( -128 -128 128 ) ( -128 128 0 ) FLOOR_TEX [ 1 0 0 0 ] [ 0 1 0 0 ] 0 1 1
-        ( 128 -128 0 ) ( 128 128 0 ) ( 128 -128 128 ) BRICK_TEX [ 1 0 0 0 ] [ 0 1 0 0 ] 0 1 1
-        ( -128 128 0 ) ( 128 128 0 ) ( -128 128 128 ) {CLIP [ 1 0 0 0 ] [ 0 1 0 0 ] 0 1 1
-        ( -128 -128 0 ) ( -128 128 0 ) ( 128 -128 0 ) WATER_TEX [ 1 0 0 0 ] [ 0 1 0 0 ] 0 1 1
-    }
-    {
-        "classname" "light"
-        "origin" "0 0 64"
-        "light" "300"
-    }
-}
-"""
-            with open(sample_map_path, "w") as f:
-                f.write(sample_map_content)
-            print(f"Created a sample map file: {sample_map_path}")
-        else:
-            print(f"Input folder '{self.input_folder_var.get()}' is not empty. Skipping sample map creation.")
+    if not map_files_found:
+        log(f"No .map files were processed. Please ensure your input folder contains .map files.")
+        return results
+
+    log("\n--- Conversion process completed. ---")
+    log(f"Output files are located in: {addon_content_dir}")
+    if map_filepaths is not None:
+        return results  # A partial rebuild; the notes were shown with the full run
+    log("\nIMPORTANT NOTES FOR HALF-LIFE: ALYX:")
+    log(f"1. Copy the entire '{os.path.basename(addon_content_dir)}' folder (located at '{addon_content_dir}')")
+    log("   into your Half-Life: Alyx addon's 'content' directory.")
+    log("   Example: `Half-Life Alyx/game/hlvr_addons/my_addon_name/content/`")
+    log("2. This script provides a simplified conversion of Quake map geometry. Complex geometry (e.g., curved surfaces, advanced entities) are not fully handled.")
+    log("3. Quake uses a Z-up coordinate system, while Source 2 typically uses Y-up. The script attempts to convert (X,Y,Z) to (X,Z,-Y). You might still need to adjust the map's orientation in Hammer after import.")
+    if materials and texture_folder:
+        log("4. **Material Assignment:** The generated maps use the original Quake texture names (e.g., 'WALL_TEX'), and a `.vmat` was written to the `materials/` folder for every texture with an image. Textures without one still need a material made in Hammer.")
+    else:
+        log("4. **Material Assignment:** The generated VMFs will now include the original Quake texture names (e.g., 'WALL_TEX'). You will need to manually create corresponding Source 2 materials (`.vmat` files) in Hammer and apply them to the brushes. The `materials/` folder in the output will be empty by this script.")
+    if resource_compiler_path is None:
+        log("5. resourcecompiler.exe was not run. Compile the generated .vmf files to .vmap_c yourself, or rerun with a compiler path.")
+    else:
+        log("5. The resourcecompiler.exe has converted the generated .vmf files to .vmap_c.")
+    log("6. For best results, you may need to manually adjust materials, brush geometry, and add entities in Half-Life: Alyx's Hammer editor.")
+    return results
+
+
+# Seconds between two scans of a watched folder.
+WATCH_POLL_INTERVAL = 0.2
+
+# Seconds a changed .map file must stay unchanged before it is reconverted, so a burst of saves
+# (or a file still being written) gives one rebuild.
+WATCH_DEBOUNCE = 0.3
+
+
+def _map_file_signatures(input_folder):
+    """Returns {path: (size, mtime_ns)} of every .map file under input_folder."""
+    signatures = {}
+    for root, dirs, files in os.walk(input_folder):
+        for file in files:
+            if file.lower().endswith(".map"):
+                filepath = os.path.join(root, file)
+                try:
+                    stat = os.stat(filepath)
+                except OSError:
+                    continue  # Deleted while scanning
+                signatures[filepath] = (stat.st_size, stat.st_mtime_ns)
+    return signatures
 
 
-class TextRedirector:
-    """A class to redirect stdout and stderr to a Tkinter Text widget."""
-    def __init__(self, widget):
-        self.widget = widget
+def watch_folder(input_folder, output_base_folder, resource_compiler_path=None, log=print, poll_interval=WATCH_POLL_INTERVAL,
+                 debounce=WATCH_DEBOUNCE, stop_event=None, **options):
+    """
+    Converts input_folder once with convert_folder, then polls it for .map files that are added or
+    modified and reconverts just those, each once it has not changed for debounce seconds.
+    Everything stays in this process between rebuilds: the FGD schema is loaded once and maps are
+    converted in-process, so a save reaches the .vmf in well under a second for stock-sized maps.
+    options are passed on to convert_folder (force only applies to the first run).
+    Runs until stop_event (a threading.Event, also used to cancel a running rebuild) is set.
+    Returns the number of maps reconverted after the first run.
+    """
+    stop_event = stop_event or threading.Event()
+    vmf_options = dict(options.pop('vmf_options', None) or {})
+    if vmf_options.get('entities') and options.get('fgd_filepath') and 'entity_schema' not in vmf_options:
+        entity_schema = _load_entity_schema(options['fgd_filepath'], log)
+        if entity_schema is not None:
+            vmf_options['entity_schema'] = entity_schema
+    signatures = _map_file_signatures(input_folder)
+    convert_folder(input_folder, output_base_folder, resource_compiler_path, log, cancel_event=stop_event,
+                   vmf_options=vmf_options, **options)
+    options['force'] = False
+
+    log(f"\nWatching '{input_folder}' for changed .map files (polling every {poll_interval:g} s)...")
+    changed = {}  # Path -> (time the change was noticed, time it last changed)
+    rebuilt = 0
+    while not stop_event.wait(poll_interval):
+        now = time.monotonic()
+        current = _map_file_signatures(input_folder)
+        for map_filepath, signature in current.items():
+            if signatures.get(map_filepath) != signature:
+                changed[map_filepath] = (changed.get(map_filepath, (now,))[0], now)
+        for map_filepath in set(signatures) - set(current):
+            changed.pop(map_filepath, None)
+            log(f"{map_filepath} was removed; its output is kept.")
+        signatures = current
+        ready = sorted(map_filepath for map_filepath, (_, last_change) in changed.items() if now - last_change >= debounce)
+        if not ready:
+            continue
+        noticed = min(changed[map_filepath][0] for map_filepath in ready)
+        for map_filepath in ready:
+            del changed[map_filepath]
+        results = convert_folder(input_folder, output_base_folder, resource_compiler_path, log, cancel_event=stop_event,
+                                 vmf_options=vmf_options, map_filepaths=ready, **options)
+        rebuilt += len(results)
+        log(f"Rebuilt {', '.join(os.path.basename(map_filepath) for map_filepath in ready)} "
+            f"{time.monotonic() - noticed:.2f} s after the change was noticed.")
+    log("Stopped watching.")
+    return rebuilt
+
+
+# How often a console attached to a LogSink is refreshed, in seconds (30 frames per second).
+LOG_FLUSH_INTERVAL = 1 / 30
+
+# Most lines a LogSink keeps waiting for the console, and most lines a console shows.
+LOG_HISTORY_LINES = 5000
+
+
+class LogSink:
+    """
+    Thread-safe collector for log output that a console picks up on a timer instead of per write.
+    Use log as the convert_folder callback, or install the sink as sys.stdout; both may be called
+    from any thread. drain() hands out the complete lines collected since the last call. When the
+    console falls more than max_lines behind, the oldest waiting lines are dropped and counted.
+    With log_filepath everything written is also appended to that file, nothing dropped.
+    """
+    def __init__(self, max_lines=LOG_HISTORY_LINES, log_filepath=None):
+        self.max_lines = max_lines
+        self.lock = threading.Lock()
+        self.pending = collections.deque(maxlen=max_lines)
+        self.partial_line = ""
+        self.dropped = 0
+        self.log_file = open(log_filepath, "a", encoding="utf-8") if log_filepath else None
 
     def write(self, s):
-        # Schedule the update on the main Tkinter thread to prevent threading issues with Tkinter
-        self.widget.after(0, self._write_to_widget, s)
-
-    def _write_to_widget(self, s):
-        """Internal method to safely write text to the Tkinter Text widget."""
-        self.widget.config(state='normal') # Enable editing
-        self.widget.insert(tk.END, s, "console_output") # Apply tag for color
-        self.widget.see(tk.END) # Auto-scroll to the end
-        self.widget.config(state='disabled') # Disable editing
-        self.widget.update_idletasks() # Force GUI update immediately
+        """File-like write; text is split into lines, an unfinished last line waits for the rest."""
+        with self.lock:
+            if self.log_file:
+                self.log_file.write(s)
+            lines = (self.partial_line + s).split("\n")
+            self.partial_line = lines.pop()
+            self.dropped += max(0, len(self.pending) + len(lines) - self.max_lines)
+            self.pending.extend(lines)
+
+    def log(self, message):
+        """convert_folder log callback: one message, possibly several lines, without a trailing newline."""
+        self.write(message + "\n")
+
+    def drain(self):
+        """Returns (lines, dropped): the lines collected since the last drain and how many were lost."""
+        with self.lock:
+            lines = list(self.pending)
+            self.pending.clear()
+            dropped, self.dropped = self.dropped, 0
+        return lines, dropped
 
     def flush(self):
-        """Required for file-like object compatibility."""
-        pass 
+        """Flushes the log file; the console side is flushed by whoever calls drain()."""
+        with self.lock:
+            if self.log_file:
+                self.log_file.flush()
+
+    def close(self):
+        with self.lock:
+            if self.log_file:
+                self.log_file.close()
+                self.log_file = None
+
+
+def _parse_axis_map(value):
+    """argparse type for --axis-map: three comma-separated source axes such as 'x,z,-y'."""
+    axis_map = tuple(axis.strip() for axis in value.split(','))
+    if len(axis_map) != 3:
+        raise argparse.ArgumentTypeError(f"axis map '{value}' needs exactly three axes")
+    try:
+        _axis_permutation(axis_map)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+    return axis_map
+
+
+def main(argv=None):
+    """
+    Command line entry point: python -m vmapconverter INPUT OUTPUT [--compiler PATH] ...
+    Without arguments (or with --gui) the Tk converter window is opened instead.
+    Returns the process exit code: 1 if any map failed to convert or compile, 2 if nothing was converted.
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    parser = argparse.ArgumentParser(prog="vmapconverter", description="Convert Quake .map files to Source .vmf files and compile them with resourcecompiler.")
+    parser.add_argument("input_folder", nargs='?', help="folder searched recursively for .map files")
+    parser.add_argument("output_folder", nargs='?', help="addon content base folder; maps go to quakeautomatedscriptport/maps")
+    parser.add_argument("--compiler", metavar="PATH", help="path to resourcecompiler.exe; without it only the .vmf files are written")
+    parser.add_argument("--workers", type=int, default=1, help="number of processes converting maps side by side (default: 1)")
+    parser.add_argument("--force", action="store_true", help="ignore the build cache and reconvert/recompile every map")
+    parser.add_argument("--compile-timeout", type=float, default=COMPILE_TIMEOUT, metavar="SECONDS",
+                        help=f"kill a resourcecompiler run after this many seconds (default: {COMPILE_TIMEOUT})")
+    parser.add_argument("--check-brushes", action="store_true", help="solve brush polygons and report invalid brushes")
+    parser.add_argument("--optimize", action="store_true", help="merge world brushes and set hidden faces to nodraw")
+    parser.add_argument("--partition", type=float, nargs="?", const=REGION_CELL_SIZE, metavar="CELL_SIZE",
+                        help=f"split every map into grid regions of CELL_SIZE Quake units (default: {REGION_CELL_SIZE:g}), "
+                             "written as prefabs plus a master map and compiled in parallel")
+    parser.add_argument("--instance", action="store_true",
+                        help="write brush clusters a map repeats once as a prefab, placed with func_instance")
+    parser.add_argument("--classnames", type=lambda value: [pattern.strip() for pattern in value.split(',') if pattern.strip()],
+                        metavar="PATTERNS", help="only convert the brushes of entities whose classname matches one of "
+                                                 "these comma separated patterns, e.g. worldspawn or func_* "
+                                                 "(entity conversion itself is switched off with --no-entity-conversion)")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, default='vmf',
+                        help="write Source 1 .vmf files (default) or Source 2 .vmap files directly")
+    parser.add_argument("--validate", action="store_true",
+                        help="read every written .vmap back and check it against the vmap schema "
+                             "(takes about twice as long as writing it)")
+    parser.add_argument("--no-entity-conversion", action="store_true",
+                        help="leave entities out: only world geometry and a default info_player_start are written")
+    parser.add_argument("--fgd", default=DEFAULT_FGD_FILEPATH, metavar="PATH",
+                        help="FGD to validate converted entities against (default: the bundled hlvr.fgd)")
+    parser.add_argument("--textures", metavar="DIR", help="extract the textures the maps use from their WADs into DIR")
+    parser.add_argument("--materials", action="store_true",
+                        help="write a .vmat for every texture used, with a copy of its image from the --textures folder")
+    parser.add_argument("--wad-dir", action="append", default=[], metavar="DIR",
+                        help="folder to look for the WADs named by the maps in (repeatable)")
+    parser.add_argument("--palette", metavar="PATH", help="Quake palette.lmp, if no gfx.wad or palette.lmp is in the WAD folders")
+    parser.add_argument("--gzip", action="store_true", help="write .vmf.gz files (these are not compiled)")
+    parser.add_argument("--scale", type=float, default=SCALE_FACTOR, help=f"Quake to Source unit scale (default: {SCALE_FACTOR})")
+    parser.add_argument("--axis-map", type=_parse_axis_map, default=AXIS_MAP, help=f"output axes as source axes (default: {','.join(AXIS_MAP)})")
+    parser.add_argument("--material-prefix", default=MATERIAL_PREFIX, help=f"prefix for material names (default: {MATERIAL_PREFIX})")
+    parser.add_argument("--profile", metavar="DIR", help="profile the conversion of every map with cProfile into DIR/<map>.prof")
+    parser.add_argument("--watch", action="store_true",
+                        help="after converting, keep watching the input folder and reconvert maps as they are saved")
+    parser.add_argument("--poll-interval", type=float, default=WATCH_POLL_INTERVAL, metavar="SECONDS",
+                        help=f"seconds between scans of the watched folder (default: {WATCH_POLL_INTERVAL:g})")
+    parser.add_argument("--debounce", type=float, default=WATCH_DEBOUNCE, metavar="SECONDS",
+                        help=f"seconds a saved map must stay unchanged before it is reconverted (default: {WATCH_DEBOUNCE:g})")
+    parser.add_argument("--log-file", metavar="PATH", help="also append all output to this file")
+    parser.add_argument("--gui", action="store_true", help="open the converter window")
+    args = parser.parse_args(argv)
+
+    if args.gui or not argv:
+        # Imported here so headless runs never load tkinter
+        from vmapconverter_gui import run_gui
+        run_gui(log_filepath=args.log_file)
+        return 0
+    if not args.input_folder or not args.output_folder:
+        parser.error("input_folder and output_folder are required unless --gui is given")
+    if args.partition is not None and args.partition <= 0:
+        parser.error("--partition needs a positive cell size")
+    if args.format == 'vmap' and (args.gzip or args.partition is not None or args.instance):
+        parser.error("--format vmap cannot be combined with --gzip, --partition or --instance")
+    if args.instance and args.partition is not None:
+        parser.error("--instance cannot be combined with --partition")
+    if args.materials and not args.textures:
+        parser.error("--materials needs a --textures folder to take the images from")
+    if args.fgd != DEFAULT_FGD_FILEPATH and not os.path.isfile(args.fgd):
+        parser.error(f"FGD '{args.fgd}' not found")
+
+    vmf_options = {'scale': args.scale, 'axis_map': args.axis_map, 'material_prefix': args.material_prefix,
+                   'entities': not args.no_entity_conversion}
+    with contextlib.ExitStack() as stack:
+        log = print
+        if args.log_file:
+            log_file = stack.enter_context(open(args.log_file, "a", encoding="utf-8"))
+
+            def log(message):
+                print(message)
+                log_file.write(message + "\n")
+
+        options = dict(compress_vmf=args.gzip, workers=max(1, args.workers), vmf_options=vmf_options, force=args.force,
+                       compile_timeout=args.compile_timeout, check_brushes=args.check_brushes, optimize=args.optimize,
+                       partition_cell_size=args.partition, texture_folder=args.textures, wad_dirs=args.wad_dir,
+                       palette_filepath=args.palette, profile_folder=args.profile, classnames=args.classnames,
+                       fgd_filepath=args.fgd if os.path.isfile(args.fgd) else None, output_format=args.format,
+                       validate_vmap=args.validate, materials=args.materials, instancing=args.instance)
+        if args.watch:
+            try:
+                watch_folder(args.input_folder, args.output_folder, args.compiler, log, args.poll_interval,
+                             args.debounce, **options)
+            except KeyboardInterrupt:
+                log("Stopped watching.")
+            return 0
+        results = convert_folder(args.input_folder, args.output_folder, args.compiler, log, **options)
+    if not results:
+        return 2
+    if any(result['error'] or result.get('compiled') is False for result in results):
+        return 1
+    return 0
 
 
 if __name__ == "__main__":
-    root = tk.Tk()
-    app = QuakeVmapConverterApp(root)
-    root.mainloop()
+    sys.exit(main())
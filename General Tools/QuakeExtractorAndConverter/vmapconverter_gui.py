@@ -0,0 +1,305 @@
+"""
+Tk front end for vmapconverter. Kept in its own module so the converter can be imported and run
+from the command line without loading tkinter; start it with `python vmapconverter.py` or
+`python vmapconverter_gui.py`.
+"""
+import os
+import sys
+import threading
+import tkinter as tk
+from tkinter import scrolledtext, messagebox, filedialog
+
+from vmapconverter import convert_folder, watch_folder, LogSink, LOG_FLUSH_INTERVAL, LOG_HISTORY_LINES, DEFAULT_FGD_FILEPATH
+
+
+class QuakeVmapConverterApp:
+    def __init__(self, master, log_filepath=None):
+        self.master = master
+        self.log_filepath = log_filepath
+        master.title("Quake .map to Alyx .vmap Converter")
+
+        # Define dark theme colors for a modern look
+        self.bg_dark_gray = "#2B2B2B"
+        self.fg_light_gray = "#E0E0E0"
+        self.button_bg = "#4A4A4A"
+        self.button_fg = "#FFFFFF"
+        self.console_bg = "#1E1E1E"
+        self.console_text_color = "#BB86FC" # A shade of purple for console output
+
+        master.config(bg=self.bg_dark_gray)
+
+        # Use tk.StringVar for dynamic path updates in Entry widgets
+        script_dir = os.path.dirname(__file__)
+        self.input_folder_var = tk.StringVar(value=os.path.normpath(os.path.join(script_dir, "quake_maps_input")))
+        # Set the main output base folder to a generic 'alyx_output' in the script's directory.
+        # The 'quakeautomatedscriptport' folder will be created inside this.
+        self.output_folder_var = tk.StringVar(value=os.path.normpath(os.path.join(script_dir, "alyx_output")))
+        # New variable for resourcecompiler.exe path, pre-filled with the user-provided path
+        self.resource_compiler_path_var = tk.StringVar(value=os.path.normpath(r"F:\SteamLibrary\steamapps\common\Half-Life Alyx\game\bin\win64\resourcecompiler.exe"))
+        # Number of processes parsing maps and writing VMFs side by side
+        self.workers_var = tk.IntVar(value=os.cpu_count() or 1)
+        # Ignore the build cache and reconvert/recompile every map
+        self.force_rebuild_var = tk.BooleanVar(value=False)
+        # Solve every brush into polygons and report the invalid ones
+        self.check_brushes_var = tk.BooleanVar(value=False)
+        # Merge world brushes and set hidden faces to nodraw
+        self.optimize_var = tk.BooleanVar(value=False)
+        # Convert Quake entities (lights, spawns, doors, triggers) to their Alyx counterparts
+        self.convert_entities_var = tk.BooleanVar(value=True)
+        # Write Source 2 .vmap files directly instead of .vmf files for Hammer's import
+        self.direct_vmap_var = tk.BooleanVar(value=False)
+        # Keep watching the input folder after converting and rebuild maps as they are saved; Cancel stops watching
+        self.watch_var = tk.BooleanVar(value=False)
+        # Write brushes the map repeats once as prefabs, placed with func_instance
+        self.instancing_var = tk.BooleanVar(value=False)
+        # Grid cell size in Quake units for splitting maps into separately compiled regions; 0 keeps one VMF per map
+        self.region_size_var = tk.IntVar(value=0)
+        # Extract the textures the maps use from their WADs (looked up in the input folder) into wad_extracted
+        self.extract_textures_var = tk.BooleanVar(value=False)
+        self.texture_folder = os.path.normpath(os.path.join(script_dir, "wad_extracted"))
+        # Also write a .vmat for every extracted texture into the addon's materials folder
+        self.write_materials_var = tk.BooleanVar(value=False)
+        # Set by the Cancel button; convert_folder kills the running compile and stops
+        self.cancel_event = threading.Event()
+
+
+        self.create_widgets()
+        self.setup_dummy_files() # Setup dummy files on app start for convenience
+
+    def create_widgets(self):
+        # Input Folder Selection
+        tk.Label(self.master, text="Quake Maps Input Folder:", bg=self.bg_dark_gray, fg=self.fg_light_gray).pack(pady=(10, 0))
+        input_frame = tk.Frame(self.master, bg=self.bg_dark_gray)
+        input_frame.pack(fill=tk.X, padx=10)
+        tk.Entry(input_frame, textvariable=self.input_folder_var, width=50, bg=self.button_bg, fg=self.button_fg, insertbackground=self.fg_light_gray).pack(side=tk.LEFT, fill=tk.X, expand=True)
+        tk.Button(input_frame, text="Browse", command=lambda: self.browse_folder(self.input_folder_var), bg=self.button_bg, fg=self.button_fg, activebackground=self.fg_light_gray, activeforeground=self.button_bg).pack(side=tk.RIGHT)
+
+        # Output Folder Selection
+        tk.Label(self.master, text="Alyx Addon Content Base Folder (e.g., alyx_output):", bg=self.bg_dark_gray, fg=self.fg_light_gray).pack(pady=(10, 0))
+        output_frame = tk.Frame(self.master, bg=self.bg_dark_gray)
+        output_frame.pack(fill=tk.X, padx=10)
+        tk.Entry(output_frame, textvariable=self.output_folder_var, width=50, bg=self.button_bg, fg=self.button_fg, insertbackground=self.fg_light_gray).pack(side=tk.LEFT, fill=tk.X, expand=True)
+        tk.Button(output_frame, text="Browse", command=lambda: self.browse_folder(self.output_folder_var), bg=self.button_bg, fg=self.button_fg, activebackground=self.fg_light_gray, activeforeground=self.button_bg).pack(side=tk.RIGHT)
+
+        # ResourceCompiler.exe Path Selection
+        tk.Label(self.master, text="resourcecompiler.exe Path:", bg=self.bg_dark_gray, fg=self.fg_light_gray).pack(pady=(10, 0))
+        compiler_frame = tk.Frame(self.master, bg=self.bg_dark_gray)
+        compiler_frame.pack(fill=tk.X, padx=10)
+        tk.Entry(compiler_frame, textvariable=self.resource_compiler_path_var, width=50, bg=self.button_bg, fg=self.button_fg, insertbackground=self.fg_light_gray).pack(side=tk.LEFT, fill=tk.X, expand=True)
+        tk.Button(compiler_frame, text="Browse", command=lambda: self.browse_file(self.resource_compiler_path_var), bg=self.button_bg, fg=self.button_fg, activebackground=self.fg_light_gray, activeforeground=self.button_bg).pack(side=tk.RIGHT)
+
+
+        # Frame for buttons
+        button_frame = tk.Frame(self.master, bg=self.bg_dark_gray)
+        button_frame.pack(pady=10)
+
+        self.compile_button = tk.Button(button_frame, text="Compile Maps", command=self.start_conversion_thread, bg=self.button_bg, fg=self.button_fg, activebackground=self.fg_light_gray, activeforeground=self.button_bg)
+        self.compile_button.pack(side=tk.LEFT, padx=5)
+
+        self.clear_button = tk.Button(button_frame, text="Clear Console", command=self.clear_console, bg=self.button_bg, fg=self.button_fg, activebackground=self.fg_light_gray, activeforeground=self.button_bg)
+        self.clear_button.pack(side=tk.LEFT, padx=5)
+
+        self.cancel_button = tk.Button(button_frame, text="Cancel", command=self.cancel_conversion, state='disabled', bg=self.button_bg, fg=self.button_fg, activebackground=self.fg_light_gray, activeforeground=self.button_bg)
+        self.cancel_button.pack(side=tk.LEFT, padx=5)
+
+        tk.Label(button_frame, text="Workers:", bg=self.bg_dark_gray, fg=self.fg_light_gray).pack(side=tk.LEFT, padx=(15, 0))
+        tk.Spinbox(button_frame, from_=1, to=64, width=4, textvariable=self.workers_var, bg=self.button_bg, fg=self.button_fg, buttonbackground=self.button_bg, insertbackground=self.fg_light_gray).pack(side=tk.LEFT, padx=5)
+        tk.Checkbutton(button_frame, text="Force rebuild", variable=self.force_rebuild_var, bg=self.bg_dark_gray, fg=self.fg_light_gray, selectcolor=self.button_bg, activebackground=self.bg_dark_gray, activeforeground=self.fg_light_gray).pack(side=tk.LEFT, padx=5)
+        tk.Checkbutton(button_frame, text="Check brushes", variable=self.check_brushes_var, bg=self.bg_dark_gray, fg=self.fg_light_gray, selectcolor=self.button_bg, activebackground=self.bg_dark_gray, activeforeground=self.fg_light_gray).pack(side=tk.LEFT, padx=5)
+        tk.Checkbutton(button_frame, text="Optimize", variable=self.optimize_var, bg=self.bg_dark_gray, fg=self.fg_light_gray, selectcolor=self.button_bg, activebackground=self.bg_dark_gray, activeforeground=self.fg_light_gray).pack(side=tk.LEFT, padx=5)
+        tk.Checkbutton(button_frame, text="Entities", variable=self.convert_entities_var, bg=self.bg_dark_gray, fg=self.fg_light_gray, selectcolor=self.button_bg, activebackground=self.bg_dark_gray, activeforeground=self.fg_light_gray).pack(side=tk.LEFT, padx=5)
+        tk.Checkbutton(button_frame, text="Direct .vmap", variable=self.direct_vmap_var, bg=self.bg_dark_gray, fg=self.fg_light_gray, selectcolor=self.button_bg, activebackground=self.bg_dark_gray, activeforeground=self.fg_light_gray).pack(side=tk.LEFT, padx=5)
+        tk.Checkbutton(button_frame, text="Instances", variable=self.instancing_var, bg=self.bg_dark_gray, fg=self.fg_light_gray, selectcolor=self.button_bg, activebackground=self.bg_dark_gray, activeforeground=self.fg_light_gray).pack(side=tk.LEFT, padx=5)
+        tk.Checkbutton(button_frame, text="Watch", variable=self.watch_var, bg=self.bg_dark_gray, fg=self.fg_light_gray, selectcolor=self.button_bg, activebackground=self.bg_dark_gray, activeforeground=self.fg_light_gray).pack(side=tk.LEFT, padx=5)
+        tk.Label(button_frame, text="Region size:", bg=self.bg_dark_gray, fg=self.fg_light_gray).pack(side=tk.LEFT, padx=(15, 0))
+        tk.Spinbox(button_frame, from_=0, to=65536, increment=512, width=6, textvariable=self.region_size_var, bg=self.button_bg, fg=self.button_fg, buttonbackground=self.button_bg, insertbackground=self.fg_light_gray).pack(side=tk.LEFT, padx=5)
+        tk.Checkbutton(button_frame, text="Extract textures", variable=self.extract_textures_var, bg=self.bg_dark_gray, fg=self.fg_light_gray, selectcolor=self.button_bg, activebackground=self.bg_dark_gray, activeforeground=self.fg_light_gray).pack(side=tk.LEFT, padx=5)
+        tk.Checkbutton(button_frame, text="Materials", variable=self.write_materials_var, bg=self.bg_dark_gray, fg=self.fg_light_gray, selectcolor=self.button_bg, activebackground=self.bg_dark_gray, activeforeground=self.fg_light_gray).pack(side=tk.LEFT, padx=5)
+
+        # Console output area
+        self.console_text = scrolledtext.ScrolledText(self.master, wrap=tk.WORD, height=25, width=80, state='disabled', bg=self.console_bg, fg=self.console_text_color, insertbackground=self.fg_light_gray)
+        self.console_text.pack(padx=10, pady=10, fill=tk.BOTH, expand=True)
+        # Apply tag for console text color (though fg already sets it, this is for consistency/future tags)
+        self.console_text.tag_config("console_output", foreground=self.console_text_color)
+
+
+        # Redirect stdout to the console_text widget
+        self.log_sink = ConsoleLogSink(self.console_text, log_filepath=self.log_filepath)
+        sys.stdout = self.log_sink
+        sys.stderr = self.log_sink # Also redirect stderr
+
+    def browse_folder(self, path_var):
+        """Opens a file dialog to select a folder and updates the StringVar."""
+        folder_selected = filedialog.askdirectory()
+        if folder_selected:
+            path_var.set(os.path.normpath(folder_selected))
+
+    def browse_file(self, path_var):
+        """Opens a file dialog to select a file and updates the StringVar."""
+        file_selected = filedialog.askopenfilename(filetypes=[("Executable files", "*.exe")])
+        if file_selected:
+            path_var.set(os.path.normpath(file_selected))
+
+    def clear_console(self):
+        """Clears the text in the console output area."""
+        self.console_text.config(state='normal')
+        self.console_text.delete(1.0, tk.END)
+        self.console_text.config(state='disabled')
+
+    def start_conversion_thread(self):
+        """Starts the conversion process in a separate thread to keep the GUI responsive."""
+        self.clear_console()
+        self.compile_button.config(state='disabled') # Disable buttons during conversion
+        self.clear_button.config(state='disabled')
+        self.cancel_button.config(state='normal')
+        self.cancel_event.clear()
+
+        # Get current paths from entry widgets
+        input_folder = self.input_folder_var.get()
+        output_base_folder = self.output_folder_var.get()
+        resource_compiler_path = self.resource_compiler_path_var.get()
+        try:
+            workers = max(1, self.workers_var.get())
+        except tk.TclError:
+            workers = 1  # Not a number in the spinbox; fall back to converting one map at a time
+
+        force = self.force_rebuild_var.get()
+        check_brushes = self.check_brushes_var.get()
+        optimize = self.optimize_var.get()
+        convert_entities = self.convert_entities_var.get()
+        output_format = 'vmap' if self.direct_vmap_var.get() else 'vmf'
+        watch = self.watch_var.get()
+        try:
+            partition_cell_size = max(0, self.region_size_var.get()) or None
+        except tk.TclError:
+            partition_cell_size = None  # Not a number in the spinbox; write one VMF per map
+        texture_folder = self.texture_folder if self.extract_textures_var.get() else None
+        materials = self.write_materials_var.get()
+        instancing = self.instancing_var.get()
+
+        # Run conversion in a separate thread
+        self.conversion_thread = threading.Thread(target=self.run_conversion, args=(input_folder, output_base_folder, resource_compiler_path, workers, force, check_brushes, texture_folder, optimize, partition_cell_size, convert_entities, output_format, watch, materials, instancing))
+        self.conversion_thread.start()
+        # Start checking thread status periodically to re-enable buttons
+        self.master.after(100, self.check_conversion_thread) 
+
+    def run_conversion(self, input_folder, output_base_folder, resource_compiler_path, workers=1, force=False, check_brushes=False, texture_folder=None, optimize=False, partition_cell_size=None, convert_entities=True, output_format='vmf', watch=False, materials=False, instancing=False):
+        """Executes the map conversion logic."""
+        try:
+            options = dict(workers=workers, force=force, check_brushes=check_brushes, optimize=optimize, partition_cell_size=partition_cell_size,
+                           texture_folder=texture_folder, wad_dirs=[input_folder], vmf_options={'entities': convert_entities},
+                           fgd_filepath=DEFAULT_FGD_FILEPATH if os.path.isfile(DEFAULT_FGD_FILEPATH) else None,
+                           output_format=output_format, materials=materials, instancing=instancing)
+            if watch:
+                # Runs until Cancel is pressed
+                watch_folder(input_folder, output_base_folder, resource_compiler_path, self.log_sink.log, stop_event=self.cancel_event, **options)
+                messagebox.showinfo("Watch Stopped", "Stopped watching the input folder.")
+                return
+            convert_folder(input_folder, output_base_folder, resource_compiler_path, self.log_sink.log, cancel_event=self.cancel_event, **options)
+            if self.cancel_event.is_set():
+                messagebox.showinfo("Conversion Cancelled", "Map conversion was cancelled.")
+            else:
+                messagebox.showinfo("Conversion Complete", "Map conversion process finished successfully!")
+        except Exception as e:
+            messagebox.showerror("Conversion Error", f"An unexpected error occurred during conversion: {e}")
+            print(f"[ERROR] Critical error during conversion: {e}")
+        finally:
+            # Re-enable buttons in the main thread after conversion finishes
+            self.master.after(0, self.enable_buttons)
+
+    def cancel_conversion(self):
+        """Asks the running conversion to stop; the current resourcecompiler run is killed."""
+        self.cancel_event.set()
+        self.cancel_button.config(state='disabled')
+
+    def check_conversion_thread(self):
+        """Checks if the conversion thread is still alive and re-enables buttons when it finishes."""
+        if self.conversion_thread.is_alive():
+            self.master.after(100, self.check_conversion_thread) # Keep checking
+        else:
+            self.enable_buttons()
+
+    def enable_buttons(self):
+        """Re-enables the GUI buttons."""
+        self.compile_button.config(state='normal')
+        self.clear_button.config(state='normal')
+        self.cancel_button.config(state='disabled')
+
+    def setup_dummy_files(self):
+        """
+        Ensures input folder and dummy map exist for testing/initial setup.
+        """
+        # Ensure base directories exist
+        os.makedirs(self.input_folder_var.get(), exist_ok=True)
+
+        # Create sample map only if the input folder is empty
+        sample_map_path = os.path.join(self.input_folder_var.get(), "sample_map.map")
+        if not os.listdir(self.input_folder_var.get()): # Check if folder is empty
+            sample_map_content = """
+// My Sample Quake Map
+{
+    "classname" "worldspawn"
+    {
+        ( -128 -128 0 ) ( 128 -128 0 ) ( -128 128 0 ) WALL_TEX [ 1 0 0 0 ] [ 0 1 0 0 ] 0 1 1
+        ( -128 -128 128 ) ( -128 128 128 ) ( 128 -128 128 ) CEILING_TEX [ 1 0 0 0 ] [ 0 1 0 0 ] 0 1 1
+        ( -128 -128 0 ) ( -128 -128 128 ) ( -128 128 0 ) FLOOR_TEX [ 1 0 0 0 ] [ 0 1 0 0 ] 0 1 1
+        ( 128 -128 0 ) ( 128 128 0 ) ( 128 -128 128 ) BRICK_TEX [ 1 0 0 0 ] [ 0 1 0 0 ] 0 1 1
+        ( -128 128 0 ) ( 128 128 0 ) ( -128 128 128 ) {CLIP [ 1 0 0 0 ] [ 0 1 0 0 ] 0 1 1
+        ( -128 -128 0 ) ( -128 128 0 ) ( 128 -128 0 ) WATER_TEX [ 1 0 0 0 ] [ 0 1 0 0 ] 0 1 1
+    }
+    {
+        "classname" "light"
+        "origin" "0 0 64"
+        "light" "300"
+    }
+}
+"""
+            with open(sample_map_path, "w") as f:
+                f.write(sample_map_content)
+            print(f"Created a sample map file: {sample_map_path}")
+        else:
+            print(f"Input folder '{self.input_folder_var.get()}' is not empty. Skipping sample map creation.")
+
+
+class ConsoleLogSink(LogSink):
+    """
+    A LogSink shown in a Tkinter Text widget. Output collected from any thread is inserted on the Tk
+    thread at most once per LOG_FLUSH_INTERVAL, and the widget keeps only the last max_lines lines.
+    """
+    def __init__(self, widget, max_lines=LOG_HISTORY_LINES, log_filepath=None):
+        super().__init__(max_lines, log_filepath)
+        self.widget = widget
+        self.widget.after(int(LOG_FLUSH_INTERVAL * 1000), self._flush_to_widget)
+
+    def _flush_to_widget(self):
+        """Inserts everything collected since the last frame in one go, then schedules the next frame."""
+        lines, dropped = self.drain()
+        if lines or dropped:
+            text = "\n".join(lines) + "\n"
+            if dropped:
+                text = f"[... {dropped} lines skipped ...]\n" + text
+            self.widget.config(state='normal') # Enable editing
+            self.widget.insert(tk.END, text, "console_output") # Apply tag for color
+            # The text always ends with an empty line after the last newline, hence the +1
+            excess = int(self.widget.index('end-1c').split('.')[0]) - (self.max_lines + 1)
+            if excess > 0:
+                self.widget.delete('1.0', f'{excess + 1}.0')
+            self.widget.see(tk.END) # Auto-scroll to the end
+            self.widget.config(state='disabled') # Disable editing
+            self.flush()
+        self.widget.after(int(LOG_FLUSH_INTERVAL * 1000), self._flush_to_widget)
+
+
+def run_gui(log_filepath=None):
+    """Opens the converter window and runs the Tk main loop until it is closed."""
+    root = tk.Tk()
+    app = QuakeVmapConverterApp(root, log_filepath)
+    try:
+        root.mainloop()
+    finally:
+        sys.stdout, sys.stderr = sys.__stdout__, sys.__stderr__
+        app.log_sink.close()
+
+
+if __name__ == "__main__":
+    run_gui()
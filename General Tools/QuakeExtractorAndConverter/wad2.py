@@ -0,0 +1,265 @@
+"""
+Reads Quake WAD2 texture archives and extracts miptex lumps as PNG images.
+A WadFile memory-maps the archive and indexes its lump directory once, so pulling a texture is just
+a slice of the mapping. Pixels are decoded with a single NumPy palette lookup and written as
+truecolor PNGs with zlib, so no imaging library is needed.
+"""
+import os
+import mmap
+import json
+import zlib
+import struct
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# Bump whenever extracted images change for the same lump, so existing outputs get rewritten.
+WAD_EXTRACT_VERSION = "1"
+
+# Remembers which lump checksum every extracted image came from, kept in the output folder.
+WAD_MANIFEST_FILENAME = ".wad_textures.json"
+
+WAD2_MAGIC = b"WAD2"
+LUMP_TYPE_PALETTE = 0x40  # '@'
+LUMP_TYPE_MIPTEX = 0x44  # 'D'
+
+# Lump directory entry: filepos, disksize, size, type, compression, padding, name
+_LUMP_DTYPE = np.dtype([('filepos', '<i4'), ('disksize', '<i4'), ('size', '<i4'), ('type', 'u1'),
+                        ('compression', 'u1'), ('pad', '<u2'), ('name', 'S16')])
+
+# Miptex header: name, width, height, four mip level offsets (relative to the lump)
+_MIPTEX_HEADER = struct.Struct('<16s6I')
+
+# Palette index drawn as see-through on '{' textures
+TRANSPARENT_INDEX = 255
+
+PNG_COMPRESSION_LEVEL = 6
+
+
+class WadError(ValueError):
+    """Raised for files that are not WAD2 archives, or lumps that cannot be decoded."""
+
+
+def _lump_name(raw_name):
+    """Lump names are NUL-terminated and may carry garbage after the terminator; matching is case-insensitive."""
+    return raw_name.split(b'\0', 1)[0].decode('ascii', 'replace').lower()
+
+
+def texture_filename(texture_name):
+    """PNG file name for a texture. '*' (liquids) is not allowed in Windows file names, so it becomes '#'."""
+    return texture_name.lower().replace('*', '#') + ".png"
+
+
+class WadFile:
+    """
+    A memory-mapped WAD2 archive. lumps maps each lowercase lump name to its directory entry
+    (filepos, disksize, type, compression). Use as a context manager or call close().
+    """
+    def __init__(self, wad_filepath):
+        self.filepath = wad_filepath
+        with open(wad_filepath, 'rb') as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if len(self.data) < 12 or self.data[:4] != WAD2_MAGIC:
+                raise WadError(f"'{wad_filepath}' is not a WAD2 file")
+            lump_count, directory_offset = struct.unpack_from('<ii', self.data, 4)
+            if lump_count < 0 or directory_offset < 0 or directory_offset + lump_count * _LUMP_DTYPE.itemsize > len(self.data):
+                raise WadError(f"'{wad_filepath}' has a corrupt lump directory")
+            # Copied so no NumPy view keeps the mapping from being closed
+            directory = np.frombuffer(self.data, dtype=_LUMP_DTYPE, count=lump_count, offset=directory_offset).copy()
+            self.lumps = {}
+            for entry in directory:
+                # The first lump of a name wins, like in the Quake tools
+                self.lumps.setdefault(_lump_name(entry['name']), (int(entry['filepos']), int(entry['disksize']),
+                                                                  int(entry['type']), int(entry['compression'])))
+        except Exception:
+            self.data.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.data.close()
+
+    def lump(self, name):
+        """Returns the raw bytes of a lump as a memoryview into the mapping, or None if the WAD lacks it."""
+        entry = self.lumps.get(name.lower())
+        if entry is None:
+            return None
+        filepos, disksize, lump_type, compression = entry
+        if compression:
+            raise WadError(f"Lump '{name}' in '{self.filepath}' is compressed, which is not supported")
+        if filepos < 0 or filepos + disksize > len(self.data):
+            raise WadError(f"Lump '{name}' in '{self.filepath}' points outside the file")
+        return memoryview(self.data)[filepos:filepos + disksize]
+
+    def has_miptex(self, name):
+        entry = self.lumps.get(name.lower())
+        return entry is not None and entry[2] == LUMP_TYPE_MIPTEX
+
+
+def load_palette(palette_filepath):
+    """Reads a Quake palette.lmp (256 RGB triples) into a (256, 3) uint8 array."""
+    with open(palette_filepath, 'rb') as f:
+        data = f.read(768)
+    if len(data) != 768:
+        raise WadError(f"'{palette_filepath}' is not a 768 byte palette")
+    return np.frombuffer(data, dtype=np.uint8).reshape(256, 3)
+
+
+def find_palette(wad_files, search_dirs=()):
+    """
+    Finds the Quake palette: a 'palette' lump in one of the open WADs (gfx.wad has one), else a
+    palette.lmp or gfx/palette.lmp in search_dirs. Raises WadError if there is none, since texture
+    WADs do not carry their own palette.
+    """
+    for wad_file in wad_files:
+        entry = wad_file.lumps.get('palette')
+        if entry is not None and entry[2] == LUMP_TYPE_PALETTE and entry[1] >= 768:
+            return np.frombuffer(wad_file.lump('palette')[:768], dtype=np.uint8).reshape(256, 3).copy()
+    for search_dir in search_dirs:
+        for candidate in (os.path.join(search_dir, "palette.lmp"), os.path.join(search_dir, "gfx", "palette.lmp")):
+            if os.path.isfile(candidate):
+                return load_palette(candidate)
+    raise WadError("No Quake palette found: add gfx.wad or palette.lmp to the WAD search folders")
+
+
+def decode_miptex(lump, palette, transparent=False):
+    """
+    Decodes the full-size mip level of a miptex lump into an (height, width, 3) RGB array, or
+    RGBA with TRANSPARENT_INDEX see-through when transparent is True.
+    """
+    if len(lump) < _MIPTEX_HEADER.size:
+        raise WadError("Miptex lump is shorter than its header")
+    _, width, height, pixel_offset = _MIPTEX_HEADER.unpack_from(lump)[:4]
+    if not width or not height or pixel_offset + width * height > len(lump):
+        raise WadError(f"Miptex lump has invalid size {width}x{height}")
+    indices = np.frombuffer(lump, dtype=np.uint8, count=width * height, offset=pixel_offset).reshape(height, width)
+    if not transparent:
+        return palette[indices]
+    rgba = np.empty((height, width, 4), dtype=np.uint8)
+    rgba[..., :3] = palette[indices]
+    rgba[..., 3] = np.where(indices == TRANSPARENT_INDEX, 0, 255)
+    return rgba
+
+
+def _png_chunk(chunk_type, data):
+    return struct.pack('>I', len(data)) + chunk_type + data + struct.pack('>I', zlib.crc32(chunk_type + data))
+
+
+def encode_png(image):
+    """Encodes an (height, width, 3 or 4) uint8 array as an 8-bit RGB/RGBA PNG."""
+    height, width, channels = image.shape
+    rows = np.zeros((height, 1 + width * channels), dtype=np.uint8)  # Leading 0 = no filter on every row
+    rows[:, 1:] = image.reshape(height, width * channels)
+    header = struct.pack('>IIBBBBB', width, height, 8, 6 if channels == 4 else 2, 0, 0, 0)
+    return (b'\x89PNG\r\n\x1a\n' + _png_chunk(b'IHDR', header)
+            + _png_chunk(b'IDAT', zlib.compress(rows.tobytes(), PNG_COMPRESSION_LEVEL)) + _png_chunk(b'IEND', b''))
+
+
+def _write_file_atomic(filepath, data):
+    temp_filepath = filepath + ".tmp"
+    with open(temp_filepath, 'wb') as f:
+        f.write(data)
+    os.replace(temp_filepath, filepath)
+
+
+def resolve_wad_paths(wad_key, search_dirs=()):
+    """
+    Turns a worldspawn "wad" value ("a.wad;C:\\dev\\b.wad") into existing WAD file paths.
+    Entries are tried as given, then by file name (case-insensitively) in each of search_dirs, since
+    maps usually carry absolute paths from the machine they were made on.
+    Returns (found_paths, missing_entries).
+    """
+    found = []
+    missing = []
+    listings = {}
+    for entry in filter(None, (part.strip() for part in wad_key.split(';'))):
+        if os.path.isfile(entry):
+            found.append(entry)
+            continue
+        file_name = entry.replace('\\', '/').rsplit('/', 1)[-1].lower()
+        for search_dir in search_dirs:
+            if search_dir not in listings:
+                try:
+                    listings[search_dir] = {name.lower(): name for name in os.listdir(search_dir)}
+                except OSError:
+                    listings[search_dir] = {}
+            if file_name in listings[search_dir]:
+                found.append(os.path.join(search_dir, listings[search_dir][file_name]))
+                break
+        else:
+            missing.append(entry)
+    return found, missing
+
+
+def extract_textures(wad_filepaths, texture_names, output_folder, palette=None, palette_dirs=(), workers=4):
+    """
+    Writes texture_names (as used in the map, any case) from the given WADs to output_folder as PNGs
+    named by texture_filename. When several WADs have a texture, the first one listed wins.
+    Images whose lump checksum matches the one recorded in the folder's manifest are left alone.
+    Decoding and PNG compression run on a pool of workers threads.
+    Returns a dict with lists of 'extracted', 'reused' and 'missing' texture names, and 'failed'
+    (texture name, error message) pairs for lumps that could not be decoded.
+    """
+    os.makedirs(output_folder, exist_ok=True)
+    manifest_filepath = os.path.join(output_folder, WAD_MANIFEST_FILENAME)
+    try:
+        with open(manifest_filepath, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+    summary = {'extracted': [], 'reused': [], 'missing': [], 'failed': []}
+
+    wad_files = []
+    try:
+        for wad_filepath in wad_filepaths:
+            wad_files.append(WadFile(wad_filepath))
+        jobs = []
+        for texture_name in sorted(set(name.lower() for name in texture_names)):
+            wad_file = next((wad_file for wad_file in wad_files if wad_file.has_miptex(texture_name)), None)
+            if wad_file is None:
+                summary['missing'].append(texture_name)
+                continue
+            jobs.append((texture_name, wad_file))
+        if not jobs:
+            return summary
+        if palette is None:
+            palette = find_palette(wad_files, list(palette_dirs) + [os.path.dirname(path) for path in wad_filepaths])
+        palette_hash = hashlib.sha1(palette.tobytes()).hexdigest()
+
+        def extract(job):
+            texture_name, wad_file = job
+            lump = wad_file.lump(texture_name)
+            checksum = hashlib.sha1(lump).hexdigest() + palette_hash + WAD_EXTRACT_VERSION
+            filename = texture_filename(texture_name)
+            output_filepath = os.path.join(output_folder, filename)
+            if manifest.get(filename) == checksum and os.path.isfile(output_filepath):
+                return texture_name, filename, checksum, 'reused'
+            try:
+                image = decode_miptex(lump, palette, transparent=texture_name.startswith('{'))
+            except WadError as e:
+                return texture_name, filename, str(e), 'failed'
+            finally:
+                lump.release()
+            _write_file_atomic(output_filepath, encode_png(image))
+            return texture_name, filename, checksum, 'extracted'
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            for texture_name, filename, checksum, status in pool.map(extract, jobs):
+                if status == 'failed':
+                    summary['failed'].append((texture_name, checksum))
+                    continue
+                manifest[filename] = checksum
+                summary[status].append(texture_name)
+    finally:
+        for wad_file in wad_files:
+            wad_file.close()
+        if summary['extracted']:
+            _write_file_atomic(manifest_filepath, json.dumps(manifest, indent=1, sort_keys=True).encode('utf-8'))
+    return summary
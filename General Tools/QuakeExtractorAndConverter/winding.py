@@ -0,0 +1,210 @@
+"""
+Turns the half-spaces of Quake brushes into convex face polygons ("windings").
+Every face starts as a huge square on its plane and is clipped by the other planes of its brush,
+the way qbsp does it, but all faces of a map are clipped together with NumPy: clip step k cuts
+every face by the k-th plane of its own brush.
+Works on plain arrays (nine plane point floats per face, brush face offsets) so it can be used
+with vmapconverter.MapGeometry without importing it.
+"""
+import numpy as np
+
+# Points closer to a plane than this count as lying on it (same value qbsp uses).
+ON_EPSILON = 0.01
+
+# Half size of the starting square of every face; anything reaching this far is not closed.
+BOGUS_RANGE = 65536.0
+
+# Plane points closer to collinear than this (length of the normal cross product) are rejected.
+DEGENERATE_EPSILON = 1e-6
+
+# Two faces of a brush lie on the same plane when their normals and distances differ by less than
+# these (qbsp's NORMAL_EPSILON and DIST_EPSILON).
+NORMAL_EPSILON = 0.00001
+DIST_EPSILON = 0.01
+
+
+def plane_equations(planes):
+    """
+    Returns (normals, dists, degenerate) for (N, 9) plane points in Quake order: the unit normal
+    points out of the brush, so the inside is where dot(normal, p) <= dist.
+    degenerate marks faces whose three points are (nearly) collinear; their normal is zero.
+    """
+    points = np.asarray(planes, dtype=np.float64).reshape(-1, 3, 3)
+    normals = np.cross(points[:, 0] - points[:, 1], points[:, 2] - points[:, 1])
+    lengths = np.linalg.norm(normals, axis=1)
+    degenerate = lengths < DEGENERATE_EPSILON
+    normals /= np.where(degenerate, 1.0, lengths)[:, None]
+    normals[degenerate] = 0.0
+    dists = np.einsum('ij,ij->i', points[:, 1], normals)
+    return normals, dists, degenerate
+
+
+def base_windings(normals, dists):
+    """Returns (N, 4, 3) squares of half size BOGUS_RANGE lying on each plane (qbsp's BaseWindingForPlane)."""
+    # Use world up unless the plane is closer to horizontal than vertical, then use x
+    major = np.argmax(np.abs(normals), axis=1)
+    up = np.zeros_like(normals)
+    up[:, 2] = 1.0
+    up[major == 2] = (1.0, 0.0, 0.0)
+    up -= normals * np.einsum('ij,ij->i', up, normals)[:, None]
+    up_lengths = np.linalg.norm(up, axis=1)
+    up /= np.where(up_lengths > 0.0, up_lengths, 1.0)[:, None]
+    right = np.cross(up, normals)
+    origin = normals * dists[:, None]
+    up *= BOGUS_RANGE
+    right *= BOGUS_RANGE
+    return np.stack([origin - right + up, origin + right + up, origin + right - up, origin - right - up], axis=1)
+
+
+def clip_windings(windings, counts, normals, dists, epsilon=ON_EPSILON):
+    """
+    Clips a batch of convex polygons, keeping the part behind each row's plane (Sutherland-Hodgman).
+    windings is (F, V, 3) with counts valid vertices per row; normals/dists hold one plane per row.
+    Points within epsilon of the plane are kept as they are. Returns the new (windings, counts);
+    rows clipped away completely get a count of 0.
+    """
+    face_count, max_vertices = windings.shape[:2]
+    if face_count == 0:
+        return windings, counts
+    distances = np.einsum('fvi,fi->fv', windings, normals) - dists[:, None]
+    vertex_index = np.arange(max_vertices)
+    valid = vertex_index < counts[:, None]
+    front = valid & (distances > epsilon)
+    back = valid & (distances < -epsilon)
+    next_index = vertex_index + 1
+    next_index = np.where(next_index >= counts[:, None], 0, next_index)
+    next_front = np.take_along_axis(front, next_index, axis=1)
+    next_back = np.take_along_axis(back, next_index, axis=1)
+
+    keep = valid & ~front
+    split = (front & next_back) | (back & next_front)
+    emitted = keep.astype(np.intp) + split
+    new_counts = emitted.sum(axis=1)
+    slots = np.cumsum(emitted, axis=1) - emitted  # Output position of each vertex's first emitted point
+
+    new_windings = np.zeros((face_count, max(int(new_counts.max()), 1), 3))
+    rows, columns = np.nonzero(keep)
+    new_windings[rows, slots[rows, columns]] = windings[rows, columns]
+    rows, columns = np.nonzero(split)
+    if len(rows):
+        start = windings[rows, columns]
+        end = windings[rows, next_index[rows, columns]]
+        start_distance = distances[rows, columns]
+        fraction = start_distance / (start_distance - distances[rows, next_index[rows, columns]])
+        points = start + fraction[:, None] * (end - start)
+        # Snap the axis of axial planes exactly onto the plane to avoid drift, as qbsp does
+        plane_normals = normals[rows]
+        axial = np.abs(plane_normals) == 1.0
+        points = np.where(axial, plane_normals * dists[rows][:, None], points)
+        new_windings[rows, slots[rows, columns] + keep[rows, columns]] = points
+    new_counts[new_counts < 3] = 0
+    return new_windings, new_counts
+
+
+class BrushWindings:
+    """
+    Face polygons of every brush in a map, stored flat like MapGeometry.
+    Face i has vertices[vertex_offsets[i]:vertex_offsets[i + 1]] (none if it was clipped away),
+    in Quake coordinates and in the same clockwise order qbsp produces.
+    mins/maxs are the per-brush bounds and valid is False for brushes in dropped,
+    a list of (brush_index, reason) for brushes that do not enclose a closed volume.
+    duplicates lists (brush_index, face_index, kept_face_index) for faces on the same plane as an
+    earlier face of their brush; like qbsp, only the first one gets a polygon.
+    """
+    def __init__(self, normals, dists, vertices, vertex_offsets, mins, maxs, valid, dropped, duplicates=()):
+        self.normals = normals
+        self.dists = dists
+        self.vertices = vertices
+        self.vertex_offsets = vertex_offsets
+        self.mins = mins
+        self.maxs = maxs
+        self.valid = valid
+        self.dropped = dropped
+        self.duplicates = list(duplicates)
+
+    def __len__(self):
+        return len(self.valid)
+
+    @property
+    def face_count(self):
+        return len(self.vertex_offsets) - 1
+
+    def face_polygon(self, face_index):
+        """Returns the (n, 3) vertices of a face; empty if the face has no area inside its brush."""
+        return self.vertices[self.vertex_offsets[face_index]:self.vertex_offsets[face_index + 1]]
+
+
+def build_windings(planes, brush_offsets, epsilon=ON_EPSILON):
+    """
+    Computes the face polygons of every brush. planes holds nine plane point floats per face and
+    brush i owns faces brush_offsets[i] up to brush_offsets[i + 1] (as in MapGeometry).
+    Brushes are dropped when a plane is degenerate, when they are not closed (a face reaches
+    BOGUS_RANGE), or when fewer than four faces keep an area. A face on the same plane as an earlier
+    face of its brush is left without a polygon and listed in duplicates. Returns a BrushWindings.
+    """
+    normals, dists, degenerate = plane_equations(planes)
+    offsets = np.asarray(brush_offsets, dtype=np.intp)
+    face_total = len(normals)
+    brush_count = len(offsets) - 1
+    faces_per_brush = np.diff(offsets)
+    face_brush = np.repeat(np.arange(brush_count), faces_per_brush)
+    face_start = offsets[:-1][face_brush]
+    face_stop = offsets[1:][face_brush]
+    face_index = np.arange(face_total)
+
+    # Step k compares every face with the k-th face of its own brush, if that one comes before it
+    duplicate_of = np.full(face_total, -1, dtype=np.intp)
+    for k in range(int(faces_per_brush.max()) - 1 if brush_count else 0):
+        other = face_start + k
+        candidates = np.nonzero((other < face_index) & (duplicate_of < 0) & ~degenerate)[0]
+        if not len(candidates):
+            continue
+        others = other[candidates]
+        same = ((np.abs(normals[candidates] - normals[others]) < NORMAL_EPSILON).all(axis=1)
+                & (np.abs(dists[candidates] - dists[others]) < DIST_EPSILON) & ~degenerate[others])
+        duplicate_of[candidates[same]] = others[same]
+    duplicate_faces = np.nonzero(duplicate_of >= 0)[0]
+    duplicates = [(int(face_brush[face]), int(face), int(duplicate_of[face])) for face in duplicate_faces]
+
+    windings = base_windings(normals, dists)
+    counts = np.where(degenerate | (duplicate_of >= 0), 0, 4)
+    for k in range(int(faces_per_brush.max()) if brush_count else 0):
+        # Step k clips every face by the k-th face plane of its own brush, skipping itself
+        clip_plane = face_start + k
+        active = np.nonzero((clip_plane < face_stop) & (clip_plane != face_index) & (counts > 0))[0]
+        if not len(active):
+            continue
+        active_planes = clip_plane[active]
+        clipped, clipped_counts = clip_windings(windings[active, :counts[active].max()], counts[active],
+                                                normals[active_planes], dists[active_planes], epsilon)
+        if clipped.shape[1] > windings.shape[1]:
+            windings = np.concatenate([windings, np.zeros((face_total, clipped.shape[1] - windings.shape[1], 3))], axis=1)
+        windings[active, :clipped.shape[1]] = clipped
+        counts[active] = clipped_counts
+
+    vertex_offsets = np.zeros(face_total + 1, dtype=np.intp)
+    np.cumsum(counts, out=vertex_offsets[1:])
+    vertices = windings[np.arange(windings.shape[1]) < counts[:, None]]
+
+    # Per-brush bounds over all face vertices
+    vertex_brush = np.repeat(face_brush, counts)
+    mins = np.full((brush_count, 3), np.inf)
+    maxs = np.full((brush_count, 3), -np.inf)
+    np.minimum.at(mins, vertex_brush, vertices)
+    np.maximum.at(maxs, vertex_brush, vertices)
+
+    polygon_faces = np.bincount(face_brush, weights=counts > 0, minlength=brush_count)
+    bad_planes = np.bincount(face_brush, weights=degenerate, minlength=brush_count) > 0
+    unbounded = (np.abs(mins) >= BOGUS_RANGE * 0.5).any(axis=1) | (np.abs(maxs) >= BOGUS_RANGE * 0.5).any(axis=1)
+    dropped = []
+    for brush_index in np.nonzero(bad_planes | unbounded | (polygon_faces < 4))[0]:
+        if bad_planes[brush_index]:
+            reason = "degenerate plane"
+        elif polygon_faces[brush_index] < 4:
+            reason = f"no volume ({int(polygon_faces[brush_index])} faces left)"
+        else:
+            reason = "not closed"
+        dropped.append((int(brush_index), reason))
+    valid = np.ones(brush_count, dtype=bool)
+    valid[[brush_index for brush_index, _ in dropped]] = False
+    return BrushWindings(normals, dists, vertices, vertex_offsets, mins, maxs, valid, dropped, duplicates)